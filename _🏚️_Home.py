@@ -1,7 +1,8 @@
 import streamlit as st
-from PIL import Image
-import requests
-from io import BytesIO
+from utils import assets, tracing
+
+# Time this script run for the metrics page
+rerun_span = tracing.start_rerun('home')
 # 
 # Set Page Title and Layout
 st.set_page_config(page_title="AI Network Doctor", layout="wide", page_icon="📡")
@@ -65,10 +66,8 @@ st.markdown('<div class="header">📡 AI Network Doctor - Intelligent Troublesho
 
 # Add a relevant image after the title
 st.markdown('<div class="image-container">', unsafe_allow_html=True)
-image_url = "https://images.unsplash.com/photo-1564760290292-23341e4df6ec?q=80&w=1470&auto=format&fit=crop&ixlib=rb-4.0.3&ixid=M3wxMjA3fDB8MHxwaG90by1wYWdlfHx8fGVufDB8fHx8fA%3D%3D"  # Network-related image
-response = requests.get(image_url)
-image = Image.open(BytesIO(response.content))
-st.image(image, caption="Optimize Your Network with AI", use_container_width=True)
+# Served from assets/ once prepared (at build time, or in the background on first use); until then the browser loads the URL itself
+st.image(assets.image_source('home_banner'), caption="Optimize Your Network with AI", use_container_width=True)
 st.markdown('</div>', unsafe_allow_html=True)
 
 # Introduction
@@ -98,4 +97,7 @@ st.markdown("""
 st.markdown('</div>', unsafe_allow_html=True)
 
 st.markdown("---")
-st.markdown('<div class="footer">Made with ❤️ by <b>AI Network Doctor</b> | Powered by Streamlit & AI</div>', unsafe_allow_html=True)
\ No newline at end of file
+st.markdown('<div class="footer">Made with ❤️ by <b>AI Network Doctor</b> | Powered by Streamlit & AI</div>', unsafe_allow_html=True)
+
+# Record how long this script run took
+rerun_span.end()
@@ -0,0 +1 @@
+# Headless HTTP API over the same helpers the Streamlit pages use
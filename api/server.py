@@ -0,0 +1,300 @@
+"""Headless JSON API for the diagnosis flow, the chat assistant and the ISP recommender.
+
+It runs the same code as the pages (utils.pipeline, utils.router, utils.isp,
+the shared prompts and potential_issues) without any Streamlit reruns. Blocking
+LLM calls run on a bounded worker pool. The service keeps no per-client state,
+so several instances can run behind a load balancer and share the cache
+directory (NETDOC_CACHE_DIR).
+
+Endpoints:
+    GET  /health
+    GET  /issues                 the potential_issues list
+    POST /diagnose               Diagnose page fields (+ "measured_issues", "single_call", "solve")
+    POST /probe                  measure the server's connection; returns the report and Diagnose fields
+                                 (403 unless NETDOC_LOCAL_PROBE=1, 429 within PROBE_INTERVAL of the last run)
+    POST /solve                  {"issues": "..."}
+    POST /chat                   {"message": "...", "history": [{"role", "content"}], "stream": false}
+    POST /isp                    ISP page fields
+    GET  /metrics                Prometheus text from utils.tracing
+
+Usage:
+    python -m api.server --port 8080 --workers 32
+
+It listens on 127.0.0.1 unless --host (or NETDOC_API_HOST) says otherwise,
+e.g. --host 0.0.0.0 behind a load balancer.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from aiohttp import web
+
+from utils import isp, llm, pipeline, probe, router
+from utils.cache import DIAGNOSIS_NAMESPACE, SharedCache, diagnosis_key
+from utils.issues import potential_issues
+from utils.memory import history_context
+from utils.prompts import get_prompt
+from utils.streaming import ThinkStreamParser
+from utils.tracing import span, tracer
+
+DEFAULT_WORKERS = 32
+DIAGNOSE_FIELDS = {
+    'internet_speed': (int, float),
+    'ping': (int, float),
+    'wifi_strength': str,
+    'device_type': str,
+    'usage_type': str,
+    'network_type': str,
+    'router_distance': (int, float),
+    'connected_devices': (int, float),
+    'vpn_usage': str,
+}
+ISP_FIELDS = {
+    'mbs_needed': (int, float),
+    'ms': (int, float),
+    'no_of_meters': (int, float),
+    'no_of_devices': (int, float),
+    'usage_type': str,
+    'your_device_type': str,
+    'vpn': str,
+    'selected_country': str,
+}
+CHAT_PARAMS = {'temperature': 0.5, 'top_p': 0.5}
+# Stream events buffered between the model thread and a slow client
+STREAM_QUEUE_SIZE = 64
+
+
+class BadRequest(Exception):
+    pass
+
+
+def _require(body, fields):
+    missing = [name for name in fields if name not in body]
+    if missing:
+        raise BadRequest(f"Missing fields: {', '.join(missing)}")
+    wrong = [name for name, types in fields.items() if not isinstance(body[name], types) or isinstance(body[name], bool)]
+    if wrong:
+        raise BadRequest(f"Wrong type for: {', '.join(wrong)}")
+    return {name: body[name] for name in fields}
+
+
+async def _json_body(request):
+    try:
+        body = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise BadRequest('Body must be JSON')
+    if not isinstance(body, dict):
+        raise BadRequest('Body must be a JSON object')
+    return body
+
+
+async def _run(request, fn, *args, **kwargs):
+    """Run a blocking call on the app's worker pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(request.app['pool'], lambda: fn(*args, **kwargs))
+
+
+@web.middleware
+async def errors_middleware(request, handler):
+    with span('api.request', path=request.path) as request_span:
+        try:
+            response = await handler(request)
+        except BadRequest as e:
+            response = web.json_response({'error': str(e)}, status=400)
+        except llm.LLMUnavailable as e:
+            response = web.json_response({'error': str(e)}, status=503, headers={'Retry-After': '5'})
+        request_span.attrs['status'] = response.status
+        return response
+
+
+async def health(request):
+    return web.json_response({'status': 'ok'})
+
+
+async def issues(request):
+    return web.json_response({'issues': [issue.strip() for issue in potential_issues]})
+
+
+async def diagnose(request):
+    body = await _json_body(request)
+    inputs = _require(body, DIAGNOSE_FIELDS)
+    measured = body.get('measured_issues') or []
+    if not isinstance(measured, list) or any(issue not in potential_issues for issue in measured):
+        raise BadRequest('"measured_issues" must be a list of names from /issues')
+    inputs['measured_issues'] = measured
+    cache = request.app['diagnosis_cache']
+    result = await _run(request, pipeline.predict_issues, inputs, cache, single_call=bool(body.get('single_call')))
+    if body.get('solve') and not result['solution']:
+        result['solution'] = await _run(request, pipeline.solve, result['issues'])
+        await _run(request, cache.update, diagnosis_key(inputs), issues=result['issues'], solution=result['solution'])
+    return web.json_response(result)
+
+
+async def measure(request):
+    # Like the Diagnose page: the probes measure this server, so they are only
+    # offered when it runs on the user's machine, at most once per PROBE_INTERVAL
+    if not probe.LOCAL_PROBE:
+        return web.json_response({'error': 'Connection probes are disabled (set NETDOC_LOCAL_PROBE=1 on a local run)'}, status=403)
+    wait = request.app['probe_last_run'] + probe.PROBE_INTERVAL - time.time()
+    if wait > 0:
+        return web.json_response({'error': 'A probe ran recently, try again later'}, status=429,
+                                 headers={'Retry-After': str(math.ceil(wait))})
+    request.app['probe_last_run'] = time.time()
+    # The probes are asyncio already, so they run on the server's own loop
+    report = await probe.run_probes()
+    return web.json_response({'report': report, 'inputs': probe.to_diagnosis_inputs(report)})
+
+
+async def solve(request):
+    body = await _json_body(request)
+    if not isinstance(body.get('issues'), str) or not body['issues'].strip():
+        raise BadRequest('"issues" must be a non-empty string')
+    return web.json_response({'solution': await _run(request, pipeline.solve, body['issues'])})
+
+
+def _chat_prompt(body):
+    message = body.get('message')
+    if not isinstance(message, str) or not message.strip():
+        raise BadRequest('"message" must be a non-empty string')
+    history = body.get('history') or []
+    if not isinstance(history, list) or not all(isinstance(m, dict) and isinstance(m.get('content'), str) for m in history):
+        raise BadRequest('"history" must be a list of {"role", "content"} objects')
+    route = router.classify(message)
+    prompt_name = 'chat_brief' if route == 'trivial' else 'chat'
+    prompt = get_prompt(prompt_name).invoke({
+        'question': message,
+        'history': history_context(history) or 'This is the first message.',
+    })
+    return route, prompt_name, prompt
+
+
+async def chat(request):
+    body = await _json_body(request)
+    route, prompt_name, prompt = _chat_prompt(body)
+    if not body.get('stream'):
+        message = await _run(request, router.invoke, route, prompt, prompt_name=prompt_name, **CHAT_PARAMS)
+        parser = ThinkStreamParser()
+        parser.feed(message.content)
+        parser.close()
+        return web.json_response({'route': route, 'thinking': parser.thinking.strip(), 'answer': parser.answer.strip()})
+
+    # Server-sent events: one {"channel", "text"} event per piece, then a final "done" event.
+    # The queue is bounded and the producer stops when the client goes away, so an
+    # aborted request does not keep reading the model's answer into memory.
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+    stop = threading.Event()
+
+    def put(item):
+        # Blocks while the queue is full; False once the handler has stopped reading
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                future.result(timeout=0.5)
+                return True
+            except FutureTimeout:
+                if stop.is_set():
+                    future.cancel()
+                    return False
+
+    def produce():
+        parser = ThinkStreamParser()
+        chunks = router.stream(route, prompt, prompt_name=prompt_name, **CHAT_PARAMS)
+        try:
+            for chunk in chunks:
+                for event in parser.feed(chunk.content):
+                    if not put(('event', event)):
+                        return
+            for event in parser.close():
+                if not put(('event', event)):
+                    return
+            put(('done', None))
+        except Exception as e:
+            put(('error', e))
+        finally:
+            # Stops the model stream (and frees its connection) if the answer was not read to the end
+            chunks.close()
+
+    response = web.StreamResponse(headers={'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache'})
+    await response.prepare(request)
+    request.app['pool'].submit(produce)
+    try:
+        while True:
+            kind, item = await queue.get()
+            if kind == 'event':
+                payload = {'channel': item[0], 'text': item[1]}
+            elif kind == 'done':
+                payload = {'done': True, 'route': route}
+            else:
+                payload = {'error': str(item) if isinstance(item, llm.LLMUnavailable) else 'The assistant failed to answer.'}
+            await response.write(f'data: {json.dumps(payload)}\n\n'.encode())
+            if kind != 'event':
+                break
+    finally:
+        # Set on success too; on a disconnect (CancelledError, ConnectionResetError) it stops produce()
+        stop.set()
+    await response.write_eof()
+    return response
+
+
+async def isp_recommendation(request):
+    body = await _json_body(request)
+    # Like the page, a missing country is rejected before anything else is done
+    if not isinstance(body.get('selected_country'), str) or not body['selected_country'].strip():
+        raise BadRequest('"selected_country" is required')
+    inputs = _require(body, ISP_FIELDS)
+    inputs['current_issues'] = str(body.get('current_issues') or '')
+    recommendation, from_cache = await _run(request, isp.recommend, inputs, request.app['isp_cache'])
+    return web.json_response({'recommendation': recommendation, 'cached': from_cache})
+
+
+async def metrics(request):
+    return web.Response(text=tracer.to_prometheus(), content_type='text/plain')
+
+
+async def _shutdown_pool(app):
+    app['pool'].shutdown(wait=False, cancel_futures=True)
+
+
+def create_app(workers=DEFAULT_WORKERS, diagnosis_cache=None, isp_cache=None):
+    """Build the aiohttp application. Caches default to the same files the pages use."""
+    app = web.Application(middlewares=[errors_middleware])
+    app['pool'] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api-worker')
+    app['diagnosis_cache'] = diagnosis_cache if diagnosis_cache is not None else SharedCache(DIAGNOSIS_NAMESPACE)
+    app['isp_cache'] = isp_cache if isp_cache is not None else isp.get_isp_cache()
+    # One interval for the whole server: the probe load falls on its own connection
+    app['probe_last_run'] = 0
+    app.on_cleanup.append(_shutdown_pool)
+    app.add_routes([
+        web.get('/health', health),
+        web.get('/issues', issues),
+        web.post('/diagnose', diagnose),
+        web.post('/probe', measure),
+        web.post('/solve', solve),
+        web.post('/chat', chat),
+        web.post('/isp', isp_recommendation),
+        web.get('/metrics', metrics),
+    ])
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the diagnosis, chat and ISP features as a JSON API.')
+    parser.add_argument('--host', default=os.getenv('NETDOC_API_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('NETDOC_API_PORT', '8080')))
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Threads for blocking LLM and cache calls')
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    web.run_app(create_app(args.workers), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
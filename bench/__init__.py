@@ -0,0 +1 @@
+# Offline benchmarks for the Streamlit pages (see bench/run.py)
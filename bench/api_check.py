@@ -0,0 +1,102 @@
+"""End-to-end check of the headless API (api/server.py) against the local fake Groq server.
+
+Real ChatGroq clients talk HTTP to bench/fake_groq_server.py, and the API is
+served on a local port and called over HTTP, so everything except Groq itself
+is exercised. Prints one line per check and exits non-zero on failure.
+
+Usage:
+    python -m bench.api_check
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+
+async def _checks(base_url):
+    import aiohttp
+
+    from utils.issues import potential_issues
+
+    diagnose = {'internet_speed': 40, 'ping': 300, 'wifi_strength': 'Moderate', 'device_type': 'Laptop',
+                'usage_type': 'Gaming', 'network_type': 'WiFi', 'router_distance': 5, 'connected_devices': 4,
+                'vpn_usage': 'No'}
+    isp = {'mbs_needed': 50, 'ms': 60, 'no_of_meters': 5, 'no_of_devices': 5, 'usage_type': 'Gaming',
+           'your_device_type': 'Laptop', 'vpn': 'No', 'selected_country': 'India', 'current_issues': 'high ping'}
+    results = []
+
+    async with aiohttp.ClientSession(base_url) as session:
+        async def check(name, method, path, expect_status, predicate=lambda body: True, **kwargs):
+            start = time.perf_counter()
+            async with session.request(method, path, **kwargs) as response:
+                text = await response.text()
+            elapsed = time.perf_counter() - start
+            try:
+                body = json.loads(text)
+            except ValueError:
+                body = text
+            ok = response.status == expect_status and predicate(body)
+            results.append(ok)
+            print(f"{'ok  ' if ok else 'FAIL'} {name}: {response.status} in {elapsed * 1000:.0f} ms")
+            return body
+
+        await check('health', 'GET', '/health', 200)
+        await check('issues', 'GET', '/issues', 200, lambda b: len(b['issues']) == len(potential_issues))
+        await check('diagnose', 'POST', '/diagnose', 200, lambda b: b['source'] in ('rules', 'llm') and b['issues'], json=diagnose)
+        await check('diagnose (cached)', 'POST', '/diagnose', 200, lambda b: b['source'] in ('rules', 'cache'), json=diagnose)
+        await check('diagnose + solve', 'POST', '/diagnose', 200, lambda b: b['solution'], json=dict(diagnose, solve=True))
+        await check('diagnose single call', 'POST', '/diagnose', 200, lambda b: b['issues'],
+                    json=dict(diagnose, ping=350, single_call=True))
+        await check('diagnose missing field', 'POST', '/diagnose', 400, json={'ping': 10})
+        await check('solve', 'POST', '/solve', 200, lambda b: b['solution'], json={'issues': '1. High latency'})
+        await check('chat', 'POST', '/chat', 200, lambda b: b['answer'] and b['route'] == 'reasoning',
+                    json={'message': 'My ping is high while gaming', 'history': []})
+        await check('chat greeting', 'POST', '/chat', 200, lambda b: b['route'] == 'trivial', json={'message': 'hi'})
+        events = await check('chat stream', 'POST', '/chat', 200,
+                             lambda b: '"done": true' in b and '"channel": "answer"' in b,
+                             json={'message': 'Why does my wifi drop?', 'stream': True,
+                                   'history': [{'role': 'user', 'content': 'hello'}, {'role': 'assistant', 'content': 'Hi!'}]})
+        await check('chat bad body', 'POST', '/chat', 400, data='not json')
+        await check('isp', 'POST', '/isp', 200, lambda b: b['recommendation'] and not b['cached'], json=isp)
+        await check('isp (cached)', 'POST', '/isp', 200, lambda b: b['cached'], json=dict(isp, mbs_needed=60, selected_country=' india '))
+        await check('isp missing country', 'POST', '/isp', 400, json=dict(isp, selected_country=' '))
+        await check('probe disabled', 'POST', '/probe', 403)
+        await check('metrics', 'GET', '/metrics', 200, lambda b: 'netdoc_operation_duration_seconds' in b)
+    return all(results)
+
+
+async def _main():
+    from aiohttp import web
+
+    from api.server import create_app
+
+    app = create_app(workers=8)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        return await _checks(f'http://127.0.0.1:{port}')
+    finally:
+        await runner.cleanup()
+
+
+def main():
+    from bench.fake_groq_server import FakeGroqServer
+
+    server = FakeGroqServer(latency=0.02).start()
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before utils is imported: the cache directory is read at import time
+        os.environ.update(NETDOC_CACHE_DIR=tmp, GROQ_API_BASE=server.url, GROQ_API_KEY='bench')
+        try:
+            ok = asyncio.run(_main())
+        finally:
+            server.stop()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
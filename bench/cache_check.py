@@ -0,0 +1,124 @@
+"""Check of the cache backends in utils.cache_backends.
+
+Runs the same checks against the memory backend, an SQLite file in a temporary
+directory and the Redis backend talking to bench.fake_redis_server: get/set,
+TTL expiry, namespace isolation, LRU eviction, counters, and get_or_compute
+computing a missing value once across several processes. Prints one line per
+check and exits non-zero on failure.
+
+Usage:
+    python -m bench.cache_check
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from bench.fake_redis_server import FakeRedisServer
+from utils.cache_backends import CacheBackend, create_backend
+
+PROCESSES = 4
+COMPUTE_SECONDS = 0.3
+
+
+def _compute_in_process(spec, key, start, results):
+    backend = create_backend(spec)
+
+    def compute():
+        # Counts the computations, wherever they run
+        backend.incr('check_calls', key)
+        time.sleep(COMPUTE_SECONDS)
+        return {'answer': 42}
+
+    while time.time() < start:
+        time.sleep(0.005)
+    value, cached = backend.get_or_compute('check_shared', key, compute, ttl=60)
+    results.put((value, cached))
+
+
+def _check_backend(name, spec, check, shared=True):
+    backend = create_backend(spec)
+    for namespace in ('check_a', 'check_b', 'check_lru', 'check_shared', 'check_calls'):
+        backend.clear(namespace)
+
+    backend.set('check_a', 'k', {'x': 1})
+    check(f'{name}: set and get', backend.get('check_a', 'k') == {'x': 1})
+    check(f'{name}: namespaces are separate', backend.get('check_b', 'k') is None)
+    check(f'{name}: add keeps existing', not backend.add('check_a', 'k', {'x': 2}) and backend.get('check_a', 'k') == {'x': 1})
+
+    backend.set('check_a', 'short', 'v', ttl=0.1)
+    backend.add('check_a', 'lock', 'v', ttl=0.1)
+    time.sleep(0.15)
+    check(f'{name}: TTL expiry', backend.get('check_a', 'short') is None)
+    check(f'{name}: add replaces expired', backend.add('check_a', 'lock', 'w', ttl=1))
+
+    for i in range(5):
+        backend.set('check_lru', f'k{i}', i, max_entries=3)
+        time.sleep(0.01)
+        if i == 2:
+            backend.get('check_lru', 'k0')
+    kept = sorted(k for k in ('k0', 'k1', 'k2', 'k3', 'k4') if backend.get('check_lru', k, touch=False) is not None)
+    check(f'{name}: LRU eviction', kept == ['k0', 'k3', 'k4'] and backend.count('check_lru') == 3, str(kept))
+
+    backend.clear('check_lru')
+    for i in range(3):
+        backend.set('check_lru', f'old{i}', i, ttl=0.1, max_entries=3)
+    time.sleep(0.15)
+    for i in range(2):
+        backend.set('check_lru', f'new{i}', i, max_entries=3)
+    live = backend.count('check_lru')
+    backend.set('check_lru', 'new2', 2, max_entries=3)
+    kept = [k for k in ('new0', 'new1', 'new2') if backend.get('check_lru', k, touch=False) is not None]
+    check(f'{name}: expired keys are not counted or evicted for', live == 2 and len(kept) == 3, f'count {live}, kept {kept}')
+
+    counts = [backend.incr('check_a', 'counter', 2, ttl=60) for _ in range(3)]
+    check(f'{name}: incr', counts == [2, 4, 6], str(counts))
+
+    if not shared:
+        return
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    start = time.time() + 2.0
+    workers = [context.Process(target=_compute_in_process, args=(spec, 'q', start, results)) for _ in range(PROCESSES)]
+    for worker in workers:
+        worker.start()
+    answers = [results.get(timeout=30) for _ in workers]
+    for worker in workers:
+        worker.join()
+    calls = backend.get('check_calls', 'q')
+    check(f'{name}: get_or_compute once across {PROCESSES} processes',
+          calls == 1 and all(value == {'answer': 42} for value, _ in answers) and sum(not cached for _, cached in answers) == 1,
+          f'{calls} computation(s)')
+
+
+def main():
+    results = []
+
+    def check(name, ok, detail=''):
+        results.append(ok)
+        print(f"{'ok  ' if ok else 'FAIL'} {name}{': ' + detail if detail else ''}")
+
+    class IncompleteBackend(CacheBackend):
+        def get(self, namespace, key, touch=True):
+            return None
+
+    try:
+        IncompleteBackend()
+        check('incomplete backend fails when created', False)
+    except TypeError as e:
+        check('incomplete backend fails when created', True, str(e).split(' with ')[0])
+
+    redis = FakeRedisServer().start()
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            _check_backend('memory', 'memory', check, shared=False)
+            _check_backend('sqlite', 'sqlite://' + os.path.join(directory, 'cache.sqlite3'), check)
+            _check_backend('redis', redis.url, check)
+        finally:
+            redis.stop()
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Local HTTP server speaking Groq's chat completions API, with injected faults.
+
+Point a real ChatGroq at it (groq_api_base=server.url, or GROQ_API_BASE) to
+exercise the HTTP client, rate limiting, retries, hedging and the API server
+without touching Groq. Answers depend on the prompt like bench.fakes does, and stop at the request's max_tokens
+(counting words as tokens).
+Faults:
+
+- latency: seconds before the answer starts
+- slow_rate / slow_latency: share of requests that take `slow_latency` instead (the tail)
+- error_rate: share of requests answered with 429 and a Retry-After header
+- retry_after: value of that header, in seconds
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench.fakes import _response_for
+
+
+class FakeGroqServer:
+    def __init__(self, latency=0.05, slow_rate=0.0, slow_latency=2.0, error_rate=0.0, retry_after=0.2, seed=None):
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.requests = 0
+        self.rejected = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'http://{host}:{port}'
+
+    def _draw(self):
+        with self._lock:
+            self.requests += 1
+            rejected = self._random.random() < self.error_rate
+            slow = self._random.random() < self.slow_rate
+            if rejected:
+                self.rejected += 1
+        return rejected, self.slow_latency if slow else self.latency
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                rejected, latency = server._draw()
+                if rejected:
+                    self._send_json(429, {'error': {'message': 'Rate limit reached', 'type': 'tokens', 'code': 'rate_limit_exceeded'}},
+                                    {'retry-after': str(server.retry_after)})
+                    return
+                time.sleep(latency)
+                prompt = '\n'.join(str(m.get('content', '')) for m in request.get('messages', []))
+                words = _response_for(prompt).split(' ')
+                limit = request.get('max_tokens') or request.get('max_completion_tokens')
+                finish_reason = 'length' if limit and len(words) > limit else 'stop'
+                answer = ' '.join(words[:limit])
+                base = {'id': 'chatcmpl-fake', 'created': int(time.time()), 'model': request.get('model', 'fake')}
+                if request.get('stream'):
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/event-stream')
+                    self.end_headers()
+                    for word in answer.split(' '):
+                        chunk = dict(base, object='chat.completion.chunk',
+                                     choices=[{'index': 0, 'delta': {'content': word + ' '}, 'finish_reason': None}])
+                        self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode())
+                    self.wfile.write(b'data: [DONE]\n\n')
+                    return
+                prompt_tokens = len(prompt.split())
+                self._send_json(200, dict(
+                    base,
+                    object='chat.completion',
+                    choices=[{'index': 0, 'message': {'role': 'assistant', 'content': answer}, 'finish_reason': finish_reason}],
+                    usage={'prompt_tokens': prompt_tokens, 'completion_tokens': len(answer.split()),
+                           'total_tokens': prompt_tokens + len(answer.split())},
+                ))
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,165 @@
+"""Local server speaking enough of the Redis protocol for utils.cache_backends.RedisBackend.
+
+Point NETDOC_CACHE_BACKEND (or create_backend) at server.url to exercise the
+Redis backend without a Redis install. Supports PING, AUTH, SELECT, GET, SET
+(NX, PX, EX), DEL, INCRBY, PEXPIRE, ZADD, ZREM, ZCARD, ZPOPMIN, ZRANGE,
+ZRANGEBYSCORE and FLUSHDB on one keyspace; expiry is checked when a key is read.
+"""
+import socketserver
+import threading
+import time
+
+
+class FakeRedisServer:
+    def __init__(self):
+        self.commands = 0
+        self._strings = {}
+        self._expiry = {}
+        self._zsets = {}
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f'redis://{host}:{port}/0'
+
+    def _live(self, key):
+        # Called with _lock held; drops an expired string key
+        expires_at = self._expiry.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self._strings.pop(key, None)
+            self._expiry.pop(key, None)
+        return key in self._strings
+
+    def _set(self, key, value, args):
+        options = [arg.upper() for arg in args]
+        if 'NX' in options and self._live(key):
+            return None
+        self._strings[key] = value
+        self._expiry.pop(key, None)
+        if 'PX' in options:
+            self._expiry[key] = time.time() + int(args[options.index('PX') + 1]) / 1000
+        if 'EX' in options:
+            self._expiry[key] = time.time() + int(args[options.index('EX') + 1])
+        return 'OK'
+
+    def execute(self, name, args):
+        """Run one command and return its reply (an Exception for errors)."""
+        with self._lock:
+            self.commands += 1
+            if name in ('PING',):
+                return 'PONG'
+            if name in ('AUTH', 'SELECT'):
+                return 'OK'
+            if name == 'FLUSHDB':
+                self._strings.clear()
+                self._expiry.clear()
+                self._zsets.clear()
+                return 'OK'
+            if name == 'GET':
+                return self._strings[args[0]] if self._live(args[0]) else None
+            if name == 'SET':
+                return self._set(args[0], args[1], args[2:])
+            if name == 'DEL':
+                removed = 0
+                for key in args:
+                    removed += int(self._live(key)) + int(key in self._zsets)
+                    self._strings.pop(key, None)
+                    self._expiry.pop(key, None)
+                    self._zsets.pop(key, None)
+                return removed
+            if name == 'INCRBY':
+                try:
+                    value = (int(self._strings[args[0]]) if self._live(args[0]) else 0) + int(args[1])
+                except ValueError:
+                    return RuntimeError('ERR value is not an integer or out of range')
+                self._strings[args[0]] = str(value)
+                return value
+            if name == 'PEXPIRE':
+                if not self._live(args[0]):
+                    return 0
+                self._expiry[args[0]] = time.time() + int(args[1]) / 1000
+                return 1
+            if name == 'ZADD':
+                zset = self._zsets.setdefault(args[0], {})
+                added = 0
+                for score, member in zip(args[1::2], args[2::2]):
+                    added += member not in zset
+                    zset[member] = float(score)
+                return added
+            if name == 'ZREM':
+                zset = self._zsets.get(args[0], {})
+                return sum(zset.pop(member, None) is not None for member in args[1:])
+            if name == 'ZCARD':
+                return len(self._zsets.get(args[0], {}))
+            if name == 'ZPOPMIN':
+                zset = self._zsets.get(args[0], {})
+                count = int(args[1]) if len(args) > 1 else 1
+                popped = sorted(zset.items(), key=lambda item: (item[1], item[0]))[:count]
+                reply = []
+                for member, score in popped:
+                    del zset[member]
+                    reply += [member, repr(score)]
+                return reply
+            if name == 'ZRANGE':
+                members = [member for member, _ in sorted(self._zsets.get(args[0], {}).items(), key=lambda item: (item[1], item[0]))]
+                start, stop = int(args[1]), int(args[2])
+                return members[start:len(members) if stop == -1 else stop + 1]
+            if name == 'ZRANGEBYSCORE':
+                low, high = (float(bound) for bound in args[1:3])
+                ordered = sorted(self._zsets.get(args[0], {}).items(), key=lambda item: (item[1], item[0]))
+                return [member for member, score in ordered if low <= score <= high]
+            return RuntimeError(f"ERR unknown command '{name}'")
+
+    def _handler(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def _read_command(self):
+                line = self.rfile.readline()
+                if not line:
+                    return None
+                parts = []
+                for _ in range(int(line[1:-2])):
+                    length = int(self.rfile.readline()[1:-2])
+                    parts.append(self.rfile.read(length + 2)[:-2].decode())
+                return parts
+
+            def _encode(self, reply):
+                if reply is None:
+                    return b'$-1\r\n'
+                if isinstance(reply, Exception):
+                    return f'-{reply}\r\n'.encode()
+                if isinstance(reply, int):
+                    return b':%d\r\n' % reply
+                if isinstance(reply, list):
+                    return b'*%d\r\n' % len(reply) + b''.join(self._encode(item) for item in reply)
+                if reply in ('OK', 'PONG'):
+                    return f'+{reply}\r\n'.encode()
+                data = reply.encode()
+                return b'$%d\r\n%s\r\n' % (len(data), data)
+
+            def handle(self):
+                while True:
+                    try:
+                        command = self._read_command()
+                    except (ConnectionError, ValueError):
+                        return
+                    if command is None:
+                        return
+                    self.wfile.write(self._encode(server.execute(command[0].upper(), command[1:])))
+                    self.wfile.flush()
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,140 @@
+"""Local stand-ins for Groq, the YouTube Data API, Nominatim and the Home page image.
+
+install() patches them in so every page can run without network access.
+"""
+import io
+import json
+import re
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Tunable from the benchmark command line
+settings = {
+    'llm_latency': 0.2,          # seconds before the first token
+    'llm_tokens_per_second': 400,
+    'youtube_build_latency': 0.3,
+    'youtube_search_latency': 0.15,
+    'geocode_latency': 0.1,
+    'image_latency': 0.2,
+}
+
+THINKING = '<think>The user describes a network problem; list causes then fixes.</think>'
+ANSWER = ' '.join(['Restart the router, move closer to the access point and check for interference.'] * 20)
+STRUCTURED = json.dumps({'issues': [{'index': 0, 'solution': ANSWER}, {'index': 2, 'solution': ANSWER}]})
+
+
+def _response_for(prompt):
+    if 'Reply with JSON only' in prompt:
+        return STRUCTURED
+    if 'predict network-related issues' in prompt:
+        # The first two issue codes offered
+        return ', '.join(re.findall(r'^(\d+): ', prompt, re.MULTILINE)[:2])
+    return THINKING + ANSWER
+
+
+class FakeChatGroq(BaseChatModel):
+    """Drop-in for ChatGroq with a fixed first-token latency and token rate."""
+
+    model: str = 'fake'
+    http_client: object = None
+    http_async_client: object = None
+    max_retries: int = 2
+    max_tokens: int = None
+
+    @property
+    def _llm_type(self):
+        return 'fake-groq'
+
+    def _tokens(self, messages):
+        prompt = '\n'.join(str(m.content) for m in messages)
+        return re.findall(r'\S+\s*', _response_for(prompt))[:self.max_tokens]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._tokens(messages)
+        time.sleep(settings['llm_latency'] + len(tokens) / settings['llm_tokens_per_second'])
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=''.join(tokens)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(settings['llm_latency'])
+        for token in self._tokens(messages):
+            time.sleep(1 / settings['llm_tokens_per_second'])
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+class _FakeSearchRequest:
+    def __init__(self, max_results):
+        self.max_results = max_results
+
+    def execute(self, http=None):
+        time.sleep(settings['youtube_search_latency'])
+        return {'items': [
+            {'id': {'videoId': f'video{i}'}, 'snippet': {'title': f'How to fix your network, part {i}'}}
+            for i in range(self.max_results)
+        ]}
+
+
+class _FakeSearch:
+    def list(self, q, part, type, maxResults):
+        return _FakeSearchRequest(maxResults)
+
+
+class FakeYouTube:
+    def search(self):
+        return _FakeSearch()
+
+
+def fake_youtube_build(*args, **kwargs):
+    # build() fetches and parses the discovery document before returning
+    time.sleep(settings['youtube_build_latency'])
+    return FakeYouTube()
+
+
+class _Location:
+    def __init__(self, latitude, longitude):
+        self.latitude = latitude
+        self.longitude = longitude
+
+
+class FakeNominatim:
+    """Geocodes any address to a stable point near New Delhi."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def geocode(self, query):
+        time.sleep(settings['geocode_latency'])
+        if 'nowhere' in query.lower():
+            return None
+        offset = (hash(query) % 1000) / 10000
+        return _Location(28.6 + offset, 77.2 + offset)
+
+
+class _FakeImageResponse:
+    def __init__(self, content):
+        self.content = content
+        self.status_code = 200
+
+
+def fake_requests_get(url, *args, **kwargs):
+    from PIL import Image
+
+    time.sleep(settings['image_latency'])
+    buffer = io.BytesIO()
+    Image.new('RGB', (1470, 980), (30, 60, 114)).save(buffer, format='JPEG')
+    return _FakeImageResponse(buffer.getvalue())
+
+
+def install():
+    """Patch the fakes into the libraries and helpers the pages use."""
+    import geopy.geocoders
+    import googleapiclient.discovery
+    import langchain_groq
+    import requests
+
+    langchain_groq.ChatGroq = FakeChatGroq
+    googleapiclient.discovery.build = fake_youtube_build
+    geopy.geocoders.Nominatim = FakeNominatim
+    requests.get = fake_requests_get
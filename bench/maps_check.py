@@ -0,0 +1,39 @@
+"""Check that user-written report text is escaped in the rendered Report Issues map.
+
+Builds a map from reports whose Issue, Description and User contain HTML and
+script, renders it with utils.maps.render_html and looks for the raw markup.
+Prints one line per check and exits non-zero on failure.
+
+Usage:
+    python -m bench.maps_check
+"""
+import sys
+
+from utils.maps import build_map, popup_html, render_html
+
+SCRIPT = '<script>alert("xss")</script>'
+IMAGE = '<img src=x onerror=alert(1)>'
+
+
+def main():
+    results = []
+
+    def check(name, ok, detail=''):
+        results.append(ok)
+        print(f"{'ok  ' if ok else 'FAIL'} {name}{': ' + detail if detail else ''}")
+
+    popups = popup_html([SCRIPT, 'Slow Speed'], [IMAGE, 'fine'], ['mallory', SCRIPT])
+    check('popups escape every column', all('<script>' not in p and '<img' not in p for p in popups), popups[0])
+    check('popups keep their own markup', all('<br>' in p for p in popups))
+
+    page = render_html(build_map([28.6, 28.7], [77.2, 77.3], popups, [[28.6, 77.2, 1.0]]))
+    # The marker data is embedded as JSON with <, > and & written as \u escapes; the browser undoes them
+    page = page.replace('\\u003c', '<').replace('\\u003e', '>').replace('\\u0026', '&')
+    check('rendered map has no raw script', '<script>alert(' not in page)
+    check('rendered map has no raw image tag', IMAGE not in page)
+    check('rendered map shows the escaped text', '&lt;script&gt;' in page)
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == '__main__':
+    main()
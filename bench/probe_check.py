@@ -0,0 +1,110 @@
+"""Check of utils.probe against servers on loopback.
+
+Starts TCP echo-less listeners, a "blackhole" listener whose accept queue is
+full (its connects time out like lost packets) and an HTTP server streaming
+bytes for the throughput probe, then runs the probes in a few scenarios.
+Prints one line per check and exits non-zero on failure.
+
+Usage:
+    python -m bench.probe_check
+"""
+import asyncio
+import socket
+import sys
+
+from utils import probe
+
+DOWNLOAD_BYTES = 64 * 1024 * 1024
+CHUNK = b'\0' * 65536
+
+
+async def _accept_and_close(reader, writer):
+    writer.close()
+
+
+async def _serve_download(reader, writer):
+    try:
+        await reader.readuntil(b'\r\n\r\n')
+        writer.write(f'HTTP/1.1 200 OK\r\nContent-Length: {DOWNLOAD_BYTES}\r\nContent-Type: application/octet-stream\r\n\r\n'.encode())
+        for _ in range(DOWNLOAD_BYTES // len(CHUNK)):
+            writer.write(CHUNK)
+            await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+def _blackhole():
+    # A listener that never accepts: once its queue is full, new SYNs are dropped
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(0)
+    fillers = []
+    for _ in range(3):
+        filler = socket.socket()
+        filler.setblocking(False)
+        try:
+            filler.connect(listener.getsockname())
+        except BlockingIOError:
+            pass
+        fillers.append(filler)
+    return listener, fillers
+
+
+async def _main():
+    results = []
+
+    def check(name, ok, detail=''):
+        results.append(ok)
+        print(f"{'ok  ' if ok else 'FAIL'} {name}{': ' + detail if detail else ''}")
+
+    servers = [await asyncio.start_server(_accept_and_close, '127.0.0.1', 0) for _ in range(3)]
+    download = await asyncio.start_server(_serve_download, '127.0.0.1', 0)
+    listener, fillers = _blackhole()
+    await asyncio.sleep(0.1)
+    targets = [server.sockets[0].getsockname()[:2] for server in servers]
+    dark = listener.getsockname()
+    url = 'http://127.0.0.1:%d/' % download.sockets[0].getsockname()[1]
+    try:
+        report = await probe.run_probes(targets=targets, dns_names=['localhost'] * 3, throughput_url=url, gateway=targets[0])
+        inputs = probe.to_diagnosis_inputs(report)
+        serial = (probe.TCP_SAMPLES * report['ping_ms'] / 1000 + (probe.TCP_SAMPLES - 1) * probe.TCP_INTERVAL) * len(targets)
+        serial += probe.THROUGHPUT_SECONDS
+        check('healthy run is parallel', report['elapsed'] < 2.0,
+              f"{report['elapsed']:.2f} s (about {serial:.2f} s one after another)")
+        check('healthy: no issues', report['issues'] == [], str(report['issues']))
+        check('healthy: fills speed and ping', 'internet_speed' in inputs and 'ping' in inputs,
+              f"{report['download_mbps']:.0f} Mbps, ping {report['ping_ms']:.2f} ms, jitter {report['jitter_ms']:.2f} ms")
+
+        report = await probe.run_probes(targets=targets, dns_names=['netdoc-probe-check.invalid'] * 3, throughput_url=None,
+                                        gateway=targets[0])
+        check('DNS failure', probe.to_diagnosis_inputs(report)['measured_issues'] == [probe.DNS_FAILURE], str(report['issues']))
+
+        report = await probe.run_probes(targets=[dark], dns_names=[], throughput_url=None, gateway=targets[0], budget=1.5)
+        check('internet down, router up', report['issues'] == [probe.FIREWALL_BLOCKING], str(report['issues']))
+        check('run budget', report['elapsed'] < 1.7, f"{report['elapsed']:.2f} s")
+
+        report = await probe.run_probes(targets=[dark], dns_names=[], throughput_url=None, gateway=dark, budget=1.5)
+        check('router unreachable', report['issues'] == [probe.ROUTER_UNREACHABLE], str(report['issues']))
+
+        # Loss and MTU rules on synthetic results: the loopback neither drops some packets nor clamps the MSS
+        flaky = [{'target': 'a', 'sent': 10, 'lost': 2, 'rtt_ms': 20.0, 'jitter_ms': 4.0, 'mtu': 1500, 'mss': 1448}]
+        check('packet loss', probe.PACKET_LOSS in probe.summarize(flaky, [])['issues'])
+        clamped = [dict(flaky[0], lost=0, mss=1360)]
+        summary = probe.summarize(clamped, [])
+        check('MTU mismatch', summary['issues'] == [probe.MTU_MISMATCH], f"path MTU {summary['path_mtu']}")
+    finally:
+        for server in servers + [download]:
+            server.close()
+        for sock in fillers + [listener]:
+            sock.close()
+    return all(results)
+
+
+def main():
+    sys.exit(0 if asyncio.run(_main()) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""Offline benchmark for every page, driven through Streamlit's AppTest.
+
+Groq, YouTube, Nominatim and the Home page image download are replaced by the
+local fakes in bench/fakes.py, so runs need no network and are repeatable.
+Each page is measured in a fresh process:
+
+- import_time: time to run the page's import statements
+- import_profile: `python -X importtime` of those statements in a clean
+  interpreter, the slowest top-level imports first
+- first_render: time of the first script run of a new session
+- rerun: p50/mean of plain reruns
+- interactions: time of the reruns triggered by clicking the page's main buttons
+- memory_per_session_kb: peak Python allocations of one new session
+
+Report Issues is also measured with a growing number of stored reports.
+
+Usage:
+    python -m bench.run --output bench_results.json
+    python -m bench.run --pages diagnose chat --reruns 20 --llm-latency 0.5
+"""
+import argparse
+import ast
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = {
+    'home': '_*_Home.py',
+    'diagnose': 'pages/1_*.py',
+    'chat': 'pages/2_*.py',
+    'videos': 'pages/3_*.py',
+    'isp': 'pages/4_*.py',
+    'report': 'pages/6_*.py',
+    'metrics': 'pages/7_*.py',
+}
+SCALE_SIZES = [0, 1000, 10000, 50000]
+TIMEOUT = 120
+IMPORT_PROFILE_TOP = 15
+
+
+def page_path(page):
+    return glob.glob(os.path.join(ROOT, PAGES[page]))[0]
+
+
+def _widget(widgets, label):
+    return next(w for w in widgets if w.label == label)
+
+
+def _timed(action):
+    start = time.perf_counter()
+    action()
+    return time.perf_counter() - start
+
+
+def _settle(at, state_keys, timeout=60):
+    # LLM answers come from background jobs: rerun like the page's poller until they are done
+    deadline = time.perf_counter() + timeout
+    while any(key in at.session_state and at.session_state[key] for key in state_keys) and time.perf_counter() < deadline:
+        time.sleep(0.02)
+        at.run()
+    return at
+
+
+def interact(page, at):
+    """Click through the page's main flow and return {step: seconds}."""
+    if page == 'diagnose':
+        # A high ping keeps the rule engine unsure, so the LLM path is measured
+        at.slider[1].set_value(300).run()
+        return {
+            'diagnose': _timed(lambda: _settle(at.button(key='diagnose_button').click().run(), ['diagnose_job'])),
+            'solve': _timed(lambda: _settle(at.button(key='solve_button').click().run(), ['solution_requested'])),
+        }
+    if page == 'chat':
+        return {
+            'first_message': _timed(lambda: _settle(at.chat_input[0].set_value('My ping is high while gaming').run(), ['chat_job'])),
+            'follow_up': _timed(lambda: _settle(at.chat_input[0].set_value('It is still high after a restart').run(), ['chat_job'])),
+        }
+    if page == 'videos':
+        return {
+            'search': _timed(lambda: at.button[0].click().run()),
+            'repeat_search': _timed(lambda: at.button[0].click().run()),
+        }
+    if page == 'isp':
+        _widget(at.text_input, 'Kindly Enter your Country name').set_value('India').run()
+        return {'recommend': _timed(lambda: _settle(_widget(at.button, 'Get Recommendation').click().run(), ['isp_job']))}
+    if page == 'report':
+        _widget(at.text_input, 'Enter Address (e.g., New Delhi, India)').set_value('Connaught Place, New Delhi').run()
+        return {'report_issue': _timed(lambda: _widget(at.button, 'Report Issue').click().run())}
+    return {}
+
+
+def measure_imports(path):
+    """Execute only the page's import statements and return the time they take."""
+    code = compile(_page_imports(path), path, 'exec')
+    return _timed(lambda: exec(code, {'__name__': '__bench__'}))
+
+
+def _page_imports(path):
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    return ast.Module(body=[node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))], type_ignores=[])
+
+
+def import_profile(path, top=IMPORT_PROFILE_TOP):
+    """Run the page's imports under `python -X importtime` and return the slowest top-level modules."""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', ast.unparse(_page_imports(path))],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented under the module that triggered them
+        if not name[1:].startswith(' '):
+            modules.append({'module': name.strip(), 'cumulative_ms': int(cumulative) / 1000})
+    modules.sort(key=lambda m: m['cumulative_ms'], reverse=True)
+    return {'total_ms': sum(m['cumulative_ms'] for m in modules), 'slowest': modules[:top]}
+
+
+def seed_reports(count):
+    import random
+
+    from utils.issue_store import IssueStore
+
+    rng = random.Random(42)
+    issues = ['Slow Speed', 'Frequent Disconnections', 'High Latency', 'No Connectivity', 'Other']
+    rows = [
+        (28.4 + rng.random() * 0.5, 76.9 + rng.random() * 0.6, rng.choice(issues), 'Seeded report', f'user{rng.randrange(200)}')
+        for _ in range(count)
+    ]
+    IssueStore().add_many(rows)
+
+
+def run_worker(page, reruns, reports=None):
+    """Measure one page in this (fresh) process and return the results dict."""
+    from streamlit.testing.v1 import AppTest
+
+    from bench import fakes
+
+    fakes.install()
+    if reports:
+        seed_reports(reports)
+    path = page_path(page)
+    result = {'page': page}
+    if reports is None:
+        result['import_profile'] = import_profile(path)
+    result['import_time'] = measure_imports(path)
+
+    at = AppTest.from_file(path, default_timeout=TIMEOUT)
+    result['first_render'] = _timed(at.run)
+    times = [_timed(at.run) for _ in range(reruns)]
+    result['rerun'] = {'p50': statistics.median(times), 'mean': statistics.mean(times), 'max': max(times)}
+    if reports is None:
+        result['interactions'] = interact(page, at)
+    result['exceptions'] = [e.message for e in at.exception]
+
+    tracemalloc.start()
+    AppTest.from_file(path, default_timeout=TIMEOUT).run()
+    result['memory_per_session_kb'] = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return result
+
+
+def spawn(args, settings):
+    """Run a worker in a fresh process with its own cache and data directories."""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            NETDOC_CACHE_DIR=os.path.join(tmp, 'cache'),
+            NETDOC_DATA_DIR=os.path.join(tmp, 'data'),
+            GROQ_API_KEY='bench',
+            youtube_api_key='bench',
+            BENCH_SETTINGS=json.dumps(settings),
+        )
+        proc = subprocess.run(
+            [sys.executable, '-m', 'bench.run', '--worker'] + args,
+            cwd=ROOT, env=env, capture_output=True, text=True
+        )
+    if proc.returncode != 0:
+        return {'error': proc.stderr.strip().splitlines()[-1:] or ['worker failed']}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    from bench import fakes
+
+    parser = argparse.ArgumentParser(description='Benchmark every page offline with fake Groq/YouTube/Nominatim.')
+    parser.add_argument('--pages', nargs='+', choices=list(PAGES), default=list(PAGES))
+    parser.add_argument('--reruns', type=int, default=10, help='Plain reruns timed per page')
+    parser.add_argument('--scale-sizes', nargs='*', type=int, default=SCALE_SIZES, help='Report counts for the Report Issues scaling curve')
+    parser.add_argument('--llm-latency', type=float, default=fakes.settings['llm_latency'], help='Fake LLM time to first token (s)')
+    parser.add_argument('--llm-tokens-per-second', type=float, default=fakes.settings['llm_tokens_per_second'])
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--worker', nargs='+', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        fakes.settings.update(json.loads(os.environ.get('BENCH_SETTINGS', '{}')))
+        page = args.worker[0]
+        reports = int(args.worker[1]) if len(args.worker) > 1 else None
+        print(json.dumps(run_worker(page, args.reruns, reports)))
+        return
+
+    settings = dict(fakes.settings, llm_latency=args.llm_latency, llm_tokens_per_second=args.llm_tokens_per_second)
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_revision': _git_revision(),
+        'python': platform.python_version(),
+        'settings': settings,
+        'pages': {},
+        'report_scaling': [],
+    }
+    for page in args.pages:
+        print(f'Benchmarking {page}...', file=sys.stderr)
+        results['pages'][page] = spawn([page, '--reruns', str(args.reruns)], settings)
+    if 'report' in args.pages:
+        for size in args.scale_sizes:
+            print(f'Benchmarking report with {size} reports...', file=sys.stderr)
+            results['report_scaling'].append(dict(spawn(['report', str(size), '--reruns', str(args.reruns)], settings), reports=size))
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {args.output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
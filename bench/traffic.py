@@ -0,0 +1,91 @@
+"""Load test of the Groq traffic layer (utils.llm) against bench/fake_groq_server.py.
+
+A real ChatGroq client talks to the local fake server, which injects latency,
+a slow tail and 429s. The same load is sent three ways:
+
+- raw: model.invoke() with no retries, as the pages used to do
+- managed: utils.llm.invoke() with rate limiting, retries with backoff and a deadline
+- hedged: managed plus a duplicate request after the p95 latency
+
+Usage:
+    python -m bench.traffic --requests 300 --concurrency 20 --error-rate 0.1 --slow-rate 0.05
+"""
+import argparse
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.fake_groq_server import FakeGroqServer
+from utils import llm, ratelimit
+
+MODEL = 'fake-traffic-model'
+
+
+def _quantile(values, q):
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)] if values else None
+
+
+def run_mode(mode, model, requests, concurrency, timeout):
+    def one(i):
+        prompt = f'Request {mode} {i}: my ping is high'
+        start = time.perf_counter()
+        try:
+            if mode == 'raw':
+                model.invoke(prompt)
+            else:
+                llm.invoke(model, prompt, timeout=timeout, hedge=mode == 'hedged')
+            return time.perf_counter() - start, None
+        except Exception as e:
+            return time.perf_counter() - start, type(e).__name__
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    latencies = [latency for latency, error in results if error is None]
+    errors = [error for _, error in results if error is not None]
+    return {
+        'ok': len(latencies),
+        'error_rate': len(errors) / requests,
+        'errors': {name: errors.count(name) for name in set(errors)},
+        'p50_ms': (statistics.median(latencies) * 1000) if latencies else None,
+        'p95_ms': (_quantile(latencies, 0.95) or 0) * 1000,
+        'p99_ms': (_quantile(latencies, 0.99) or 0) * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test retries, rate limiting and hedging against a local fake Groq.')
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.05, help='Normal response latency (s)')
+    parser.add_argument('--slow-rate', type=float, default=0.05, help='Share of requests in the slow tail')
+    parser.add_argument('--slow-latency', type=float, default=1.5, help='Latency of the slow tail (s)')
+    parser.add_argument('--error-rate', type=float, default=0.1, help='Share of requests answered with 429')
+    parser.add_argument('--timeout', type=float, default=10.0, help='Deadline per managed call (s)')
+    parser.add_argument('--modes', nargs='+', choices=['raw', 'managed', 'hedged'], default=['raw', 'managed', 'hedged'])
+    parser.add_argument('--output', help='Also write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    # The fake server has no real limits; keep the client-side buckets out of the way
+    ratelimit.GROQ_LIMITS[MODEL] = (100000, 10 ** 9)
+    results = {}
+    for mode in args.modes:
+        server = FakeGroqServer(args.latency, args.slow_rate, args.slow_latency, args.error_rate, seed=1).start()
+        try:
+            model = llm.get_chat_model(MODEL, groq_api_base=server.url, api_key='bench')
+            if mode == 'hedged':
+                # Warm up the latency window so the hedging delay is known
+                run_mode('managed', model, 50, args.concurrency, args.timeout)
+            results[mode] = dict(run_mode(mode, model, args.requests, args.concurrency, args.timeout),
+                                 upstream_requests=server.requests, upstream_429s=server.rejected)
+        finally:
+            server.stop()
+        print(mode, json.dumps(results[mode]))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'settings': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,15 @@
-from langchain_core.prompts import PromptTemplate
-from langchain_groq import ChatGroq
 import streamlit as st
 import os
+import tempfile
+import time
 from dotenv import load_dotenv
+from utils.cache import DIAGNOSIS_NAMESPACE, SharedCache, diagnosis_key
+from utils.issues import DEVICE_TYPES, NETWORK_TYPES, USAGE_TYPES, VPN_OPTIONS, WIFI_STRENGTHS
+from utils.jobs import CANCELLED, DONE, FAILED, FAST_PATH_WAIT, POLL_INTERVAL, JobLimitExceeded, job_queue, owner_id
+from utils import batch, llm, pipeline, probe, tracing
+
+# Time this script run for the metrics page
+rerun_span = tracing.start_rerun('diagnose')
 
 # Load environment variables
 load_dotenv()
@@ -12,10 +19,34 @@ os.environ['GROQ_API_KEY'] = groq_api  # Set the environment variable
 # Setting up session states
 if 'predicted_issue_ofGroq' not in st.session_state:
     st.session_state['predicted_issue_ofGroq'] = None
+if 'diagnosis_cache_key' not in st.session_state:
+    st.session_state['diagnosis_cache_key'] = None
+# LLM work runs as background jobs; the page keeps their ids and polls them
+for job_state in ('diagnose_job', 'solution_job', 'prediction_note', 'solution_text', 'batch_job', 'batch_result'):
+    if job_state not in st.session_state:
+        st.session_state[job_state] = None
+if 'solution_requested' not in st.session_state:
+    st.session_state['solution_requested'] = False
+if 'probe_report' not in st.session_state:
+    st.session_state['probe_report'] = None
+if 'measured_issues' not in st.session_state:
+    st.session_state['measured_issues'] = []
+# Inputs the connection probe can fill in (their widgets read these keys)
+for field, default in (('internet_speed', 50), ('ping', 30), ('wifi_strength', WIFI_STRENGTHS[0]), ('network_type', NETWORK_TYPES[0])):
+    if field not in st.session_state:
+        st.session_state[field] = default
 
 # Set Streamlit page config
 st.set_page_config(page_title="AI Network Doctor", layout="wide", page_icon="📡")
 
+# Diagnosis cache shared by every session and, through the cache backend, every replica
+@st.cache_resource
+def get_diagnosis_cache():
+    return SharedCache(DIAGNOSIS_NAMESPACE, max_entries=5000, ttl=7 * 24 * 3600)
+
+diagnosis_cache = get_diagnosis_cache()
+owner = owner_id(st.session_state)
+
 # Custom CSS for styling
 st.markdown("""
 <style>
@@ -73,6 +104,45 @@ This **AI-powered network troubleshooter** simulates **real-time diagnostics** b
 Whether you're experiencing **slow internet**, **high ping**, or **connectivity issues**, this tool will help you identify and fix the problem. 🚀  
 """)
 
+# Measure the connection instead of guessing. The probes run on the server, so they
+# describe the user's connection only when the app runs on the user's own machine.
+if probe.LOCAL_PROBE:
+    st.markdown('<div class="subheader">📶 Measure Your Connection</div>', unsafe_allow_html=True)
+
+    def run_connection_probe():
+        # At most one run per PROBE_INTERVAL per session: each run downloads THROUGHPUT_URL
+        wait = st.session_state.get('probe_last_run', 0) + probe.PROBE_INTERVAL - time.time()
+        if wait > 0:
+            st.session_state['probe_wait'] = wait
+            return
+        st.session_state['probe_last_run'] = time.time()
+        report = probe.measure()
+        measured = probe.to_diagnosis_inputs(report)
+        st.session_state['measured_issues'] = measured.pop('measured_issues')
+        st.session_state['probe_report'] = report
+        # Runs before the widgets are created, so they show the measured values
+        st.session_state.update(measured)
+
+    st.button("📶 Measure My Connection", key="probe_button", on_click=run_connection_probe,
+              help="Measures latency, jitter, packet loss, DNS, download speed and MTU from the machine running this app and fills in the fields below.")
+    # Shown once, on the rerun after the refused click
+    probe_wait = st.session_state.pop('probe_wait', 0)
+    if probe_wait:
+        st.info(f"⏳ You can measure again in {probe_wait:.0f} s.")
+    probe_report = st.session_state['probe_report']
+    if probe_report:
+        def show(value, unit, digits=0):
+            return f"{value:.{digits}f} {unit}" if value is not None else "n/a"
+        st.caption(
+            f"Measured from the machine running this app: "
+            f"ping {show(probe_report['ping_ms'], 'ms')} · jitter {show(probe_report['jitter_ms'], 'ms', 1)} · "
+            f"loss {show(probe_report['loss'] * 100 if probe_report['loss'] is not None else None, '%')} · "
+            f"DNS {show(probe_report['dns_ms'], 'ms')} · download {show(probe_report['download_mbps'], 'Mbps', 1)} · "
+            f"path MTU {show(probe_report['path_mtu'], 'bytes')} · measured in {probe_report['elapsed']:.1f} s"
+        )
+        if st.session_state['measured_issues']:
+            st.warning("Measured problems: " + ", ".join(issue.strip() for issue in st.session_state['measured_issues']))
+
 # Collect User Inputs
 st.markdown('<div class="subheader">🌍 Provide Your Network Details</div>', unsafe_allow_html=True)
 
@@ -81,23 +151,23 @@ col1, col2 = st.columns(2)
 
 with col1:
     # 1️⃣ Internet Speed (Mbps)
-    internet_speed = st.slider("Select your Internet Speed (Mbps)", 1, 500, 50, help="Your current internet speed in Mbps.")
+    internet_speed = st.slider("Select your Internet Speed (Mbps)", 1, 500, key="internet_speed", help="Your current internet speed in Mbps.")
 
     # 2️⃣ Ping (ms)
-    ping = st.slider("Select your Average Ping (ms)", 1, 500, 30, help="Your average ping in milliseconds.")
+    ping = st.slider("Select your Average Ping (ms)", 1, 500, key="ping", help="Your average ping in milliseconds.")
 
     # 3️⃣ WiFi Signal Strength
-    wifi_strength = st.selectbox("Select your WiFi Strength", ["Excellent", "Good", "Weak", "Very Weak"], help="The strength of your WiFi signal.")
+    wifi_strength = st.selectbox("Select your WiFi Strength", WIFI_STRENGTHS, key="wifi_strength", help="The strength of your WiFi signal.")
 
     # 4️⃣ Device Type
-    device_type = st.selectbox("Select your Device", ["Laptop", "Mobile", "Smart TV", "Gaming Console"], help="The type of device you're using.")
+    device_type = st.selectbox("Select your Device", DEVICE_TYPES, help="The type of device you're using.")
 
 with col2:
     # 5️⃣ Usage Type
-    usage_type = st.selectbox("What are you using the network for?", ["Browsing", "Streaming", "Gaming", "Work"], help="The primary use of your network.")
+    usage_type = st.selectbox("What are you using the network for?", USAGE_TYPES, help="The primary use of your network.")
 
     # 6️⃣ Network Type
-    network_type = st.selectbox("What type of network are you using?", ["WiFi", "Ethernet", "Mobile Data", "Satellite"], help="The type of network connection.")
+    network_type = st.selectbox("What type of network are you using?", NETWORK_TYPES, key="network_type", help="The type of network connection.")
 
     # 7️⃣ Router Distance (meters)
     router_distance = st.slider("How far is your device from the router? (meters)", 0, 50, 5, help="The distance between your device and the router.")
@@ -106,90 +176,229 @@ with col2:
     connected_devices = st.slider("How many devices are connected to the network?", 1, 50, 5, help="The number of devices connected to your network.")
 
 # 9️⃣ VPN Usage
-vpn_usage = st.radio("Are you using a VPN?", ["Yes", "No"], help="Whether you're using a VPN or not.")
-
-# Possible Issues
-potential_issues = [
-    "🚨 Packet loss detected", 
-    "❌ Router unreachable", 
-    "🔄 DNS failure", 
-    "⚠️ IP conflict detected", 
-    "🛑 Firewall blocking traffic", 
-    "🚦 ISP throttling suspected", 
-    "🔧 DHCP server failure",
-    "🔴 High CPU usage on network switch",        
-    "📡 Modem firmware outdated",             
-    "🔋 Low power on wireless access point",  
-    "⚡ Asymmetric routing causing packet drops",  
-    "🔀 BGP route flapping detected",             
-    "🛠️ MTU mismatch causing fragmentation",      
-    "📊 QoS misconfiguration affecting traffic",  
-    "🌍 Dual-stack IPv4/IPv6 misconfiguration",   
-    "🔐 SSL/TLS handshake failure",               
-    "📡 STP loop causing broadcast storms",       
-    "🔄 OSPF neighbor adjacency failure"          
-]
+vpn_usage = st.radio("Are you using a VPN?", VPN_OPTIONS, help="Whether you're using a VPN or not.")
+
+# Diagnosis mode
+single_call = st.sidebar.toggle(
+    "Single-call diagnosis", value=False,
+    help="Predict the issues and their solutions in one AI call instead of two."
+)
+
+# Poll a running job until it finishes, then rerun the page to show its result
+@st.fragment(run_every=POLL_INTERVAL)
+def wait_for_job(job_id, message):
+    job = job_queue.get(job_id, owner)
+    if job is None or not job.active:
+        st.rerun()
+    st.info(f"⏳ {message} ({job.elapsed():.0f}s)")
+    if st.button("Cancel", key=f"cancel_{job.kind}_job"):
+        job_queue.cancel(job_id, owner)
+        st.rerun()
+
+# Return the finished job kept under `state_key` (and forget it), or None while it still runs
+def collect_job(state_key, message):
+    job = job_queue.get(st.session_state[state_key], owner) if st.session_state[state_key] else None
+    if job is not None and job.active:
+        wait_for_job(job.id, message)
+        return None
+    st.session_state[state_key] = None
+    if job is not None and isinstance(job.error, llm.LLMUnavailable):
+        st.error(f"⚠️ {job.error}")
+    elif job is not None and job.error is not None:
+        raise job.error
+    return job if job is not None and job.status == DONE else None
+
+# Start generating the solution in the background; the cache keeps it for later visits
+def start_solution_job(cache_key, predicted_issues):
+    def store_solution(solution):
+        diagnosis_cache.update(cache_key, issues=predicted_issues, solution=solution)
+    job = job_queue.submit(owner, pipeline.solve, predicted_issues, kind='solution', on_done=store_solution)
+    st.session_state['solution_job'] = job.id
+    return job
 
 # **Predict an Issue Based on Inputs**
 if st.button("🔍 Diagnose My Network", key="diagnose_button"):
-    st.markdown('<div class="subheader">🛠️ Diagnosing Your Network...</div>', unsafe_allow_html=True)
-    issue_prompt = PromptTemplate.from_template(
-        'You are an AI assistant and predict network-related issues based on the given details.\n'
-        "I am experiencing issues with my internet connection. Here are the details:\n"
-        "Internet Speed: {internet_speed} Mbps\n"
-        "Ping: {ping} ms\n"
-        "WiFi Strength: {wifi_strength}\n"
-        "Device Type: {device_type}\n"
-        "Usage: {usage}\n"
-        "Network Type: {network_type}\n"
-        "Router Distance: {router_distance} meters\n"
-        "Connected Devices: {connected_devices}\n"
-        "VPN Usage: {vpn_usage}\n\n"
-        "These are the possible issues. You must predict only from these issues: {Issues}\n"
-        "Remember, you are restricted to **only these issues**.\n"
-        "Provide exactly **2 potential issues**.\n"
-        "If the issue name is simple, make it complex so that a layman cannot easily understand it."
-        "Do not give any information with issues. Only give their name. only name. not anything else"
-    )
-
-    Predict_issue_prompt = issue_prompt.invoke({
+    diagnosis_inputs = {
         'internet_speed': internet_speed,
         'ping': ping,
         'wifi_strength': wifi_strength,
         'device_type': device_type,
-        'usage': usage_type,
+        'usage_type': usage_type,
         'network_type': network_type,
         'router_distance': router_distance,
         'connected_devices': connected_devices,
         'vpn_usage': vpn_usage,
-        'Issues': potential_issues
-    })
+        'measured_issues': st.session_state['measured_issues']
+    }
+    # A new diagnosis replaces the previous one and anything still running for it
+    for job_state in ('diagnose_job', 'solution_job'):
+        if st.session_state[job_state]:
+            job_queue.cancel(st.session_state[job_state], owner)
+            st.session_state[job_state] = None
+    st.session_state['diagnosis_cache_key'] = diagnosis_key(diagnosis_inputs)
+    st.session_state['predicted_issue_ofGroq'] = None
+    st.session_state['solution_text'] = None
+    st.session_state['solution_requested'] = False
+
+    # Local rules first, then the cache; only unclear, new profiles go to the LLM
+    try:
+        job = job_queue.submit(owner, pipeline.predict_issues, diagnosis_inputs, diagnosis_cache,
+                               single_call=single_call, kind='diagnose')
+    except JobLimitExceeded as e:
+        st.warning(str(e))
+    else:
+        st.session_state['diagnose_job'] = job.id
+        # Rule and cache answers are back before the first poll
+        job.wait(FAST_PATH_WAIT)
 
-    model_groq = ChatGroq(model='gemma2-9b-it')
-    predicted_issue = model_groq.invoke(Predict_issue_prompt)
-    st.session_state['predicted_issue_ofGroq'] = predicted_issue.content
+if st.session_state['diagnose_job']:
+    st.markdown('<div class="subheader">🛠️ Diagnosing Your Network...</div>', unsafe_allow_html=True)
+    diagnose_job = collect_job('diagnose_job', "Diagnosing your network...")
+    if diagnose_job is not None:
+        prediction = diagnose_job.result
+        st.session_state['predicted_issue_ofGroq'] = prediction['issues']
+        if prediction['source'] == 'probe':
+            st.session_state['prediction_note'] = "📶 Based on the problems measured on your connection"
+        elif prediction['source'] == 'rules':
+            confidence_text = ', '.join(f"{c:.0%}" for c in prediction['confidences'])
+            st.session_state['prediction_note'] = f"⚡ Predicted locally from your inputs (confidence {confidence_text})"
+        else:
+            st.session_state['prediction_note'] = None
+        # Speculatively prepare the solution so "Ask AI to Help Solve" usually finds it ready
+        cache_key = st.session_state['diagnosis_cache_key']
+        if prediction['issues'] and not diagnosis_cache.contains(cache_key, field='solution'):
+            try:
+                start_solution_job(cache_key, prediction['issues'])
+            except JobLimitExceeded:
+                pass
+
+if st.session_state['predicted_issue_ofGroq']:
+    if st.session_state['prediction_note']:
+        st.caption(st.session_state['prediction_note'])
     st.markdown('<div class="subheader">🎯 Predicted Issues:</div>', unsafe_allow_html=True)
     st.write(st.session_state['predicted_issue_ofGroq'])
 
 # **Ask AI to Help Solve This Problem**
 if st.session_state['predicted_issue_ofGroq']:
     if st.button("🤖 Ask AI to Help Solve This Problem", key="solve_button"):
-        prompt_template = PromptTemplate.from_template(
-            "You are a Ai assistant who give suggestion to fix the network issues:\n"
-            "the user will provide you the issue and you have to suggest him the best ways to solve the issue. do not ask him to provide more information. Give detailed answer\n"
-            "the issue are following: {predicted_issues}"
-            "You only have these predicted issues. Only reply based on these"
-        )
+        cache_key = st.session_state['diagnosis_cache_key']
+        cached = diagnosis_cache.get(cache_key, field='solution') if cache_key else None
+        prefetched = job_queue.get(st.session_state['solution_job'], owner) if st.session_state['solution_job'] else None
 
-        ai_model_input = prompt_template.invoke({
-            'predicted_issues': st.session_state.predicted_issue_ofGroq
-        })
+        if cached:
+            st.session_state['solution_text'] = cached['solution']
+        else:
+            try:
+                # Wait for the speculative answer that is already on its way, or start one
+                if prefetched is None or prefetched.status in (FAILED, CANCELLED):
+                    prefetched = start_solution_job(cache_key, st.session_state['predicted_issue_ofGroq'])
+            except JobLimitExceeded as e:
+                st.warning(str(e))
+            else:
+                st.session_state['solution_requested'] = True
+                prefetched.wait(FAST_PATH_WAIT)
 
-        solver_groq = ChatGroq(model='gemma2-9b-it')         
-        Solve_issue = solver_groq.invoke(ai_model_input).content
+    if st.session_state['solution_requested'] and st.session_state['solution_job']:
+        solution_job = collect_job('solution_job', "Finishing the solution...")
+        if solution_job is not None:
+            st.session_state['solution_text'] = solution_job.result
+        if st.session_state['solution_job'] is None:
+            st.session_state['solution_requested'] = False
+
+    if st.session_state['solution_text']:
         st.markdown('<div class="subheader">🛠️ Solution:</div>', unsafe_allow_html=True)
-        st.write(Solve_issue)
+        st.write(st.session_state['solution_text'])
+
+# **Batch Diagnosis**
+# Runs in a background job, like the diagnosis; `batch_progress` is shared with the page
+def diagnose_file(input_path, output_path, concurrency, batch_progress):
+    def track_progress(done, total):
+        batch_progress.update(done=done, total=total)
+    def cancelled():
+        return batch_progress['job'] is not None and not batch_progress['job'].active
+    try:
+        return batch.run_batch(input_path, output_path, concurrency, cache=diagnosis_cache,
+                               progress=track_progress, stop=cancelled)
+    finally:
+        os.remove(input_path)
+
+# Show the running batch's progress until it finishes, then rerun the page
+@st.fragment(run_every=POLL_INTERVAL)
+def wait_for_batch(batch_job):
+    job = job_queue.get(batch_job['id'], owner)
+    if job is None or not job.active:
+        st.rerun()
+    done, total = batch_job['progress']['done'], batch_job['progress']['total']
+    st.progress(min(done / total, 1.0) if total else 0.0, text=f"Diagnosed {done} of {total or '?'} rows ({job.elapsed():.0f}s)")
+    if st.button("Cancel", key="cancel_batch_job"):
+        job_queue.cancel(job.id, owner)
+        st.rerun()
+
+# Keep the finished batch's summary and results (read once) and remove its file
+def collect_batch():
+    batch_job = st.session_state['batch_job']
+    job = job_queue.get(batch_job['id'], owner)
+    if job is not None and job.active:
+        wait_for_batch(batch_job)
+        return
+    st.session_state['batch_job'] = None
+    try:
+        if job is not None and job.status == DONE:
+            with open(batch_job['output'], 'rb') as f:
+                st.session_state['batch_result'] = {'summary': job.result, 'data': f.read()}
+        elif job is not None and job.status == FAILED:
+            st.error(str(job.error) if isinstance(job.error, (ValueError, llm.LLMUnavailable)) else "⚠️ The batch diagnosis failed.")
+    finally:
+        os.remove(batch_job['output'])
+
+st.markdown('<div class="subheader">📦 Batch Diagnosis</div>', unsafe_allow_html=True)
+with st.expander("Diagnose a whole telemetry file (CSV or Parquet)"):
+    st.write("Each row needs these columns: " + ", ".join(f"`{field}`" for field in batch.FIELDS))
+    telemetry_file = st.file_uploader("Upload telemetry", type=["csv", "parquet"])
+    concurrency = st.slider("Parallel AI requests", 1, 32, batch.DEFAULT_CONCURRENCY, help="Maximum number of Groq calls in flight.")
+    if telemetry_file and st.button("📦 Diagnose File", key="batch_button"):
+        if st.session_state['batch_job']:
+            job_queue.cancel(st.session_state['batch_job']['id'], owner)
+        st.session_state['batch_job'] = None
+        st.session_state['batch_result'] = None
+        # The job reads a copy of the upload, so later reruns (or a new upload) don't touch it
+        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(telemetry_file.name)[1], delete=False) as upload:
+            upload.write(telemetry_file.getvalue())
+        with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as output:
+            output_path = output.name
+        batch_progress = {'done': 0, 'total': 0, 'job': None}
+        try:
+            job = job_queue.submit(owner, diagnose_file, upload.name, output_path, concurrency, batch_progress, kind='batch')
+        except JobLimitExceeded as e:
+            os.remove(upload.name)
+            os.remove(output_path)
+            st.warning(str(e))
+        else:
+            batch_progress['job'] = job
+            st.session_state['batch_job'] = {'id': job.id, 'output': output_path, 'progress': batch_progress}
+
+    if st.session_state['batch_job']:
+        collect_batch()
+
+    if st.session_state['batch_result']:
+        summary = st.session_state['batch_result']['summary']
+        st.success(
+            f"Diagnosed {summary['rows']} rows ({summary['unique']} unique profiles): "
+            f"{summary['rules']} by local rules, {summary['cache']} from cache, {summary['llm']} by AI, {summary['errors']} errors."
+        )
+        st.download_button("Download Results", data=st.session_state['batch_result']['data'],
+                            file_name='diagnosis_results.csv', mime='text/csv')
+
+# Cache statistics
+cache_stats = diagnosis_cache.stats()
+st.sidebar.caption(
+    f"⚡ Diagnosis cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+    f"({cache_stats['hit_ratio']:.0%} hit ratio, {cache_stats['entries']} entries)"
+)
 
 # Footer
 st.markdown("---")
-st.markdown('<div class="footer">Made with ❤️ by <b>AI Network Doctor</b> | Powered by Streamlit & AI</div>', unsafe_allow_html=True)
\ No newline at end of file
+st.markdown('<div class="footer">Made with ❤️ by <b>AI Network Doctor</b> | Powered by Streamlit & AI</div>', unsafe_allow_html=True)
+
+# Record how long this script run took
+rerun_span.end()
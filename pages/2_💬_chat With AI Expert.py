@@ -1,17 +1,49 @@
 import streamlit as st
-from langchain_groq import ChatGroq
-from langchain_core.prompts import PromptTemplate
 from dotenv import load_dotenv
 import os
+from utils.memory import ConversationMemory
+from utils.prompts import get_prompt
+from utils.jobs import CANCELLED, JobLimitExceeded, job_queue, owner_id
+from utils.semantic_cache import SemanticCache
+from utils.streaming import StreamStats, ThinkStreamParser
+from utils import llm, router, tracing
+
+# Time this script run for the metrics page
+rerun_span = tracing.start_rerun('chat')
 
 # Load environment variables
 load_dotenv()
 groq_api = os.getenv('GROQ_API_KEY')
 os.environ['GROQ_API_KEY'] = groq_api  # Set the environment variable
 
+# Messages shown per page of chat history
+HISTORY_PAGE_SIZE = 20
+# Seconds between redraws of an answer that is still being generated
+ANSWER_POLL_INTERVAL = 0.25
+
+# Summarize turns that no longer fit in the prompt with the small, fast model
+def summarize_history(summary, messages):
+    summary_prompt = get_prompt('chat_summary').invoke({'summary': summary or 'None yet.', 'messages': messages})
+    try:
+        return router.invoke('trivial', summary_prompt, timeout=20, prompt_name='chat_summary', temperature=0).content.strip()
+    except llm.LLMUnavailable:
+        # Answering matters more than the summary: keep the previous one
+        return summary
+
+# Answers to earlier questions, shared by all sessions and kept on disk
+@st.cache_resource
+def get_answer_cache():
+    return SemanticCache()
+
 # Initialize chat history in session state
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+if "memory" not in st.session_state:
+    st.session_state.memory = ConversationMemory(summarizer=summarize_history)
+    st.session_state.history_pages = 1
+memory = st.session_state.memory
+# Answers are generated as background jobs, so using the page meanwhile does not lose them
+if "chat_job" not in st.session_state:
+    st.session_state.chat_job = None
+owner = owner_id(st.session_state)
 
 # Display header only once at the start
 if "hide_header" not in st.session_state:
@@ -20,27 +52,23 @@ if "hide_header" not in st.session_state:
 if not st.session_state.hide_header:
     st.header('📡 Chat with Reasoning AI Network Doctor - Intelligent Troubleshooting')
 
-# Initialize ChatGroq model
-chat_model = ChatGroq(
-    model='deepseek-r1-distill-llama-70b',
-    temperature=0.5,
-    top_p=0.5
-)
-
-# Define prompt template
-prompts = PromptTemplate.from_template(
-    "You are an AI Network Troubleshooting Assistant, specializing in diagnosing and resolving network-related issues. "
-    "Your primary goal is to give detialed answr of the user queries "
-    "Follow these guidelines:\n\n"
-    
-    "- If the user greets you (e.g., 'hi', 'hello', 'hey'), respond politely and professionally before asking how you can assist with a network issue.\n"
-    "- If the user describes a network issue, provide a **concise troubleshooting guide** (3-5 sentences max), including possible causes and steps.\n"
-    "- Do **not** ask for additional details—assume the user wants direct solutions.\n"
-    "- Keep responses **short, professional, and easy to understand**.\n"
-    "- If you need to 'think' before answering, summarize your thought process in **one short sentence** inside `<think>` tags.\n\n"
-
-    "User's message: {question}"
-    'Give longest possible answer. Your answer should be very very long'
+# Start over: the old conversation and its transcript on disk are deleted
+if st.sidebar.button("🗑️ New Conversation", disabled=st.session_state.chat_job is not None, help="Clear the chat history."):
+    memory.clear()
+    st.session_state.history_pages = 1
+    st.rerun()
+
+# Streaming renders tokens as they arrive instead of waiting for the full answer
+stream_responses = st.sidebar.toggle("Stream responses", value=True, help="Show the answer while it is being generated.")
+
+# Rephrasings of an earlier first question ("my ping is high" / "high ping") reuse its answer
+answer_cache = get_answer_cache()
+use_answer_cache = st.sidebar.toggle("Reuse answers to similar questions", value=True, help="Answer a new conversation's first question from earlier answers when it means the same thing.")
+similarity_threshold = st.sidebar.slider("Similarity needed", 0.5, 1.0, answer_cache.threshold, 0.01, disabled=not use_answer_cache)
+cache_stats = answer_cache.stats()
+st.sidebar.caption(
+    f"🗂️ {cache_stats['entries']} cached answers · {cache_stats['hit_ratio']:.0%} hit ratio · "
+    f"{cache_stats['mean_lookup_ms']:.2f} ms per lookup"
 )
 
 # Custom CSS for the "thinking" box
@@ -58,44 +86,153 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Display chat history
-for msg in st.session_state.messages:
-    with st.chat_message(msg["role"]):
-        st.markdown(msg["content"])
+# Display chat history, newest pages only; older messages are loaded on request
+shown = min(st.session_state.history_pages * HISTORY_PAGE_SIZE, len(memory))
+if shown < len(memory):
+    if st.button(f"⬆️ Show earlier messages ({len(memory) - shown} hidden)"):
+        st.session_state.history_pages += 1
+        st.rerun()
+for page in reversed(range(st.session_state.history_pages)):
+    for msg in memory.page(page, HISTORY_PAGE_SIZE):
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
+
+def thinking_box(text):
+    return f'<div class="thinking-box"><strong>🤔 Thinking:</strong> {text}</div>'
+
+# Runs in the job: the history may first need a summarizer call, so the prompt is built there too
+def answer_prompt(prompts, question, memory):
+    return prompts.invoke({'question': question, 'history': memory.context() or 'This is the first message.'})
+
+# Runs in the job: collects the streamed answer chunk by chunk
+def stream_answer(route, prompts, question, memory, params, stats):
+    for chunk in router.stream(route, answer_prompt(prompts, question, memory), **params):
+        stats.record(chunk.content)
+        yield chunk.content
+    stats.finish()
+
+def invoke_answer(route, prompts, question, memory, params):
+    return router.invoke(route, answer_prompt(prompts, question, memory), **params).content
+
+# The pending answer's parser only gets the chunks it has not seen yet, so a poll
+# costs the new text instead of re-parsing the whole answer
+def parse_new_chunks(pending, job):
+    chunks = job.chunks[pending['chunks_parsed']:]
+    pending['parser'].feed(''.join(chunks))
+    pending['chunks_parsed'] += len(chunks)
+    return pending['parser']
+
+# Redraw the answer while it is generated; rerun the page once it is done
+@st.fragment(run_every=ANSWER_POLL_INTERVAL)
+def show_pending_answer(job_id, streaming):
+    job = job_queue.get(job_id, owner)
+    if job is None or not job.active:
+        st.rerun()
+    parser = parse_new_chunks(st.session_state.chat_job, job)
+    if parser.thinking.strip():
+        st.markdown(thinking_box(parser.thinking.strip()), unsafe_allow_html=True)
+    with st.chat_message("assistant"):
+        if streaming and parser.answer.strip():
+            st.markdown(parser.answer.strip() + " ▌")
+        else:
+            st.markdown(f"⏳ Thinking... ({job.elapsed():.0f}s)")
+    if st.button("⏹️ Stop", key="cancel_chat_job"):
+        job_queue.cancel(job_id, owner)
+        st.rerun()
+
+pending = st.session_state.chat_job
 
 # Get user input
-user_input = st.chat_input("e.g. I am Facing High Ping ")
+user_input = st.chat_input("e.g. I am Facing High Ping ", disabled=pending is not None)
 
-if user_input:
+if user_input and pending is not None:
+    st.warning("⏳ Still answering your previous question.")
+elif user_input:
     # Hide the header after the first question
     st.session_state.hide_header = True
 
-    # Append user message to chat history
-    st.session_state.messages.append({"role": "user", "content": user_input})
-
+    # Greetings and small talk get a short answer from a small model; real
+    # questions go to the reasoning model. Both fall back to another model on failure.
+    route = router.classify(user_input)
+    prompt_name = 'chat_brief' if route == 'trivial' else 'chat'
+    prompts = get_prompt(prompt_name)
+    # The prompt's output budget (utils.prompts.OUTPUT_BUDGETS) caps the answer length
+    model_params = {'temperature': 0.5, 'top_p': 0.5, 'prompt_name': prompt_name}
+
+    # Only a conversation's first question stands on its own, so only it is looked up and stored
+    first_question = use_answer_cache and len(memory) == 0
+    cached_answer = answer_cache.lookup(user_input, threshold=similarity_threshold) if first_question else None
+
+    if cached_answer:
+        final_answer, thinking_text, similarity = cached_answer
+        with st.chat_message("user"):
+            st.markdown(user_input)
+        if thinking_text:
+            st.markdown(thinking_box(thinking_text), unsafe_allow_html=True)
+        with st.chat_message("assistant"):
+            st.markdown(final_answer)
+        st.caption(f"⚡ Reused the answer to a similar question (similarity {similarity:.2f})")
+        # Append both turns to chat history
+        memory.add("user", user_input)
+        memory.add("assistant", final_answer)
+    else:
+        # Generate AI response in the background
+        stats = StreamStats()
+        try:
+            if stream_responses:
+                job = job_queue.submit(owner, stream_answer, route, prompts, user_input, memory, model_params, stats,
+                                       kind='chat', stream=True)
+            else:
+                job = job_queue.submit(owner, invoke_answer, route, prompts, user_input, memory, model_params, kind='chat')
+        except JobLimitExceeded as e:
+            st.warning(str(e))
+        else:
+            pending = st.session_state.chat_job = {
+                'id': job.id, 'question': user_input, 'first_question': first_question,
+                'streaming': stream_responses, 'stats': stats,
+                'parser': ThinkStreamParser(), 'chunks_parsed': 0,
+            }
+
+if pending is not None:
     # Display user message
     with st.chat_message("user"):
-        st.markdown(user_input)
-
-    # Generate AI response
-    model_prompt = prompts.invoke({'question': user_input})
-    model = chat_model.invoke(model_prompt)
-    answer = model.content
-
-    # Extract "thinking" part if present
-    thinking_text = None
-    final_answer = answer
-    if "<think>" in answer and "</think>" in answer:
-        thinking_text = answer.split("<think>")[1].split("</think>")[0].strip()
-        final_answer = answer.split("</think>")[-1].strip()  # Remove thinking part
-
-    # Display AI "thinking" box
-    if thinking_text:
-        st.markdown(f'<div class="thinking-box"><strong>🤔 Thinking:</strong> {thinking_text}</div>', unsafe_allow_html=True)
-
-    # Display AI response
-    with st.chat_message("assistant"):
-        st.markdown(final_answer)
-
-    # Append AI response to chat history
-    st.session_state.messages.append({"role": "assistant", "content": final_answer})
+        st.markdown(pending['question'])
+    job = job_queue.get(pending['id'], owner)
+    if job is not None and job.active:
+        show_pending_answer(job.id, pending['streaming'])
+    else:
+        st.session_state.chat_job = None
+        final_answer = None
+        if job is None or job.status == CANCELLED:
+            st.caption("⏹️ Answer stopped")
+        elif job.error is not None:
+            if not isinstance(job.error, llm.LLMUnavailable):
+                raise job.error
+            st.error(f"⚠️ {job.error}")
+        else:
+            # Split the "thinking" part from the answer
+            if pending['streaming']:
+                parser = parse_new_chunks(pending, job)
+            else:
+                parser = pending['parser']
+                parser.feed(job.result)
+            parser.close()
+            thinking_text = parser.thinking.strip()
+            final_answer = parser.answer.strip()
+            if thinking_text:
+                st.markdown(thinking_box(thinking_text), unsafe_allow_html=True)
+            with st.chat_message("assistant"):
+                st.markdown(final_answer)
+            stats = pending['stats']
+            if pending['streaming'] and stats.ttft is not None:
+                st.caption(f"⏱️ First token after {stats.ttft:.2f}s · {stats.tokens_per_second:.1f} tokens/s")
+            if final_answer and pending['first_question']:
+                answer_cache.add(pending['question'], final_answer, thinking_text)
+
+        if final_answer:
+            # Append both turns to chat history
+            memory.add("user", pending['question'])
+            memory.add("assistant", final_answer)
+
+# Record how long this script run took
+rerun_span.end()
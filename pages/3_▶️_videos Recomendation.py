@@ -1,29 +1,18 @@
 import streamlit as st
-from googleapiclient.discovery import build
 import os
 from dotenv import load_dotenv
+from utils import tracing, youtube
+
+# Time this script run for the metrics page
+rerun_span = tracing.start_rerun('videos')
 
 load_dotenv()
 # API key
 API_KEY = os.getenv('youtube_api_key')
 
-# Function to search YouTube videos
+# Function to search YouTube videos (shared client, cached results, quota tracking)
 def search_youtube_videos(query, max_results=5):
-    youtube = build('youtube', 'v3', developerKey=API_KEY)
-    request = youtube.search().list(
-        q=query,
-        part='snippet',
-        type='video',
-        maxResults=max_results
-    )
-    response = request.execute()
-    videos = []
-    for item in response['items']:
-        video_id = item['id']['videoId']
-        video_title = item['snippet']['title']
-        video_url = f"https://www.youtube.com/watch?v={video_id}"
-        videos.append((video_title, video_url))
-    return videos
+    return youtube.search_videos(API_KEY, query, max_results)
 
 # Set Streamlit page config
 st.set_page_config(page_title="YouTube Video Search", layout="wide")
@@ -61,7 +50,11 @@ max_results = st.slider("Number of videos to display:", 1, 10, 5)
 # Search for videos when the user clicks the button
 if st.button("Search"):
     st.write(f"Searching for: **{query}**")
-    videos = search_youtube_videos(query, max_results=max_results)
+    try:
+        videos = search_youtube_videos(query, max_results=max_results)
+    except youtube.QuotaExceeded as e:
+        st.error(f"{e}. Please try again tomorrow.")
+        videos = None
     
     if videos:
         st.write(f"Here are {len(videos)} YouTube videos that might help:")
@@ -71,5 +64,10 @@ if st.button("Search"):
                 <a href="{url}" target="_blank">{title}</a>
             </div>
             """, unsafe_allow_html=True)
-    else:
+    elif videos is not None:
         st.write("No relevant videos found.")
+
+st.caption(f"YouTube quota remaining today: {youtube.quota.remaining} of {youtube.quota.daily_limit} units")
+
+# Record how long this script run took
+rerun_span.end()
@@ -1,8 +1,13 @@
 import streamlit as st
-from langchain import LLMChain, PromptTemplate
-from langchain_groq import ChatGroq
 import os
+import threading
 from dotenv import load_dotenv
+from utils.jobs import DONE, FAST_PATH_WAIT, POLL_INTERVAL, JobLimitExceeded, job_queue, owner_id
+from utils.llm import LLMUnavailable
+from utils import isp, tracing
+
+# Time this script run for the metrics page
+rerun_span = tracing.start_rerun('isp')
 
 # Load environment variables
 load_dotenv()
@@ -12,6 +17,24 @@ os.environ['GROQ_API_KEY'] = groq_api  # Set the environment variable
 # Set up the Streamlit page configuration
 st.set_page_config(page_title='Best Internet Provider', layout='wide')
 
+# Recommendation cache shared by every session (and persisted on disk for a month)
+@st.cache_resource
+def get_isp_cache():
+    cache = isp.get_isp_cache()
+    if os.getenv('NETDOC_ISP_PREWARM_ON_START') == '1':
+        # Fill in the common countries in the background so the first users hit the cache
+        threading.Thread(target=isp.prewarm, args=(cache,), daemon=True, name='isp-prewarm').start()
+    return cache
+
+isp_cache = get_isp_cache()
+
+# The recommendation is generated in the background; the page keeps the job id
+owner = owner_id(st.session_state)
+if 'isp_job' not in st.session_state:
+    st.session_state['isp_job'] = None
+if 'isp_result' not in st.session_state:
+    st.session_state['isp_result'] = None
+
 # Custom CSS for styling
 st.markdown("""
 <style>
@@ -43,35 +66,10 @@ vpn = st.radio('Will you use VPN?', ['Yes', 'No', "Sometimes"])
 # New input field for issues they are facing
 current_issues = st.text_input('What issues are you facing with your current internet? (e.g., slow speed, frequent disconnections, high ping)')
 
-# Groq model setup
-llm = ChatGroq(model='llama-3.3-70b-versatile')
-
-# Define the prompt template for the Groq model
-prompt_template = PromptTemplate(
-    input_variables=["mbs_needed", "ms", "no_of_meters", "no_of_devices", "usage_type", "your_device_type", "vpn", "selected_country", "current_issues"],
-    template="""
-    Based on the following user preferences and issues, recommend the best Internet Service Provider:
-    - Preferred Internet Speed: {mbs_needed} MBs
-    - Preferred MS (ping): {ms}
-    - Average distance between device and modem: {no_of_meters} meters
-    - Number of Devices: {no_of_devices}
-    - Usage Type: {usage_type}
-    - Device Type: {your_device_type}
-    - VPN Usage: {vpn}
-    - Country: {selected_country}
-    - Current Issues: {current_issues}
-
-    Just give the best ISP provider name according to the user's preferences and issues mentioned above. Also, provide a brief explanation of why it is the best fit and how it addresses the user's current issues.
-    If the user has not mentioned their country name, ask them to mention it and do not provide an answer.
-    """
-)
-
-# Create the LLMChain
-chain = LLMChain(llm=llm, prompt=prompt_template)
-
 # Button to generate recommendation
 if st.button('Get Recommendation'):
-    if not selected_country:
+    # Nothing is built or looked up without a country: the answer would only ask for one
+    if not selected_country.strip():
         st.warning("Please enter your country name to get a recommendation.")
     else:
         # Prepare the input data
@@ -87,13 +85,56 @@ if st.button('Get Recommendation'):
             "current_issues": current_issues
         }
 
-        # Get the recommendation from the Groq model
-        recommendation = chain.run(input_data)
+        # Similar profiles in the same country share one cached answer; on a miss the
+        # shared Groq chain is called, and identical concurrent requests share that call.
+        # It runs as a background job, so using the page meanwhile does not lose the answer.
+        if st.session_state['isp_job']:
+            job_queue.cancel(st.session_state['isp_job'], owner)
+        try:
+            job = job_queue.submit(owner, isp.recommend, input_data, isp_cache, kind='isp')
+        except JobLimitExceeded as e:
+            st.warning(str(e))
+        else:
+            st.session_state['isp_job'] = job.id
+            st.session_state['isp_result'] = None
+            # Cached answers are back before the first poll
+            job.wait(FAST_PATH_WAIT)
+
+# Poll the running job until it finishes, then rerun the page to show the answer
+@st.fragment(run_every=POLL_INTERVAL)
+def wait_for_recommendation(job_id):
+    job = job_queue.get(job_id, owner)
+    if job is None or not job.active:
+        st.rerun()
+    st.info(f"⏳ Finding the best providers for you... ({job.elapsed():.0f}s)")
+    if st.button("Cancel", key="cancel_isp_job"):
+        job_queue.cancel(job_id, owner)
+        st.rerun()
+
+if st.session_state['isp_job']:
+    job = job_queue.get(st.session_state['isp_job'], owner)
+    if job is not None and job.active:
+        wait_for_recommendation(job.id)
+    else:
+        st.session_state['isp_job'] = None
+        if job is not None and job.status == DONE:
+            st.session_state['isp_result'] = job.result
+        elif job is not None and isinstance(job.error, LLMUnavailable):
+            st.error(f"⚠️ {job.error}")
+        elif job is not None and job.error is not None:
+            raise job.error
+
+if st.session_state['isp_result']:
+    recommendation, from_cache = st.session_state['isp_result']
+    # Display the recommendation in Markdown format
+    st.markdown('<div class="recommendation-box">', unsafe_allow_html=True)
+    st.subheader("🎯 Recommended Internet Service Provider")
+    st.markdown(f"""
+    {recommendation}
+    """)
+    st.markdown('</div>', unsafe_allow_html=True)
+    if from_cache:
+        st.caption("⚡ Served from the recommendation cache")
 
-        # Display the recommendation in Markdown format
-        st.markdown('<div class="recommendation-box">', unsafe_allow_html=True)
-        st.subheader("🎯 Recommended Internet Service Provider")
-        st.markdown(f"""
-        {recommendation}
-        """)
-        st.markdown('</div>', unsafe_allow_html=True)
\ No newline at end of file
+# Record how long this script run took
+rerun_span.end()
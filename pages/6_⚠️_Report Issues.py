@@ -1,9 +1,20 @@
+import tempfile
+import threading
 import streamlit as st
-import pandas as pd
-import folium
-from streamlit_folium import folium_static
-from folium.plugins import HeatMap
-from geopy.geocoders import Nominatim
+import streamlit.components.v1 as components
+from utils.geocoding import Geocoder
+from utils.issue_store import FILTER_COLUMNS, FilterIndex, IssueStore
+from utils.maps import MAP_HEIGHT, MAP_WIDTH, HeatGrid, bbox_around, build_map, empty_map, popup_html, render_html
+from utils import tracing
+
+# Time this script run for the metrics page
+rerun_span = tracing.start_rerun('report')
+
+# Most recent reports drawn as markers on the map
+MAX_MAP_REPORTS = 20000
+# Rows per page of the reported issues table
+TABLE_PAGE_SIZES = [25, 50, 100, 250]
+EXPORT_FORMATS = {'CSV': ('csv', 'text/csv'), 'Parquet': ('parquet', 'application/vnd.apache.parquet')}
 
 # Set up the Streamlit page configuration
 st.set_page_config(page_title='Community Asset Mapping', layout='wide')
@@ -12,29 +23,65 @@ st.set_page_config(page_title='Community Asset Mapping', layout='wide')
 st.title('🌍 Community Asset Mapping')
 st.write('Report and view local network issues to help improve connectivity in your area.')
 
-# Initialize session state for storing reported issues
-if 'reported_issues' not in st.session_state:
-    st.session_state.reported_issues = pd.DataFrame(columns=['Latitude', 'Longitude', 'Issue', 'Description', 'User'])
+# Reported issues live in a shared, persistent store so every user sees them
+@st.cache_resource
+def get_issue_store():
+    return IssueStore()
+
+# Process-wide heat grid, updated incrementally with reports it has not seen yet
+@st.cache_resource
+def get_heat_grid():
+    return HeatGrid(), threading.Lock()
+
+# Process-wide Issue/User posting lists for the filters, updated incrementally like the heat grid
+@st.cache_resource
+def get_filter_index():
+    return FilterIndex(), threading.Lock()
+
+# One cached, rate-limited geocoder per process
+@st.cache_resource
+def get_geocoder():
+    return Geocoder()
+
+issue_store = get_issue_store()
+geocoder = get_geocoder()
+
+def refresh_heat_grid(version):
+    heat_grid, lock = get_heat_grid()
+    with lock:
+        if heat_grid.last_id < version:
+            new_reports = issue_store.query(since_id=heat_grid.last_id)
+            heat_grid.add(new_reports['Latitude'].to_numpy(), new_reports['Longitude'].to_numpy())
+            heat_grid.last_id = int(new_reports.index.max())
+    return heat_grid
+
+# The map HTML is cached per data version and map area, so reruns that don't change the data skip regeneration
+@st.cache_data(max_entries=32, show_spinner=False)
+def get_map_html(version, bbox):
+    with tracing.span('map.render'):
+        return _render_map_html(version, bbox)
+
+def _render_map_html(version, bbox):
+    reports = issue_store.query(bbox=bbox, limit=MAX_MAP_REPORTS, newest_first=True)
+    if not reports.empty:
+        # Build markers and heat layer from whole columns instead of row by row
+        m = build_map(
+            reports['Latitude'].to_numpy(),
+            reports['Longitude'].to_numpy(),
+            popup_html(reports['Issue'], reports['Description'], reports['User']),
+            refresh_heat_grid(version).points(bbox)
+        )
+    else:
+        m = empty_map()
+    return render_html(m)
 
 # Function to add a new issue
 def add_issue(lat, lon, issue, description, user):
-    new_issue = pd.DataFrame({
-        'Latitude': [lat],
-        'Longitude': [lon],
-        'Issue': [issue],
-        'Description': [description],
-        'User': [user]
-    })
-    st.session_state.reported_issues = pd.concat([st.session_state.reported_issues, new_issue], ignore_index=True)
+    issue_store.add(lat, lon, issue, description, user)
 
 # Function to geocode an address
 def geocode_address(address):
-    geolocator = Nominatim(user_agent="community_asset_mapping")
-    location = geolocator.geocode(address)
-    if location:
-        return location.latitude, location.longitude
-    else:
-        return None, None
+    return geocoder.geocode(address)
 
 # User input for reporting issues
 st.subheader('📝 Report a Network Issue')
@@ -59,57 +106,127 @@ if st.button('Report Issue'):
     else:
         st.warning('Please enter a valid address.')
 
+# Bulk import of reports, geocoded in the background
+with st.expander('📥 Bulk Import Reports (CSV)'):
+    st.write('The CSV needs `Address` and `Issue` columns; `Description` and `User` are optional.')
+    import_file = st.file_uploader('Upload reports', type=['csv'])
+    if import_file and st.button('Import Reports'):
+        import pandas as pd
+
+        reports = pd.read_csv(import_file)
+        if 'Address' not in reports.columns or 'Issue' not in reports.columns:
+            st.error('The CSV must have `Address` and `Issue` columns.')
+        else:
+            # Blank cells are read as NaN: rows without an address or issue can't be stored
+            usable = reports['Address'].notna() & reports['Issue'].notna()
+            skipped = int((~usable).sum())
+            reports = reports[usable].astype({'Address': str, 'Issue': str})
+            for column in ('Description', 'User'):
+                reports[column] = reports[column].fillna('').astype(str) if column in reports.columns else ''
+            if skipped:
+                st.warning(f'Skipped {skipped} rows without an `Address` or `Issue`.')
+            import_progress = {'done': 0, 'total': 0}
+            def track_progress(done, total):
+                import_progress.update(done=done, total=total)
+            future = geocoder.submit_many(reports['Address'], progress=track_progress)
+            st.session_state.import_job = (reports, future, import_progress)
+
+    if 'import_job' in st.session_state:
+        reports, future, import_progress = st.session_state.import_job
+        if future.done():
+            # Dropped whatever happens, so a failed import is not raised again on every rerun
+            del st.session_state.import_job
+            try:
+                locations = future.result()
+                rows = []
+                for report in reports.to_dict('records'):
+                    lat, lon = locations[report['Address']]
+                    if lat is not None and lon is not None:
+                        rows.append((lat, lon, report['Issue'], report['Description'], report['User']))
+                issue_store.add_many(rows)
+                st.success(f'Imported {len(rows)} reports ({len(reports) - len(rows)} addresses could not be found).')
+            except Exception as e:
+                st.error(f'The import failed: {e}')
+        else:
+            st.info(f"Geocoding addresses in the background: {import_progress['done']} of {import_progress['total'] or '?'} done.")
+            st.button('Refresh Import Status')
+
 # Display the map with reported issues
 st.subheader('🗺️ Reported Network Issues')
-if not st.session_state.reported_issues.empty:
-    # Create a Folium map centered at the mean of reported issues
-    m = folium.Map(location=[st.session_state.reported_issues['Latitude'].mean(), 
-                             st.session_state.reported_issues['Longitude'].mean()], 
-                   zoom_start=10)
-
-    # Add markers for each reported issue
-    for index, row in st.session_state.reported_issues.iterrows():
-        folium.Marker(
-            location=[row['Latitude'], row['Longitude']],
-            popup=f"Issue: {row['Issue']}<br>Description: {row['Description']}<br>Reported by: {row['User']}",
-            icon=folium.Icon(color='red', icon='exclamation-circle')
-        ).add_to(m)
-
-    # Add a heatmap for issue density
-    heat_data = [[row['Latitude'], row['Longitude']] for index, row in st.session_state.reported_issues.iterrows()]
-    HeatMap(heat_data).add_to(m)
-
-    # Display the map
-    folium_static(m)
-else:
-    # Default map location (e.g., New Delhi, India)
-    m = folium.Map(location=[28.6139, 77.2090], zoom_start=10)
-    folium_static(m)
+with st.expander('🔎 Map area'):
+    map_area = st.text_input('Show reports around (address)', help="Leave empty to show the most recent reports everywhere.")
+    radius_km = st.slider('Radius (km)', 1, 500, 50)
+
+# Only re-geocode the map area when the address changes
+if map_area and st.session_state.get('map_area') != map_area:
+    st.session_state.map_area = map_area
+    st.session_state.map_area_center = geocode_address(map_area)
+map_center = st.session_state.get('map_area_center') if map_area else None
+bbox = None
+if map_center and map_center[0] is not None:
+    bbox = bbox_around(map_center[0], map_center[1], radius_km)
+elif map_area:
+    st.warning('Could not find the map area address. Showing all reports.')
+
+data_version = issue_store.version()
+components.html(get_map_html(data_version, bbox), height=MAP_HEIGHT + 10, width=MAP_WIDTH)
+if data_version == 0:
     st.write('No issues reported yet. Be the first to report an issue!')
 
-# Filters for reported issues
-st.subheader('🔍 Filter Reported Issues')
-issue_filter = st.multiselect('Filter by Issue Type', st.session_state.reported_issues['Issue'].unique())
-user_filter = st.multiselect('Filter by User', st.session_state.reported_issues['User'].unique())
-
-# Apply filters
-filtered_issues = st.session_state.reported_issues
-if issue_filter:
-    filtered_issues = filtered_issues[filtered_issues['Issue'].isin(issue_filter)]
-if user_filter:
-    filtered_issues = filtered_issues[filtered_issues['User'].isin(user_filter)]
+# Filters for reported issues, answered from the in-memory filter index
+def refresh_filter_index(version):
+    filter_index, lock = get_filter_index()
+    with lock:
+        if filter_index.last_id < version:
+            filter_index.add(issue_store.query(since_id=filter_index.last_id, columns=FILTER_COLUMNS))
+    return filter_index, lock
 
-# Display the filtered table of reported issues
+filter_index, filter_lock = refresh_filter_index(data_version)
+st.subheader('🔍 Filter Reported Issues')
+with filter_lock:
+    issue_options = filter_index.options('Issue')
+    user_options = filter_index.options('User')
+issue_filter = st.multiselect('Filter by Issue Type', issue_options)
+user_filter = st.multiselect('Filter by User', user_options)
+with filter_lock:
+    filtered_ids = filter_index.match(Issue=issue_filter, User=user_filter)
+
+# Display the filtered table of reported issues, one page at a time: only the shown rows are loaded
 st.subheader('📋 List of Reported Issues')
-st.dataframe(filtered_issues)
-
-# Export reported issues as CSV
+col1, col2 = st.columns(2)
+page_size = col2.selectbox('Rows per page', TABLE_PAGE_SIZES, index=2)
+page_count = max((len(filtered_ids) + page_size - 1) // page_size, 1)
+# Narrower filters can leave fewer pages than the one shown
+if st.session_state.get('report_table_page', 1) > page_count:
+    st.session_state.report_table_page = page_count
+table_page = col1.number_input(f'Page (of {page_count})', 1, page_count, key='report_table_page')
+start = (table_page - 1) * page_size
+st.dataframe(issue_store.query(ids=filtered_ids[start:start + page_size]).reset_index(drop=True))
+st.caption(f'Showing {min(start + 1, len(filtered_ids))}-{min(start + page_size, len(filtered_ids))} of {len(filtered_ids)} reports')
+
+# Export the filtered reports, only when asked for. The Export button writes them to a
+# temporary file a chunk at a time, so no DataFrame of every report is built; the result
+# is kept for the download button until it is used or the filters or format change.
 st.subheader('📤 Export Data')
-if st.button('Export as CSV'):
-    csv = filtered_issues.to_csv(index=False)
+export_format = st.radio('Format', list(EXPORT_FORMATS), horizontal=True)
+extension, mime = EXPORT_FORMATS[export_format]
+export_filters = (export_format, tuple(issue_filter), tuple(user_filter), data_version)
+if st.session_state.get('report_export', {}).get('filters') != export_filters:
+    st.session_state.pop('report_export', None)
+if st.button('Export'):
+    with tracing.span('report.export', rows=len(filtered_ids)), tempfile.TemporaryFile() as export_file:
+        issue_store.export(filtered_ids, export_file, extension)
+        export_file.seek(0)
+        st.session_state.report_export = {'filters': export_filters, 'data': export_file.read()}
+if 'report_export' in st.session_state:
+    # Streamlit keeps the download's data in memory; dropping it after the download frees it
     st.download_button(
-        label="Download CSV",
-        data=csv,
-        file_name='reported_issues.csv',
-        mime='text/csv'
-    )   
\ No newline at end of file
+        label=f"Download {export_format}",
+        data=st.session_state.report_export['data'],
+        file_name=f'reported_issues.{extension}',
+        mime=mime,
+        on_click=lambda: st.session_state.pop('report_export', None)
+    )
+
+# Record how long this script run took
+rerun_span.end()
@@ -0,0 +1,95 @@
+import os
+import streamlit as st
+import pandas as pd
+from utils.jobs import job_queue
+from utils.tracing import tracer
+
+# The metrics belong to every session of this process, so only an operator may clear them
+ALLOW_CLEAR = os.getenv('NETDOC_ALLOW_CLEAR_METRICS', '0') == '1'
+
+# Set up the Streamlit page configuration
+st.set_page_config(page_title='Metrics', layout='wide')
+
+# Title and Description
+st.title('📊 Performance Metrics')
+st.write('Latency of page reruns and external calls (LLM, geocoding, YouTube, caches) recorded by this server process.')
+
+# Background LLM jobs of all sessions (see utils/jobs.py)
+job_counts = job_queue.stats()
+st.caption('🧵 Background jobs: ' + ' · '.join(f'{count} {status}' for status, count in job_counts.items()))
+
+summary = tracer.summary()
+if not summary:
+    st.info('No operations recorded yet. Use the other pages and come back.')
+else:
+    metrics = pd.DataFrame(summary)
+
+    # Headline numbers
+    col1, col2, col3 = st.columns(3)
+    reruns = metrics[metrics['operation'] == 'rerun']
+    llm_calls = metrics[metrics['operation'] == 'llm']
+    col1.metric('Traced operations', int(metrics['count'].sum()))
+    col2.metric('LLM calls', int(llm_calls['count'].sum()))
+    col3.metric('LLM tokens (in / out)', f"{int(llm_calls['input_tokens'].sum())} / {int(llm_calls['output_tokens'].sum())}")
+
+    # Latency percentiles per operation and model
+    st.subheader('⏱️ Latency by Operation')
+    st.dataframe(
+        metrics.round(1),
+        column_config={
+            'p50_ms': 'p50 (ms)',
+            'p95_ms': 'p95 (ms)',
+            'p99_ms': 'p99 (ms)',
+            'ttft_p50_ms': 'TTFT p50 (ms)',
+            'cache_hit_ratio': st.column_config.NumberColumn('Cache hit ratio', format='%.2f'),
+        },
+        hide_index=True,
+        use_container_width=True
+    )
+
+    spans = pd.DataFrame(tracer.spans())
+
+    # Tokens per prompt template, estimated locally (utils.tokens), against its output budget
+    prompt_spans = spans[spans['name'].str.startswith('prompt.')]
+    if not prompt_spans.empty:
+        st.subheader('🔤 Tokens by Prompt')
+        prompt_spans = prompt_spans.assign(
+            prompt=prompt_spans['name'].str[len('prompt.'):],
+            at_budget=prompt_spans['output_tokens'] >= prompt_spans['max_tokens'],
+        )
+        tokens = prompt_spans.groupby(['prompt', 'model']).agg(
+            calls=('duration', 'size'),
+            input_per_call=('input_tokens', 'mean'),
+            output_per_call=('output_tokens', 'mean'),
+            output_max=('output_tokens', 'max'),
+            budget=('max_tokens', 'max'),
+            at_budget=('at_budget', 'sum'),
+        ).reset_index()
+        st.dataframe(
+            tokens.round(1),
+            column_config={
+                'input_per_call': 'Input tokens / call',
+                'output_per_call': 'Output tokens / call',
+                'output_max': 'Longest output',
+                'budget': 'Output budget',
+                'at_budget': st.column_config.NumberColumn('Calls at budget', help='Answers probably cut short by max_tokens.'),
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+
+    # Tail latency of page reruns
+    if not reruns.empty:
+        st.subheader('🐢 Slowest Pages (p95)')
+        page_reruns = spans[spans['name'] == 'rerun'].groupby('page')['duration']
+        st.bar_chart(page_reruns.quantile(0.95).mul(1000).rename('p95 (ms)'))
+
+    # Export
+    st.subheader('📤 Export')
+    col1, col2 = st.columns(2)
+    col1.download_button('Prometheus text', tracer.to_prometheus(), file_name='metrics.prom', mime='text/plain')
+    col2.download_button('JSON', tracer.to_json(), file_name='metrics.json', mime='application/json')
+
+if ALLOW_CLEAR and st.button('Clear Metrics'):
+    tracer.clear()
+    st.rerun()
@@ -0,0 +1,99 @@
+"""Static images served from disk instead of being downloaded while a page renders.
+
+Images are fetched and resized once, at build time:
+
+    python -m utils.assets
+
+If that has not been run, the first page asking for an image starts preparing
+it in a background thread (once per process) and logs that it is serving the
+remote URL meanwhile; the browser loads that URL on its own without blocking
+the script run.
+"""
+import argparse
+import logging
+import os
+import threading
+
+ASSET_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'assets')
+
+# name -> (source URL, file name, width in pixels the page displays it at)
+IMAGES = {
+    'home_banner': (
+        'https://images.unsplash.com/photo-1564760290292-23341e4df6ec?q=80&w=1470&auto=format&fit=crop&ixlib=rb-4.0.3&ixid=M3wxMjA3fDB8MHxwaG90by1wYWdlfHx8fGVufDB8fHx8fA%3D%3D',
+        'home_banner.jpg',
+        1470,
+    ),
+}
+
+
+logger = logging.getLogger(__name__)
+
+# Images being (or already) prepared in the background by this process
+_preparing = set()
+_preparing_lock = threading.Lock()
+
+
+def image_path(name):
+    return os.path.join(ASSET_DIR, IMAGES[name][1])
+
+
+def image_source(name):
+    """Return the local file for image `name` if it has been prepared, else its URL.
+
+    The first miss starts prepare_image() in the background, so later page runs
+    get the local file.
+    """
+    path = image_path(name)
+    if os.path.exists(path):
+        return path
+    with _preparing_lock:
+        first_miss = name not in _preparing
+        _preparing.add(name)
+    if first_miss:
+        logger.warning("%s is not prepared (run 'python -m utils.assets'); serving its remote URL while it is prepared", path)
+        threading.Thread(target=_prepare_in_background, args=(name,), daemon=True, name=f'prepare-{name}').start()
+    return IMAGES[name][0]
+
+
+def _prepare_in_background(name):
+    try:
+        logger.info('Prepared %s', prepare_image(name))
+    except Exception as e:
+        # Not retried in this process: the URL keeps working
+        logger.warning('Could not prepare %s: %s', image_path(name), e)
+
+
+def prepare_image(name, force=False):
+    """Download image `name`, shrink it to its display width and save it as a progressive JPEG."""
+    from io import BytesIO
+
+    import requests
+    from PIL import Image
+
+    path = image_path(name)
+    if os.path.exists(path) and not force:
+        return path
+    url, _, width = IMAGES[name]
+    response = requests.get(url, timeout=30)
+    response.raise_for_status()
+    image = Image.open(BytesIO(response.content)).convert('RGB')
+    if image.width > width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+    os.makedirs(ASSET_DIR, exist_ok=True)
+    # Written aside and renamed, so image_source() never serves a half-written file
+    partial = f'{path}.{os.getpid()}.part'
+    image.save(partial, 'JPEG', quality=80, optimize=True, progressive=True)
+    os.replace(partial, path)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Download and resize the static images used by the pages.')
+    parser.add_argument('--force', action='store_true', help='Download again even if the file exists')
+    args = parser.parse_args(argv)
+    for name in IMAGES:
+        print(prepare_image(name, force=args.force))
+
+
+if __name__ == '__main__':
+    main()
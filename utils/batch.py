@@ -0,0 +1,200 @@
+"""Batch diagnosis over telemetry files.
+
+Every row needs the Diagnose page fields (internet_speed, ping, wifi_strength,
+device_type, usage_type, network_type, router_distance, connected_devices,
+vpn_usage). Rows are read in chunks, identical profiles are diagnosed once, and
+results are appended to the output file as soon as they are known.
+
+Usage:
+    python -m utils.batch telemetry.csv -o diagnosis.csv --concurrency 16
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import llm, pipeline, router, rules
+from utils.cache import DIAGNOSIS_NAMESPACE, SharedCache, diagnosis_key
+
+FIELDS = ['internet_speed', 'ping', 'wifi_strength', 'device_type', 'usage_type',
+          'network_type', 'router_distance', 'connected_devices', 'vpn_usage']
+CHUNK_SIZE = 1000
+DEFAULT_CONCURRENCY = 8
+
+
+class BatchCancelled(Exception):
+    """The batch was stopped by its `stop` callback."""
+
+
+def read_profiles(source, chunksize=CHUNK_SIZE):
+    """Yield DataFrame chunks from a CSV or Parquet path or uploaded file."""
+    # pandas is imported here so the Diagnose page can show the batch form without loading it
+    import pandas as pd
+
+    name = getattr(source, 'name', source)
+    if str(name).lower().endswith('.parquet'):
+        frame = pd.read_parquet(source)
+        for start in range(0, len(frame), chunksize):
+            yield frame.iloc[start:start + chunksize]
+        return
+    yield from pd.read_csv(source, chunksize=chunksize)
+
+
+def count_rows(source):
+    """Count data rows without parsing them (used for progress reporting)."""
+    name = getattr(source, 'name', source)
+    if str(name).lower().endswith('.parquet'):
+        import pandas as pd
+
+        return len(pd.read_parquet(source, columns=[FIELDS[0]]))
+    if hasattr(source, 'seek'):
+        source.seek(0)
+        total = sum(1 for _ in source) - 1
+        source.seek(0)
+        return max(total, 0)
+    with open(source, 'rb') as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+
+class ResultWriter:
+    """Append diagnosis rows to a CSV or JSON-lines file as they complete."""
+
+    def __init__(self, path):
+        self.path = path
+        self.jsonl = path.lower().endswith('.jsonl')
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = None
+
+    def write(self, row):
+        if self.jsonl:
+            self._file.write(json.dumps(row, default=str) + '\n')
+        else:
+            if self._writer is None:
+                self._writer = csv.DictWriter(self._file, fieldnames=list(row))
+                self._writer.writeheader()
+            self._writer.writerow(row)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+async def diagnose_batch(source, output, concurrency=DEFAULT_CONCURRENCY, cache=None, model=None, progress=None, stop=None):
+    """Diagnose every row of `source` and write the results to `output`.
+
+    At most `concurrency` Groq calls are in flight at once. Without a `model`
+    the calls go through the 'selection' route of utils.router. `progress` is called
+    with (rows_done, rows_total) after each chunk of results is written.
+    `stop()` is checked before each Groq call; once it returns True the batch
+    raises BatchCancelled, keeping the rows already written.
+    Returns a summary dict with counts per result source.
+    """
+    if model is None:
+        call = lambda prompt: router.invoke('selection', prompt, prompt_name='diagnose_issue')
+    else:
+        call = lambda prompt: llm.invoke(model, prompt, label='diagnose_issue')
+
+    total = count_rows(source)
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch-diagnose')
+    writer = ResultWriter(output)
+    results = {}
+    summary = {'rows': 0, 'unique': 0, 'rules': 0, 'cache': 0, 'llm': 0, 'errors': 0}
+
+    async def resolve(key, inputs, rule_result):
+        if rule_result['confident']:
+            return rules.format_issues(rule_result['issues']), 'rules'
+        # Cache reads and writes block on SQLite or Redis, so they run on the default
+        # thread pool (not the LLM executor, so they never wait behind model calls)
+        if cache is not None:
+            cached = await asyncio.to_thread(cache.get, key, field='issues')
+            if cached:
+                return cached['issues'], 'cache'
+        prompt = pipeline.issue_prompt(inputs, rule_result['candidates'])
+        async with semaphore:
+            if stop is not None and stop():
+                raise BatchCancelled()
+            try:
+                answer = await loop.run_in_executor(executor, call, prompt)
+            except Exception as e:
+                return f'error: {e}', 'errors'
+        issues = pipeline.decode_issues(answer.content, rule_result['candidates'])
+        if cache is not None:
+            await asyncio.to_thread(cache.set, key, {'issues': issues})
+        return issues, 'llm'
+
+    try:
+        for chunk in read_profiles(source):
+            missing = [field for field in FIELDS if field not in chunk.columns]
+            if missing:
+                raise ValueError(f"Missing columns: {', '.join(missing)}")
+            records = chunk.to_dict('records')
+            keys = [diagnosis_key({field: record[field] for field in FIELDS}) for record in records]
+            rule_results = rules.diagnose_many(chunk)
+
+            # Identical profiles (after bucketing) are only diagnosed once
+            pending = {}
+            for key, record, rule_result in zip(keys, records, rule_results):
+                if key not in results and key not in pending:
+                    inputs = {field: record[field] for field in FIELDS}
+                    pending[key] = asyncio.ensure_future(resolve(key, inputs, rule_result))
+            summary['unique'] += len(pending)
+            try:
+                for key, task in pending.items():
+                    results[key] = await task
+                    summary[results[key][1]] += 1
+            except BaseException:
+                # Don't leave the chunk's other lookups running after a failure or cancellation
+                for task in pending.values():
+                    task.cancel()
+                await asyncio.gather(*pending.values(), return_exceptions=True)
+                raise
+
+            for key, record in zip(keys, records):
+                record['predicted_issues'], record['source'] = results[key]
+                writer.write(record)
+            summary['rows'] += len(records)
+            if progress:
+                progress(summary['rows'], total)
+    finally:
+        writer.close()
+        executor.shutdown(wait=False, cancel_futures=True)
+    return summary
+
+
+def run_batch(source, output, concurrency=DEFAULT_CONCURRENCY, cache=None, model=None, progress=None, stop=None):
+    """Blocking wrapper around diagnose_batch()."""
+    return asyncio.run(diagnose_batch(source, output, concurrency, cache, model, progress, stop))
+
+
+def _print_progress(done, total):
+    width = 30
+    filled = int(width * done / total) if total else width
+    sys.stderr.write(f"\r[{'#' * filled}{'.' * (width - filled)}] {done}/{total} rows")
+    sys.stderr.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Diagnose every profile in a telemetry CSV/Parquet file.')
+    parser.add_argument('input', help='CSV or Parquet file with the Diagnose page fields')
+    parser.add_argument('-o', '--output', default='diagnosis_results.csv', help='CSV or .jsonl output file')
+    parser.add_argument('-c', '--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='Maximum Groq calls in flight')
+    parser.add_argument('--no-cache', action='store_true', help='Do not read or write the diagnosis cache')
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    cache = None if args.no_cache else SharedCache(DIAGNOSIS_NAMESPACE)
+    summary = run_batch(args.input, args.output, args.concurrency, cache=cache, progress=_print_progress)
+    sys.stderr.write('\n')
+    print(json.dumps(summary))
+    print(f'Results written to {os.path.abspath(args.output)}')
+
+
+if __name__ == '__main__':
+    main()
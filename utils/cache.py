@@ -0,0 +1,184 @@
+import bisect
+import hashlib
+import json
+import os
+import re
+
+from utils.cache_backends import get_backend
+from utils.tracing import span
+
+# All local cache files live here so they survive restarts and are shared across sessions
+CACHE_DIR = os.getenv('NETDOC_CACHE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache'))
+DIAGNOSIS_NAMESPACE = 'diagnosis'
+
+# Bucket edges used to quantize the Diagnose sliders. Values that fall in the same
+# bucket produce the same cache key, so "49 Mbps" and "50 Mbps" share an answer.
+SPEED_BUCKETS = [5, 10, 25, 50, 100, 200, 300]
+PING_BUCKETS = [20, 50, 100, 150, 250, 400]
+DISTANCE_BUCKETS = [2, 5, 10, 20, 35]
+DEVICE_BUCKETS = [3, 6, 10, 20, 35]
+
+
+def bucket(value, edges):
+    """Return the index of the bucket `value` falls into."""
+    return bisect.bisect_right(edges, value)
+
+
+def make_key(parts):
+    """Hash a dict of normalized parts into a stable cache key."""
+    payload = json.dumps(parts, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def diagnosis_key(inputs):
+    """Build the cache key for a Diagnose page request.
+
+    `inputs` holds the raw widget values (internet_speed, ping, wifi_strength, device_type,
+    usage_type, network_type, router_distance, connected_devices, vpn_usage) and, after a
+    connection probe, the `measured_issues`.
+    """
+    parts = {
+        'v': 1,
+        'speed': bucket(inputs['internet_speed'], SPEED_BUCKETS),
+        'ping': bucket(inputs['ping'], PING_BUCKETS),
+        'wifi': inputs['wifi_strength'],
+        'device': inputs['device_type'],
+        'usage': inputs['usage_type'],
+        'network': inputs['network_type'],
+        'distance': bucket(inputs['router_distance'], DISTANCE_BUCKETS),
+        'devices': bucket(inputs['connected_devices'], DEVICE_BUCKETS),
+        'vpn': inputs['vpn_usage'],
+    }
+    if inputs.get('measured_issues'):
+        parts['measured'] = sorted(inputs['measured_issues'])
+    return make_key(parts)
+
+
+# ISP recommendations depend on slowly changing market data, so they are kept for a month
+ISP_NAMESPACE = 'isp'
+ISP_CACHE_TTL = 30 * 24 * 3600
+ISP_PING_BUCKETS = [30, 60, 100, 150, 250, 400, 600]
+
+# Common ways of writing the same country
+COUNTRY_ALIASES = {
+    'usa': 'united states',
+    'us': 'united states',
+    'u s a': 'united states',
+    'united states of america': 'united states',
+    'america': 'united states',
+    'uk': 'united kingdom',
+    'u k': 'united kingdom',
+    'great britain': 'united kingdom',
+    'britain': 'united kingdom',
+    'england': 'united kingdom',
+    'uae': 'united arab emirates',
+    'bharat': 'india',
+}
+# Filler words ignored when fingerprinting the free-text "current issues"
+ISSUE_STOP_WORDS = frozenset(
+    'a also am an and are at but e etc g i in is it me my of often on or so some sometimes the times '
+    'too very with'.split()
+)
+
+
+def normalize_country(name):
+    """Canonical country name: lower case, punctuation removed, common aliases resolved."""
+    cleaned = ' '.join(re.findall(r'[a-z]+', (name or '').lower()))
+    return COUNTRY_ALIASES.get(cleaned, cleaned)
+
+
+def issues_fingerprint(text):
+    """Order- and filler-insensitive fingerprint of the free-text current issues."""
+    words = set(re.findall(r'[a-z0-9]+', (text or '').lower())) - ISSUE_STOP_WORDS
+    return ' '.join(sorted(words))
+
+
+def isp_key(inputs):
+    """Build the cache key for an ISP recommendation from the page's input_data dict."""
+    return make_key({
+        'v': 1,
+        'country': normalize_country(inputs['selected_country']),
+        'speed': bucket(inputs['mbs_needed'], SPEED_BUCKETS),
+        'ping': bucket(inputs['ms'], ISP_PING_BUCKETS),
+        'distance': bucket(inputs['no_of_meters'], DISTANCE_BUCKETS),
+        'devices': bucket(inputs['no_of_devices'], DEVICE_BUCKETS),
+        'usage': inputs['usage_type'],
+        'device': inputs['your_device_type'],
+        'vpn': inputs['vpn'],
+        'issues': issues_fingerprint(inputs['current_issues']),
+    })
+
+
+class SharedCache:
+    """One namespace of the cache backend (see utils.cache_backends) with a TTL and a size bound.
+
+    Values are JSON documents. With the default SQLite backend every process on
+    the host shares the entries, with Redis every host does. Hit and miss
+    counters are per process.
+    """
+
+    def __init__(self, namespace, max_entries=5000, ttl=7 * 24 * 3600, backend=None):
+        self.name = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend if backend is not None else get_backend()
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, lookup, hit):
+        lookup.attrs['cache_hit'] = hit
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def get(self, key, field=None):
+        """Return the cached value, or None on a miss.
+
+        With `field`, the entry only counts as a hit when that field is present.
+        """
+        with span(f'cache.{self.name}') as lookup:
+            value = self.backend.get(self.name, key)
+            if value is None or (field is not None and value.get(field) is None):
+                self._count(lookup, False)
+                return None
+            self._count(lookup, True)
+            return value
+
+    def peek(self, key):
+        """Return the cached value (or None), counted by the caller instead of by this cache."""
+        return self.backend.get(self.name, key)
+
+    def contains(self, key, field=None):
+        """Like get() but without touching the LRU order or the hit/miss counters."""
+        value = self.backend.get(self.name, key, touch=False)
+        return value is not None and (field is None or value.get(field) is not None)
+
+    def set(self, key, value, ttl=None):
+        """Store `value` (for `ttl` seconds instead of the cache's TTL, if given)."""
+        self.backend.set(self.name, key, value, ttl if ttl is not None else self.ttl, self.max_entries)
+
+    def update(self, key, **fields):
+        """Merge `fields` into an existing entry (or create it)."""
+        value = self.backend.get(self.name, key, touch=False) or {}
+        value.update(fields)
+        self.set(key, value)
+
+    def get_or_compute(self, key, compute):
+        """Return (value, cached). On a miss compute() runs once across every process sharing the backend."""
+        with span(f'cache.{self.name}') as lookup:
+            value, cached = self.backend.get_or_compute(self.name, key, compute, self.ttl, self.max_entries)
+            self._count(lookup, cached)
+            return value, cached
+
+    def __len__(self):
+        return self.backend.count(self.name)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'entries': len(self),
+        }
@@ -0,0 +1,452 @@
+"""Storage backends for the shared caches in utils.cache.
+
+Every backend stores JSON values under (namespace, key) with an optional TTL
+and an optional per-namespace entry limit (least recently used entries go
+first). Pick one with NETDOC_CACHE_BACKEND:
+
+- sqlite (default): one SQLite file in the cache directory, shared by every
+  process on the host
+- memory: private to the process; fastest, but each replica fills its own
+- redis://host:port/db: any Redis-protocol server, shared by every host
+
+get_or_compute() is atomic across processes for the shared backends: while one
+process computes a missing value, the others wait for it instead of repeating
+the work.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from utils.singleflight import SingleFlight
+
+CACHE_BACKEND = os.getenv('NETDOC_CACHE_BACKEND', 'sqlite')
+# Lock entries of get_or_compute live in this namespace
+LOCK_NAMESPACE = '__lock__'
+# A computing process that takes longer than this (or died) no longer holds others back
+LOCK_TIMEOUT = 120
+LOCK_POLL = 0.05
+
+
+class CacheBackend(ABC):
+    """Interface of the backends. Values must be JSON-serializable.
+
+    A backend missing one of the abstract methods fails when it is created.
+    """
+
+    def __init__(self):
+        self._flights = SingleFlight('cache')
+
+    @abstractmethod
+    def get(self, namespace, key, touch=True):
+        """Return the value, or None if missing or expired. `touch` marks it recently used."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, namespace, key, value, ttl=None, max_entries=None):
+        """Store `value` for `ttl` seconds (None: no expiry), keeping at most `max_entries` in the namespace."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def add(self, namespace, key, value, ttl=None):
+        """Store `value` only if the key is missing or expired; returns whether it was stored."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, namespace, key):
+        raise NotImplementedError
+
+    @abstractmethod
+    def incr(self, namespace, key, amount=1, ttl=None):
+        """Add `amount` to an integer counter (starting at 0) and return the new value.
+        `ttl` applies when the counter is created."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def count(self, namespace):
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self, namespace):
+        raise NotImplementedError
+
+    def get_or_compute(self, namespace, key, compute, ttl=None, max_entries=None, lock_timeout=LOCK_TIMEOUT):
+        """Return (value, cached): the stored value, or compute() stored by whichever caller got there first.
+
+        Concurrent callers in this process share one call; callers in other
+        processes wait on a lock entry and then read the stored value.
+        """
+        value = self.get(namespace, key)
+        if value is not None:
+            return value, True
+
+        def compute_once():
+            lock_key = f'{namespace}:{key}'
+            token = uuid.uuid4().hex
+            deadline = time.monotonic() + lock_timeout
+            while True:
+                value = self.get(namespace, key)
+                if value is not None:
+                    return value, True
+                if self.add(LOCK_NAMESPACE, lock_key, token, ttl=lock_timeout) or time.monotonic() > deadline:
+                    break
+                time.sleep(LOCK_POLL)
+            try:
+                value = compute()
+                self.set(namespace, key, value, ttl, max_entries)
+                return value, False
+            finally:
+                if self.get(LOCK_NAMESPACE, lock_key, touch=False) == token:
+                    self.delete(LOCK_NAMESPACE, lock_key)
+
+        return self._flights.do((namespace, key), compute_once)
+
+
+class MemoryBackend(CacheBackend):
+    """Backend private to this process: one LRU-ordered dict per namespace."""
+
+    def __init__(self):
+        super().__init__()
+        self._namespaces = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, namespace, key, now):
+        # Called with _lock held; drops the entry if it expired
+        entries = self._namespaces.get(namespace)
+        entry = entries.get(key) if entries else None
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del entries[key]
+            entry = None
+        return entry
+
+    def _prune(self, entries, now):
+        # Called with _lock held; drops every expired entry of a namespace
+        for key in [key for key, (_, expires_at) in entries.items() if expires_at is not None and expires_at <= now]:
+            del entries[key]
+
+    def get(self, namespace, key, touch=True):
+        with self._lock:
+            entry = self._entry(namespace, key, time.time())
+            if entry is None:
+                return None
+            if touch:
+                self._namespaces[namespace].move_to_end(key)
+            return json.loads(entry[0])
+
+    def set(self, namespace, key, value, ttl=None, max_entries=None):
+        data = json.dumps(value)
+        with self._lock:
+            entries = self._namespaces.setdefault(namespace, OrderedDict())
+            entries[key] = (data, time.time() + ttl if ttl is not None else None)
+            entries.move_to_end(key)
+            if max_entries is not None and len(entries) > max_entries:
+                # Expired entries go before any live one is evicted
+                self._prune(entries, time.time())
+            while max_entries is not None and len(entries) > max_entries:
+                entries.popitem(last=False)
+
+    def add(self, namespace, key, value, ttl=None):
+        data = json.dumps(value)
+        with self._lock:
+            now = time.time()
+            if self._entry(namespace, key, now) is not None:
+                return False
+            self._namespaces.setdefault(namespace, OrderedDict())[key] = (data, now + ttl if ttl is not None else None)
+            return True
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._namespaces.get(namespace, {}).pop(key, None)
+
+    def incr(self, namespace, key, amount=1, ttl=None):
+        with self._lock:
+            now = time.time()
+            entry = self._entry(namespace, key, now)
+            value = (json.loads(entry[0]) if entry else 0) + amount
+            expires_at = entry[1] if entry else (now + ttl if ttl is not None else None)
+            self._namespaces.setdefault(namespace, OrderedDict())[key] = (json.dumps(value), expires_at)
+            return value
+
+    def count(self, namespace):
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            if not entries:
+                return 0
+            self._prune(entries, time.time())
+            return len(entries)
+
+    def clear(self, namespace):
+        with self._lock:
+            self._namespaces.pop(namespace, None)
+
+
+class SQLiteBackend(CacheBackend):
+    """Backend in one SQLite file (WAL mode), shared by every process on the host."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            ' namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,'
+            ' expires_at REAL, last_used REAL NOT NULL, PRIMARY KEY (namespace, key)) WITHOUT ROWID'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS cache_last_used ON cache(namespace, last_used)')
+        self._conn.commit()
+
+    def get(self, namespace, key, touch=True):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value FROM cache WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                (namespace, key, now)
+            ).fetchone()
+            if row is not None and touch:
+                self._conn.execute('UPDATE cache SET last_used = ? WHERE namespace = ? AND key = ?', (now, namespace, key))
+                self._conn.commit()
+        return json.loads(row[0]) if row is not None else None
+
+    def set(self, namespace, key, value, ttl=None, max_entries=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, last_used) VALUES (?, ?, ?, ?, ?)',
+                (namespace, key, json.dumps(value), now + ttl if ttl is not None else None, now)
+            )
+            self._conn.execute('DELETE FROM cache WHERE namespace = ? AND expires_at <= ?', (namespace, now))
+            if max_entries is not None:
+                self._conn.execute(
+                    'DELETE FROM cache WHERE namespace = ? AND key IN ('
+                    'SELECT key FROM cache WHERE namespace = ? ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                    (namespace, namespace, max_entries)
+                )
+            self._conn.commit()
+
+    def add(self, namespace, key, value, ttl=None):
+        now = time.time()
+        with self._lock:
+            # One statement, so it is atomic between processes too
+            cursor = self._conn.execute(
+                'INSERT INTO cache (namespace, key, value, expires_at, last_used) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(namespace, key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at, '
+                'last_used = excluded.last_used WHERE cache.expires_at IS NOT NULL AND cache.expires_at <= excluded.last_used',
+                (namespace, key, json.dumps(value), now + ttl if ttl is not None else None, now)
+            )
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def delete(self, namespace, key):
+        with self._lock:
+            self._conn.execute('DELETE FROM cache WHERE namespace = ? AND key = ?', (namespace, key))
+            self._conn.commit()
+
+    def incr(self, namespace, key, amount=1, ttl=None):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'INSERT INTO cache (namespace, key, value, expires_at, last_used) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(namespace, key) DO UPDATE SET '
+                ' value = CASE WHEN cache.expires_at <= excluded.last_used THEN excluded.value'
+                '         ELSE CAST(cache.value AS INTEGER) + ? END,'
+                ' expires_at = CASE WHEN cache.expires_at <= excluded.last_used THEN excluded.expires_at'
+                '              ELSE cache.expires_at END,'
+                ' last_used = excluded.last_used '
+                'RETURNING value',
+                (namespace, key, str(amount), now + ttl if ttl is not None else None, now, amount)
+            ).fetchone()
+            self._conn.commit()
+            return int(row[0])
+
+    def count(self, namespace):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM cache WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)',
+                (namespace, time.time())
+            ).fetchone()[0]
+
+    def clear(self, namespace):
+        with self._lock:
+            self._conn.execute('DELETE FROM cache WHERE namespace = ?', (namespace,))
+            self._conn.commit()
+
+
+class RedisError(Exception):
+    """The Redis server answered with an error."""
+
+
+class RedisBackend(CacheBackend):
+    """Backend on a Redis-protocol server, shared by every process and host.
+
+    Speaks RESP over a plain socket per thread, so no client library is needed.
+    Each namespace keeps a sorted set of its keys by last use to enforce
+    max_entries, and one of the keys set with a TTL by expiry time, so keys
+    Redis has expired are dropped from the first before it is counted.
+    """
+
+    def __init__(self, url, prefix='netdoc:', timeout=5.0):
+        super().__init__()
+        parsed = urlparse(url)
+        self.host = parsed.hostname or '127.0.0.1'
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.strip('/') or 0)
+        self.password = parsed.password
+        self.prefix = prefix
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            conn = self._local.conn = (sock, sock.makefile('rb'))
+            if self.password:
+                self._command('AUTH', self.password)
+            if self.db:
+                self._command('SELECT', self.db)
+        return conn
+
+    def _command(self, *args):
+        sock, reader = self._connection()
+        parts = [str(arg).encode() if not isinstance(arg, bytes) else arg for arg in args]
+        payload = b'*%d\r\n' % len(parts) + b''.join(b'$%d\r\n%s\r\n' % (len(part), part) for part in parts)
+        try:
+            sock.sendall(payload)
+            return self._reply(reader)
+        except (OSError, ConnectionError):
+            # Drop the broken connection; the next command reconnects
+            self._local.conn = None
+            sock.close()
+            raise
+
+    def _reply(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError('Redis closed the connection')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode()
+        if kind == b'-':
+            raise RedisError(rest.decode())
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)[:-2]
+            return data.decode()
+        if kind == b'*':
+            length = int(rest)
+            return None if length < 0 else [self._reply(reader) for _ in range(length)]
+        raise RedisError(f'Unexpected reply: {line!r}')
+
+    def _key(self, namespace, key):
+        return f'{self.prefix}{namespace}:{key}'
+
+    def _index(self, namespace):
+        return f'{self.prefix}{namespace}:__lru__'
+
+    def _expiry_index(self, namespace):
+        return f'{self.prefix}{namespace}:__expiry__'
+
+    def _prune(self, namespace):
+        # Drop keys whose TTL has passed from the LRU index, so it holds live keys only
+        expiry = self._expiry_index(namespace)
+        expired = self._command('ZRANGEBYSCORE', expiry, '-inf', time.time())
+        if expired:
+            self._command('ZREM', self._index(namespace), *expired)
+            self._command('ZREM', expiry, *expired)
+
+    def get(self, namespace, key, touch=True):
+        data = self._command('GET', self._key(namespace, key))
+        if data is None:
+            return None
+        if touch:
+            self._command('ZADD', self._index(namespace), time.time(), key)
+        return json.loads(data)
+
+    def set(self, namespace, key, value, ttl=None, max_entries=None):
+        args = ['SET', self._key(namespace, key), json.dumps(value)]
+        if ttl is not None:
+            args += ['PX', max(int(ttl * 1000), 1)]
+        self._command(*args)
+        index = self._index(namespace)
+        self._command('ZADD', index, time.time(), key)
+        if ttl is not None:
+            self._command('ZADD', self._expiry_index(namespace), time.time() + ttl, key)
+        else:
+            self._command('ZREM', self._expiry_index(namespace), key)
+        if max_entries is not None:
+            self._prune(namespace)
+            excess = self._command('ZCARD', index) - max_entries
+            if excess > 0:
+                evicted = self._command('ZPOPMIN', index, excess)[::2]
+                self._command('DEL', *[self._key(namespace, k) for k in evicted])
+                self._command('ZREM', self._expiry_index(namespace), *evicted)
+
+    def add(self, namespace, key, value, ttl=None):
+        args = ['SET', self._key(namespace, key), json.dumps(value), 'NX']
+        if ttl is not None:
+            args += ['PX', max(int(ttl * 1000), 1)]
+        return self._command(*args) == 'OK'
+
+    def delete(self, namespace, key):
+        self._command('DEL', self._key(namespace, key))
+        self._command('ZREM', self._index(namespace), key)
+        self._command('ZREM', self._expiry_index(namespace), key)
+
+    def incr(self, namespace, key, amount=1, ttl=None):
+        value = self._command('INCRBY', self._key(namespace, key), amount)
+        if ttl is not None and value == amount:
+            # Created by this call
+            self._command('PEXPIRE', self._key(namespace, key), max(int(ttl * 1000), 1))
+        return value
+
+    def count(self, namespace):
+        self._prune(namespace)
+        return self._command('ZCARD', self._index(namespace))
+
+    def clear(self, namespace):
+        index = self._index(namespace)
+        keys = self._command('ZRANGE', index, 0, -1)
+        if keys:
+            self._command('DEL', *[self._key(namespace, k) for k in keys])
+        self._command('DEL', index, self._expiry_index(namespace))
+
+
+def create_backend(spec=CACHE_BACKEND):
+    """Build the backend described by `spec`: 'memory', 'sqlite', 'sqlite:///path' or 'redis://...'."""
+    if spec == 'memory':
+        return MemoryBackend()
+    if spec.startswith('redis://'):
+        return RedisBackend(spec)
+    if spec == 'sqlite' or spec.startswith('sqlite://'):
+        from utils.cache import CACHE_DIR
+
+        path = spec[len('sqlite://'):] if spec.startswith('sqlite://') else ''
+        return SQLiteBackend(path or os.path.join(CACHE_DIR, 'shared_cache.sqlite3'))
+    raise ValueError(f'Unknown cache backend: {spec!r}')
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the process-wide backend chosen by NETDOC_CACHE_BACKEND."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend()
+        return _backend
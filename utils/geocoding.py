@@ -0,0 +1,137 @@
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.cache import SharedCache
+from utils.ratelimit import TokenBucket
+from utils.tracing import span
+
+GEOCODE_NAMESPACE = 'geocode'
+GEOCODE_MAX_ENTRIES = 200000
+USER_AGENT = "community_asset_mapping"
+# Nominatim's usage policy allows at most one request per second per application
+NOMINATIM_RATE = 1.0
+# Addresses that could not be found are retried after a day; found ones are kept
+NOT_FOUND_TTL = 24 * 3600
+
+# Shared by every Geocoder in the process so all sessions respect the same limit
+nominatim_bucket = TokenBucket(NOMINATIM_RATE, capacity=1)
+
+
+def normalize_address(address):
+    """Normalize an address so trivially different spellings share a cache entry."""
+    address = address.lower().strip()
+    address = re.sub(r'\s*,\s*', ', ', address)
+    address = re.sub(r'\s+', ' ', address)
+    return address.strip(' ,.')
+
+
+class GeocodeCache:
+    """In-memory LRU in front of the shared cache backend of geocoded addresses."""
+
+    def __init__(self, max_memory_entries=10000, cache=None):
+        self.max_memory_entries = max_memory_entries
+        self.cache = cache if cache is not None else SharedCache(GEOCODE_NAMESPACE, max_entries=GEOCODE_MAX_ENTRIES, ttl=None)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (found, (lat, lon)); lat/lon are None for known-missing addresses."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return True, self._memory[key]
+        location = self.cache.get(key)
+        if location is None:
+            return False, (None, None)
+        location = tuple(location)
+        with self._lock:
+            self._remember(key, location)
+        return True, location
+
+    def set(self, key, location):
+        # Found addresses are kept; missing ones are retried after NOT_FOUND_TTL
+        self.cache.set(key, list(location), ttl=NOT_FOUND_TTL if location[0] is None else None)
+        with self._lock:
+            self._remember(key, location)
+
+    def _remember(self, key, location):
+        # Called with _lock held
+        self._memory[key] = location
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+
+class Geocoder:
+    """Cached, rate-limited geocoder.
+
+    `backend` is anything with a geopy-style `geocode(query)` method returning an
+    object with `latitude`/`longitude` (or None), so a local stub can replace
+    Nominatim in tests and benchmarks.
+    """
+
+    def __init__(self, backend=None, cache=None, bucket=None):
+        if backend is None:
+            from geopy.geocoders import Nominatim
+            backend = Nominatim(user_agent=USER_AGENT)
+        self.backend = backend
+        self.cache = cache if cache is not None else GeocodeCache()
+        self.bucket = bucket if bucket is not None else nominatim_bucket
+        self.hits = 0
+        self.misses = 0
+        # A single worker: lookups are serialized by the rate limit anyway
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='geocoder')
+
+    def geocode(self, address):
+        """Return (lat, lon) for `address`, or (None, None) if it can't be found.
+
+        A failed lookup (timeout, rate limit, service error) also returns
+        (None, None) but is not cached, so the address is tried again next time.
+        """
+        # geopy is imported here, like Nominatim, so the page does not load it until a lookup misses
+        from geopy.exc import GeopyError
+
+        with span('geocode') as lookup:
+            key = normalize_address(address)
+            found, location = self.cache.get(key)
+            lookup.attrs['cache_hit'] = found
+            if found:
+                self.hits += 1
+                return location
+            self.misses += 1
+            self.bucket.acquire()
+            try:
+                result = self.backend.geocode(address)
+            except GeopyError as error:
+                lookup.attrs['error_type'] = type(error).__name__
+                return (None, None)
+            location = (result.latitude, result.longitude) if result else (None, None)
+            self.cache.set(key, location)
+            return location
+
+    def geocode_many(self, addresses, progress=None):
+        """Geocode a list of addresses, looking up each distinct address once.
+
+        Returns a dict mapping every input address to its (lat, lon), (None, None)
+        for addresses that could not be found or looked up.
+        `progress` is called with (done, total) over the distinct addresses.
+        """
+        unique = {}
+        for address in addresses:
+            unique.setdefault(normalize_address(address), address)
+        resolved = {}
+        for done, (key, address) in enumerate(unique.items(), 1):
+            resolved[key] = self.geocode(address)
+            if progress:
+                progress(done, len(unique))
+        return {address: resolved[normalize_address(address)] for address in addresses}
+
+    def submit_many(self, addresses, progress=None):
+        """Run geocode_many() in the background and return its Future."""
+        return self._executor.submit(self.geocode_many, list(addresses), progress)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_ratio': self.hits / total if total else 0.0}
@@ -0,0 +1,85 @@
+"""ISP recommendations with a long-lived, bucketed cache.
+
+Common country and profile combinations can be computed ahead of time from
+config/isp_prewarm.json (see that file for the format):
+
+    python -m utils.isp --concurrency 4
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.cache import ISP_CACHE_TTL, ISP_NAMESPACE, SharedCache, isp_key
+
+PREWARM_CONFIG = os.getenv(
+    'NETDOC_ISP_PREWARM',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'isp_prewarm.json')
+)
+
+
+def get_isp_cache():
+    return SharedCache(ISP_NAMESPACE, max_entries=20000, ttl=ISP_CACHE_TTL)
+
+
+def recommend(inputs, cache):
+    """Return (recommendation, from_cache) for the page's input_data dict.
+
+    On a miss the chain runs once, even if several processes ask at the same time.
+    """
+    from utils import router
+
+    value, from_cache = cache.get_or_compute(
+        isp_key(inputs), lambda: {'recommendation': router.run_chain('recommendation', 'isp', inputs)}
+    )
+    return value['recommendation'], from_cache
+
+
+def prewarm_inputs(config_path=PREWARM_CONFIG):
+    """Expand the prewarm config into one input_data dict per country and profile."""
+    with open(config_path, encoding='utf-8') as f:
+        config = json.load(f)
+    return [dict(profile, selected_country=country) for country in config['countries'] for profile in config['profiles']]
+
+
+def prewarm(cache, config_path=PREWARM_CONFIG, concurrency=4):
+    """Fill the cache for every configured combination that is not cached yet.
+
+    Returns a summary dict with counts of cached, computed and failed entries.
+    """
+    from utils.llm import LLMUnavailable
+
+    combinations = prewarm_inputs(config_path)
+    todo = [inputs for inputs in combinations if not cache.contains(isp_key(inputs), field='recommendation')]
+    summary = {'total': len(combinations), 'cached': len(combinations) - len(todo), 'computed': 0, 'failed': 0}
+
+    def warm(inputs):
+        try:
+            recommend(inputs, cache)
+            return 'computed'
+        except LLMUnavailable:
+            return 'failed'
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='isp-prewarm') as pool:
+        for outcome in pool.map(warm, todo):
+            summary[outcome] += 1
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pre-compute ISP recommendations for common countries and profiles.')
+    parser.add_argument('--config', default=PREWARM_CONFIG, help='JSON file with "countries" and "profiles"')
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help='Maximum Groq calls in flight')
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    summary = prewarm(get_isp_cache(), args.config, args.concurrency)
+    print(json.dumps(summary))
+    return 0 if summary['failed'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+import heapq
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+# Reported issues are user data, not a cache, so they live in their own directory
+DATA_DIR = os.getenv('NETDOC_DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data'))
+ISSUE_DB_PATH = os.path.join(DATA_DIR, 'reported_issues.sqlite3')
+
+# DataFrame column name -> table column name
+COLUMNS = {
+    'Latitude': 'latitude',
+    'Longitude': 'longitude',
+    'Issue': 'issue',
+    'Description': 'description',
+    'User': 'user',
+}
+# Columns the FilterIndex keeps posting lists for
+FILTER_COLUMNS = ('Issue', 'User')
+# Rows loaded from SQLite at a time when exporting
+EXPORT_CHUNK_ROWS = 10000
+
+
+class IssueStore:
+    """Persistent, shared store for community-reported network issues.
+
+    Backed by SQLite in WAL mode so every session and process sees the same
+    reports. Issue and User have secondary indexes for filtering, and an R-tree
+    index answers bounding-box queries for the visible map area.
+    """
+
+    def __init__(self, path=ISSUE_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(
+            'CREATE TABLE IF NOT EXISTS reported_issues ('
+            ' id INTEGER PRIMARY KEY,'
+            ' latitude REAL NOT NULL,'
+            ' longitude REAL NOT NULL,'
+            ' issue TEXT NOT NULL,'
+            ' description TEXT,'
+            ' user TEXT,'
+            ' created_at REAL NOT NULL);'
+            'CREATE INDEX IF NOT EXISTS reported_issues_issue ON reported_issues(issue);'
+            'CREATE INDEX IF NOT EXISTS reported_issues_user ON reported_issues(user);'
+        )
+        try:
+            self._conn.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS reported_issues_rtree '
+                'USING rtree(id, min_lat, max_lat, min_lon, max_lon)'
+            )
+            self.has_rtree = True
+        except sqlite3.OperationalError:
+            # SQLite built without R-tree support: fall back to a plain lat/lon index
+            self._conn.execute('CREATE INDEX IF NOT EXISTS reported_issues_latlon ON reported_issues(latitude, longitude)')
+            self.has_rtree = False
+        self._conn.commit()
+
+    def add(self, lat, lon, issue, description, user):
+        """Insert one report and return its id."""
+        return self.add_many([(lat, lon, issue, description, user)])[0]
+
+    def add_many(self, rows):
+        """Insert many (lat, lon, issue, description, user) rows in a single transaction."""
+        now = time.time()
+        ids = []
+        with self._lock, self._conn:
+            for lat, lon, issue, description, user in rows:
+                cursor = self._conn.execute(
+                    'INSERT INTO reported_issues (latitude, longitude, issue, description, user, created_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (float(lat), float(lon), issue, description, user, now)
+                )
+                ids.append(cursor.lastrowid)
+            if self.has_rtree:
+                self._conn.executemany(
+                    'INSERT INTO reported_issues_rtree (id, min_lat, max_lat, min_lon, max_lon) VALUES (?, ?, ?, ?, ?)',
+                    [(i, float(r[0]), float(r[0]), float(r[1]), float(r[1])) for i, r in zip(ids, rows)]
+                )
+        return ids
+
+    def version(self):
+        """Return a number that changes whenever reports are added (the newest id)."""
+        with self._lock:
+            return self._conn.execute('SELECT COALESCE(MAX(id), 0) FROM reported_issues').fetchone()[0]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM reported_issues').fetchone()[0]
+
+    def center(self):
+        """Return the mean (lat, lon) of all reports, or None when there are none."""
+        with self._lock:
+            row = self._conn.execute('SELECT AVG(latitude), AVG(longitude) FROM reported_issues').fetchone()
+        return None if row[0] is None else (row[0], row[1])
+
+    def distinct(self, column):
+        """Return the distinct values of 'Issue' or 'User' (served from their index)."""
+        name = COLUMNS[column]
+        with self._lock:
+            rows = self._conn.execute(f'SELECT DISTINCT {name} FROM reported_issues ORDER BY {name}').fetchall()
+        return [r[0] for r in rows]
+
+    def query(self, bbox=None, issues=None, users=None, since_id=None, limit=None, newest_first=False, ids=None, columns=None):
+        """Load matching reports as a DataFrame with the page's column names.
+
+        `bbox` is (min_lat, min_lon, max_lat, max_lon). `issues` / `users` restrict
+        to those values, `since_id` returns only reports newer than that id and
+        `ids` only those reports. `columns` loads just those columns (default: all).
+        """
+        # pandas is imported here so importing the store (e.g. to add a report) does not load it
+        import pandas as pd
+
+        columns = list(columns or COLUMNS)
+        sql = f"SELECT r.id, {', '.join('r.' + COLUMNS[column] for column in columns)} FROM reported_issues r"
+        where = []
+        params = []
+        if ids is not None:
+            ids = [int(i) for i in ids]
+            if not ids:
+                return pd.DataFrame(columns=['id'] + columns).set_index('id')
+            where.append(f"r.id IN ({', '.join('?' * len(ids))})")
+            params += ids
+        if bbox is not None:
+            min_lat, min_lon, max_lat, max_lon = bbox
+            if self.has_rtree:
+                sql += ' JOIN reported_issues_rtree t ON t.id = r.id'
+                where.append('t.min_lat >= ? AND t.max_lat <= ? AND t.min_lon >= ? AND t.max_lon <= ?')
+            else:
+                where.append('r.latitude BETWEEN ? AND ? AND r.longitude BETWEEN ? AND ?')
+            params += [min_lat, max_lat, min_lon, max_lon]
+        if issues:
+            where.append(f"r.issue IN ({', '.join('?' * len(issues))})")
+            params += list(issues)
+        if users:
+            where.append(f"r.user IN ({', '.join('?' * len(users))})")
+            params += list(users)
+        if since_id is not None:
+            where.append('r.id > ?')
+            params.append(since_id)
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY r.id DESC' if newest_first else ' ORDER BY r.id'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        frame = pd.DataFrame(rows, columns=['id'] + columns)
+        return frame.set_index('id')
+
+    def export(self, ids, file, fmt='csv', chunk_size=EXPORT_CHUNK_ROWS):
+        """Write the reports `ids` to the binary `file` as 'csv' or 'parquet', chunk_size rows at a time.
+
+        Only one chunk is held in memory; each becomes a block of CSV lines or a
+        Parquet row group.
+        """
+        writer = None
+        if fmt == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            schema = pa.schema([('Latitude', pa.float64()), ('Longitude', pa.float64()), ('Issue', pa.string()),
+                                ('Description', pa.string()), ('User', pa.string())])
+            writer = pq.ParquetWriter(file, schema)
+        try:
+            for start in range(0, max(len(ids), 1), chunk_size):
+                chunk = self.query(ids=ids[start:start + chunk_size])
+                if writer is not None:
+                    writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+                else:
+                    file.write(chunk.to_csv(index=False, header=start == 0).encode())
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+def _sort_key(value):
+    return (value is not None, value if value is not None else '')
+
+
+class FilterIndex:
+    """Posting lists of report ids for each Issue and User value, kept in memory.
+
+    Values are stored once and referred to by integer codes; each code keeps the
+    sorted ids of its reports. A filter is then the union of the selected
+    values' posting lists within a column and the intersection across columns,
+    without scanning the reports. Ids only grow, so add() appends new reports
+    and keeps everything sorted.
+    """
+
+    def __init__(self, columns=FILTER_COLUMNS):
+        self.columns = columns
+        self.ids = np.empty(0, dtype=np.int64)
+        self._codes = {column: {} for column in columns}
+        self._options = {column: [] for column in columns}
+        # column -> code -> list of id arrays, merged on first read
+        self._postings = {column: [] for column in columns}
+        # Id of the newest report indexed, used to fetch only new reports
+        self.last_id = 0
+
+    def add(self, reports):
+        """Index new reports: a DataFrame indexed by id (ascending, all newer than last_id) with the filter columns."""
+        import pandas as pd
+
+        if reports.empty:
+            return
+        ids = reports.index.to_numpy(dtype=np.int64)
+        self.ids = np.concatenate([self.ids, ids])
+        for column in self.columns:
+            local_codes, values = pd.factorize(reports[column], use_na_sentinel=False)
+            values = [None if pd.isna(value) else value for value in values]
+            new_values = [value for value in values if value not in self._codes[column]]
+            for value in new_values:
+                self._codes[column][value] = len(self._postings[column])
+                self._postings[column].append([])
+            # Option lists stay sorted as values arrive; missing values sort first
+            self._options[column] = list(heapq.merge(self._options[column], sorted(map(_sort_key, new_values))))
+            codes = np.array([self._codes[column][value] for value in values], dtype=np.int64)[local_codes]
+            order = np.argsort(codes, kind='stable')
+            starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+            for group in np.split(order, starts[1:]):
+                self._postings[column][codes[group[0]]].append(ids[group])
+        self.last_id = int(ids[-1])
+
+    def options(self, column):
+        """Return the distinct values of `column`, sorted."""
+        return [value if present else None for present, value in self._options[column]]
+
+    def _posting(self, column, value):
+        code = self._codes[column].get(value)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        parts = self._postings[column][code]
+        if len(parts) != 1:
+            parts[:] = [np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)]
+        return parts[0]
+
+    def match(self, **selected):
+        """Return the sorted ids of the reports matching every filter, e.g. match(Issue=[...], User=[...]).
+
+        An empty or missing selection does not filter on that column.
+        """
+        matches = []
+        for column, values in selected.items():
+            if values:
+                postings = [self._posting(column, value) for value in dict.fromkeys(values)]
+                matches.append(postings[0] if len(postings) == 1 else np.sort(np.concatenate(postings)))
+        if not matches:
+            return self.ids
+        # Intersect the shortest lists first
+        matches.sort(key=len)
+        result = matches[0]
+        for ids in matches[1:]:
+            result = np.intersect1d(result, ids, assume_unique=True)
+        return result
@@ -0,0 +1,28 @@
+# Options offered by the Diagnose page widgets
+WIFI_STRENGTHS = ["Excellent", "Good", "Weak", "Very Weak"]
+DEVICE_TYPES = ["Laptop", "Mobile", "Smart TV", "Gaming Console"]
+USAGE_TYPES = ["Browsing", "Streaming", "Gaming", "Work"]
+NETWORK_TYPES = ["WiFi", "Ethernet", "Mobile Data", "Satellite"]
+VPN_OPTIONS = ["Yes", "No"]
+
+# Possible Issues
+potential_issues = [
+    "🚨 Packet loss detected", 
+    "❌ Router unreachable", 
+    "🔄 DNS failure", 
+    "⚠️ IP conflict detected", 
+    "🛑 Firewall blocking traffic", 
+    "🚦 ISP throttling suspected", 
+    "🔧 DHCP server failure",
+    "🔴 High CPU usage on network switch",        
+    "📡 Modem firmware outdated",             
+    "🔋 Low power on wireless access point",  
+    "⚡ Asymmetric routing causing packet drops",  
+    "🔀 BGP route flapping detected",             
+    "🛠️ MTU mismatch causing fragmentation",      
+    "📊 QoS misconfiguration affecting traffic",  
+    "🌍 Dual-stack IPv4/IPv6 misconfiguration",   
+    "🔐 SSL/TLS handshake failure",               
+    "📡 STP loop causing broadcast storms",       
+    "🔄 OSPF neighbor adjacency failure"          
+]
@@ -0,0 +1,208 @@
+"""Background jobs for LLM answers, so a Streamlit script run never waits on Groq.
+
+A page submits a job, keeps its id in st.session_state and picks the result up
+on a later rerun, polling with st.fragment(run_every=POLL_INTERVAL) meanwhile.
+Widget interaction during a generation reruns the page without losing the job.
+
+Jobs run on one thread pool shared by all sessions of the process: LLM calls
+spend their time waiting on the network, and their results (and the caches
+they fill) belong to this process, so threads fit better than processes.
+Each user may have MAX_ACTIVE_PER_USER jobs queued or running. Finished jobs
+are kept for RESULT_TTL seconds, then forgotten.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.tracing import span
+
+JOB_WORKERS = int(os.getenv('NETDOC_JOB_WORKERS', '32'))
+MAX_ACTIVE_PER_USER = int(os.getenv('NETDOC_JOBS_PER_USER', '3'))
+RESULT_TTL = 15 * 60
+# Seconds between polls of a page waiting on a job
+POLL_INTERVAL = 0.5
+# Pages wait this long right after submitting, so quick jobs (cache hits) show without a poll
+FAST_PATH_WAIT = 0.3
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class JobLimitExceeded(Exception):
+    """The user already has the maximum number of jobs queued or running."""
+
+
+class Job:
+    """One background call. `chunks` fills up while a streaming job runs; `result` is set when done."""
+
+    def __init__(self, owner, kind):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.kind = kind
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.chunks = []
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._future = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    @property
+    def text(self):
+        """Everything a streaming job has produced so far."""
+        return ''.join(self.chunks)
+
+    def elapsed(self):
+        return (self.finished or time.time()) - self.created
+
+    def wait(self, timeout=None):
+        """Block until the job has finished (or `timeout` passed); returns whether it has."""
+        return self._done.wait(timeout)
+
+    def _start(self):
+        # Checked and set together, so a job cancelled meanwhile never becomes running
+        with self._lock:
+            if self.status != QUEUED:
+                return False
+            self.status = RUNNING
+            self.started = time.time()
+            return True
+
+    def _finish(self, status, result=None, error=None):
+        # The first finish wins: a finished job (e.g. cancelled while running) keeps its status
+        with self._lock:
+            if self._done.is_set() or self.status in (DONE, FAILED, CANCELLED):
+                return False
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished = time.time()
+            self._done.set()
+            return True
+
+
+class JobQueue:
+    """Thread pool of jobs with per-user caps, cancellation and result expiry."""
+
+    def __init__(self, workers=JOB_WORKERS, per_user=MAX_ACTIVE_PER_USER, ttl=RESULT_TTL):
+        self.per_user = per_user
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, owner, fn, *args, kind='job', stream=False, on_done=None, **kwargs):
+        """Run fn(*args, **kwargs) in the background and return its Job.
+
+        With stream=True, fn returns an iterator of text chunks, which are
+        collected in job.chunks as they arrive; the result is the whole text.
+        `on_done(result)` runs in the worker after a successful job, before
+        waiting pages see it finish. Raises JobLimitExceeded when `owner`
+        already has per_user active jobs.
+        """
+        with self._lock:
+            self._expire()
+            active = sum(1 for job in self._jobs.values() if job.owner == owner and job.active)
+            if active >= self.per_user:
+                raise JobLimitExceeded(f'You already have {active} requests in progress. Wait for one to finish or cancel it.')
+            job = Job(owner, kind)
+            # Submitted under the lock, so get() and cancel() never see a job without its future
+            job._future = self._executor.submit(self._run, job, fn, args, kwargs, stream, on_done)
+            self._jobs[job.id] = job
+        return job
+
+    def _run(self, job, fn, args, kwargs, stream, on_done):
+        if not job._start():
+            return
+        job_span = span(f'job.{job.kind}', queue_seconds=job.started - job.created)
+        try:
+            if stream:
+                chunks = fn(*args, **kwargs)
+                try:
+                    for chunk in chunks:
+                        if not job.active:
+                            # Cancelled: stop reading. Closing the iterator below makes the
+                            # shared model stream stop once no other session reads it
+                            break
+                        job.chunks.append(chunk)
+                finally:
+                    close = getattr(chunks, 'close', None)
+                    if close is not None:
+                        close()
+                result = job.text
+            else:
+                result = fn(*args, **kwargs)
+        except Exception as e:
+            job_span.attrs['error_type'] = type(e).__name__
+            job_span.end(e)
+            job._finish(FAILED, error=e)
+            return
+        job_span.attrs['cancelled'] = not job.active
+        job_span.end()
+        if job.active and on_done is not None:
+            try:
+                on_done(result)
+            except Exception as e:
+                job._finish(FAILED, error=e)
+                return
+        job._finish(DONE, result=result)
+
+    def get(self, job_id, owner=None):
+        """Return the job, or None if it is unknown, expired or belongs to someone else."""
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id)
+        if job is None or (owner is not None and job.owner != owner):
+            return None
+        return job
+
+    def cancel(self, job_id, owner=None):
+        """Cancel a queued or running job. Returns whether anything was cancelled.
+
+        A running call's result is thrown away when it returns. A streaming job
+        stops at its next chunk, and so does the model's stream unless another
+        session is reading the same one (see utils.singleflight).
+        """
+        job = self.get(job_id, owner)
+        if job is None or not job.active:
+            return False
+        job._future.cancel()
+        return job._finish(CANCELLED)
+
+    def _expire(self):
+        # Called with _lock held
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and job.finished < cutoff]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            self._expire()
+            jobs = list(self._jobs.values())
+        counts = {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+        for job in jobs:
+            counts[job.status] += 1
+        return counts
+
+
+# Shared by every page and session of the process
+job_queue = JobQueue()
+
+
+def owner_id(session_state):
+    """Return the id of the user owning a Streamlit session (one per browser session)."""
+    if 'job_owner' not in session_state:
+        session_state['job_owner'] = uuid.uuid4().hex
+    return session_state['job_owner']
@@ -0,0 +1,349 @@
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from utils.ratelimit import DeadlineExceeded, backoff_delay, get_model_limiter
+from utils.singleflight import SingleFlight
+from utils.tokens import estimate_tokens
+from utils.tracing import llm_callback, span
+
+# Connection pool settings. Each model gets its own pool so a burst on one page
+# never starves another, and idle connections are kept open for reuse.
+# httpx is only imported when the first client is built.
+POOL_LIMITS = dict(max_connections=50, max_keepalive_connections=20, keepalive_expiry=300)
+REQUEST_TIMEOUT = dict(timeout=120.0, connect=10.0)
+
+_lock = threading.Lock()
+_models = {}
+_chains = {}
+_http_clients = {}
+
+# Identical prompts sent to the same model at the same time make one Groq call
+flights = SingleFlight('llm')
+
+# Retry policy for Groq calls. Retries happen here, so the Groq client's own are turned off.
+DEFAULT_TIMEOUT = 60            # seconds a caller waits for an answer, retries included
+MAX_ATTEMPTS = 4
+RETRY_STATUS = {408, 409, 429, 500, 502, 503, 504}
+RETRY_ERRORS = {'APIConnectionError', 'APITimeoutError', 'TimeoutException', 'TransportError'}
+# Output tokens reserved against the tokens/min limit when max_tokens is not set
+EXPECTED_OUTPUT_TOKENS = 500
+# Hedged requests send a duplicate when the first is slower than this latency quantile
+HEDGE_QUANTILE = 0.95
+HEDGING = os.getenv('NETDOC_HEDGE_LLM', '0') == '1'
+
+# Hedged duplicates in flight at once, across the process; more would crowd out new requests
+MAX_OUTSTANDING_HEDGES = int(os.getenv('NETDOC_MAX_HEDGES', '4'))
+
+# Attempts run here so callers can stop waiting at their deadline. An attempt nobody
+# waits for any more still holds a worker, until the HTTP timeout it was given (its
+# caller's deadline) ends it.
+_call_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='llm-call')
+_hedge_slots = threading.BoundedSemaphore(MAX_OUTSTANDING_HEDGES)
+
+
+class LLMUnavailable(Exception):
+    """Groq did not answer before the deadline, or kept failing after retries."""
+
+
+def _http_clients_for(model):
+    # Called with _lock held
+    clients = _http_clients.get(model)
+    if clients is None:
+        import httpx
+
+        limits = httpx.Limits(**POOL_LIMITS)
+        timeout = httpx.Timeout(**REQUEST_TIMEOUT)
+        clients = (
+            httpx.Client(limits=limits, timeout=timeout),
+            httpx.AsyncClient(limits=limits, timeout=timeout),
+        )
+        _http_clients[model] = clients
+    return clients
+
+
+def get_chat_model(model, **params):
+    """Return the process-wide ChatGroq client for `model` and `params`.
+
+    Clients are created once and shared by every page and session, and all clients
+    for the same model share one pooled, keep-alive HTTP connection set.
+    """
+    key = (model, tuple(sorted(params.items())))
+    chat_model = _models.get(key)
+    if chat_model is None:
+        with _lock:
+            chat_model = _models.get(key)
+            if chat_model is None:
+                # Imported on first use: langchain_groq is the slowest import of the LLM pages
+                from langchain_groq import ChatGroq
+
+                http_client, http_async_client = _http_clients_for(model)
+                chat_model = ChatGroq(
+                    model=model,
+                    http_client=http_client,
+                    http_async_client=http_async_client,
+                    callbacks=[llm_callback()],
+                    **dict({'max_retries': 0}, **params)
+                )
+                _models[key] = chat_model
+    return chat_model
+
+
+def get_chain(prompt_name, model, **params):
+    """Return a shared LLMChain that runs the prompt `prompt_name` against `model`."""
+    from langchain.chains import LLMChain
+    from utils.prompts import get_prompt
+
+    key = (prompt_name, model, tuple(sorted(params.items())))
+    chain = _chains.get(key)
+    if chain is None:
+        llm = get_chat_model(model, **params)
+        with _lock:
+            chain = _chains.get(key)
+            if chain is None:
+                chain = LLMChain(llm=llm, prompt=get_prompt(prompt_name))
+                _chains[key] = chain
+    return chain
+
+
+def _model_key(model):
+    # Registry models live for the whole process, so their id is a stable key.
+    # Bound models (e.g. JSON mode) are new objects each time: key by what they wrap.
+    bound = getattr(model, 'bound', None)
+    if bound is not None:
+        return (_model_key(bound), json.dumps(getattr(model, 'kwargs', {}), sort_keys=True, default=str))
+    return id(model)
+
+
+def _prompt_text(prompt):
+    return prompt.to_string() if hasattr(prompt, 'to_string') else str(prompt)
+
+
+def _model_name(model):
+    bound = getattr(model, 'bound', None)
+    if bound is not None:
+        return _model_name(bound)
+    return getattr(model, 'model_name', None) or getattr(model, 'model', None) or 'unknown'
+
+
+def _max_tokens(model):
+    return getattr(getattr(model, 'bound', model), 'max_tokens', None)
+
+
+def _request_tokens(model, prompt_text):
+    return estimate_tokens(prompt_text) + (_max_tokens(model) or EXPECTED_OUTPUT_TOKENS)
+
+
+def _answer_text(result):
+    # Messages and chunks carry the text in .content; chain.run() returns it directly
+    content = getattr(result, 'content', result)
+    return content if isinstance(content, str) else str(content)
+
+
+def _prompt_span(label, model, prompt_text):
+    """Open the span accounting one call of the prompt `label`, with the input tokens estimated locally.
+
+    Estimates are recorded even when Groq reports no usage (streams, errors),
+    so every prompt's size and output can be compared with its budget.
+    """
+    return span(f'prompt.{label or "other"}', model=_model_name(model), max_tokens=_max_tokens(model),
+                input_tokens=estimate_tokens(prompt_text))
+
+
+def _accounted(label, model, prompt_text, call):
+    with _prompt_span(label, model, prompt_text) as prompt_span:
+        result = call()
+        prompt_span.attrs['output_tokens'] = estimate_tokens(_answer_text(result))
+        return result
+
+
+def _status(error):
+    status = getattr(error, 'status_code', None)
+    return status if status is not None else getattr(getattr(error, 'response', None), 'status_code', None)
+
+
+def _retryable(error):
+    status = _status(error)
+    if status is not None:
+        return status in RETRY_STATUS
+    return any(cls.__name__ in RETRY_ERRORS for cls in type(error).__mro__)
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _with_retries(model_name, tokens, deadline, attempt):
+    """Run attempt(limiter, deadline) within the model's rate limits.
+
+    Transient failures (429, 5xx, timeouts, dropped connections) are retried with
+    exponential backoff and jitter, honouring Retry-After, until `deadline`.
+    """
+    limiter = get_model_limiter(model_name)
+    for number in range(MAX_ATTEMPTS):
+        try:
+            limiter.acquire(tokens, deadline)
+            return attempt(limiter, deadline)
+        except DeadlineExceeded as e:
+            raise LLMUnavailable(f'{model_name} did not answer in time, please try again.') from e
+        except Exception as e:
+            if not _retryable(e):
+                raise
+            retry_after = _retry_after(e)
+            if _status(e) == 429:
+                # Everyone sharing this model backs off, not just this caller
+                limiter.pause(retry_after or backoff_delay(number))
+            delay = max(retry_after or 0, backoff_delay(number))
+            if number == MAX_ATTEMPTS - 1 or time.monotonic() + delay >= deadline:
+                raise LLMUnavailable(f'{model_name} is busy or unreachable, please try again.') from e
+            span('llm.retry', model=model_name, status=_status(e)).end()
+            time.sleep(delay)
+
+
+def _remaining(deadline):
+    # HTTP timeout for a request sent now: the time left until the caller's deadline
+    return max(deadline - time.monotonic(), 0.001)
+
+
+def _call(model_name, call, limiter, deadline, hedge, tokens):
+    """Run call(timeout) once, optionally hedged, and wait for it no longer than `deadline`.
+
+    `timeout` is the time left until the deadline, for the HTTP request, so an
+    attempt abandoned here does not outlive it.
+    """
+    started = time.monotonic()
+    pending = {_call_executor.submit(call, _remaining(deadline))}
+    hedge_after = limiter.latency_quantile(HEDGE_QUANTILE) if hedge else None
+    error = None
+    while pending:
+        timeout = deadline - time.monotonic()
+        if hedge_after is not None:
+            timeout = min(timeout, started + hedge_after - time.monotonic())
+        done, pending = wait(pending, timeout=max(timeout, 0), return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                limiter.record_latency(time.monotonic() - started)
+                return future.result()
+            error = future.exception()
+        if done:
+            continue
+        if time.monotonic() >= deadline:
+            raise DeadlineExceeded(f'{model_name} call exceeded its deadline')
+        if hedge_after is not None:
+            # Slower than usual: send a duplicate if there is spare capacity and take the first answer
+            hedge_after = None
+            if not _hedge_slots.acquire(blocking=False):
+                continue
+            if not limiter.try_acquire(tokens):
+                _hedge_slots.release()
+                continue
+            span('llm.hedge', model=model_name).end()
+            hedged = _call_executor.submit(call, _remaining(deadline))
+            # The slot is held until the duplicate ends, whether or not it is still awaited
+            hedged.add_done_callback(lambda _: _hedge_slots.release())
+            pending.add(hedged)
+    raise error
+
+
+def _guarded(model, prompt_text, call, timeout, hedge):
+    model_name = _model_name(model)
+    tokens = _request_tokens(model, prompt_text)
+    hedge = HEDGING if hedge is None else hedge
+    return _with_retries(
+        model_name, tokens, time.monotonic() + timeout,
+        lambda limiter, deadline: _call(model_name, call, limiter, deadline, hedge, tokens)
+    )
+
+
+def _guarded_stream(model, prompt, timeout, label):
+    # Only the wait for the first chunk is retried; a stream that broke halfway is not replayed
+    model_name = _model_name(model)
+    text = _prompt_text(prompt)
+    tokens = _request_tokens(model, text)
+
+    def first_chunk(limiter, deadline):
+        # The HTTP timeout bounds each read, so a stalled stream ends by the deadline too
+        iterator = iter(model.stream(prompt, timeout=_remaining(deadline)))
+        future = _call_executor.submit(next, iterator, None)
+        done, _ = wait([future], timeout=max(deadline - time.monotonic(), 0))
+        if not done:
+            # next() is still running in the worker: close the stream once it returns,
+            # so its connection goes back to the pool before the retry
+            future.add_done_callback(lambda _: iterator.close())
+            raise DeadlineExceeded(f'{model_name} sent nothing before the deadline')
+        try:
+            return future.result(), iterator
+        except BaseException:
+            iterator.close()
+            raise
+
+    prompt_span = _prompt_span(label, model, text)
+    parts = []
+    error = None
+    iterator = None
+    try:
+        first, iterator = _with_retries(model_name, tokens, time.monotonic() + timeout, first_chunk)
+        if first is not None:
+            for chunk in itertools.chain([first], iterator):
+                parts.append(_answer_text(chunk))
+                yield chunk
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        # A reader that stops early stops the model's stream too, instead of leaving it to the garbage collector
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
+        prompt_span.attrs['output_tokens'] = estimate_tokens(''.join(parts))
+        prompt_span.end(error)
+
+
+def invoke(model, prompt, timeout=DEFAULT_TIMEOUT, hedge=None, label=None):
+    """model.invoke(prompt) with rate limiting, retries and a deadline of `timeout` seconds.
+
+    Shared with any identical call already in flight. `hedge` overrides HEDGING.
+    The call's estimated tokens are recorded in a prompt.<label> span.
+    Raises LLMUnavailable when no answer arrives in time.
+    """
+    text = _prompt_text(prompt)
+
+    def call(request_timeout):
+        return model.invoke(prompt, timeout=request_timeout)
+
+    return flights.do(
+        ('invoke', _model_key(model), text),
+        lambda: _accounted(label, model, text, lambda: _guarded(model, text, call, timeout, hedge))
+    )
+
+
+def stream(model, prompt, timeout=DEFAULT_TIMEOUT, label=None):
+    """model.stream(prompt) with rate limiting, shared with any identical stream already in flight.
+
+    `timeout` bounds the wait for the first chunk, retries included. Tokens are
+    accounted like in invoke() once the stream ends.
+    """
+    return flights.stream(('stream', _model_key(model), _prompt_text(prompt)),
+                          lambda: _guarded_stream(model, prompt, timeout, label))
+
+
+def run_chain(chain, inputs, timeout=DEFAULT_TIMEOUT, hedge=None, label=None):
+    """chain.run(inputs) with the same limits, retries, deadline and token accounting as invoke()."""
+    key = ('chain', id(chain), json.dumps(inputs, sort_keys=True, default=str))
+    text = chain.prompt.format(**inputs)
+
+    def call(request_timeout):
+        # What chain.run() does for a chat model, with the HTTP timeout passed on
+        return chain.llm.invoke(chain.prompt.format_prompt(**inputs), timeout=request_timeout).content
+
+    return flights.do(
+        key,
+        lambda: _accounted(label, chain.llm, text, lambda: _guarded(chain.llm, text, call, timeout, hedge))
+    )
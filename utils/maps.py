@@ -0,0 +1,120 @@
+import html
+import math
+
+import numpy as np
+
+# Default map location (New Delhi, India) when there are no reports
+DEFAULT_LOCATION = (28.6139, 77.2090)
+# Size of one heat map cell in degrees (about 1 km at the equator)
+HEAT_CELL_SIZE = 0.01
+MAP_HEIGHT = 500
+MAP_WIDTH = 700
+
+# Markers are created in the browser from a plain data array, so the page only
+# ships one small JS function instead of one Marker object per report
+MARKER_CALLBACK = """
+function (row) {
+    var icon = L.AwesomeMarkers.icon({icon: 'exclamation-circle', prefix: 'fa', markerColor: 'red'});
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icon});
+    marker.bindPopup(row[2]);
+    return marker;
+};
+"""
+
+
+class HeatGrid:
+    """Report counts binned into a sparse lat/lon grid.
+
+    Cells are stored as sorted integer codes with a parallel count array, so
+    adding reports only merges the new cells instead of re-binning everything.
+    """
+
+    def __init__(self, cell_size=HEAT_CELL_SIZE):
+        self.cell_size = cell_size
+        self._cols = int(round(360 / cell_size))
+        self.codes = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        # Id of the newest report already binned, used to fetch only new reports
+        self.last_id = 0
+
+    def add(self, lat, lon):
+        """Add one or many reports (scalars or arrays)."""
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        rows = np.floor((lat + 90) / self.cell_size).astype(np.int64)
+        cols = np.floor((lon + 180) / self.cell_size).astype(np.int64) % self._cols
+        codes = np.concatenate([self.codes, rows * self._cols + cols])
+        counts = np.concatenate([self.counts, np.ones(len(rows), dtype=np.int64)])
+        self.codes, inverse = np.unique(codes, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts).astype(np.int64)
+
+    def points(self, bbox=None):
+        """Return [[lat, lon, weight], ...] at the cell centres, weights scaled to (0, 1].
+
+        With `bbox` = (min_lat, min_lon, max_lat, max_lon) only cells inside it are returned.
+        """
+        if not len(self.codes):
+            return []
+        lat = (self.codes // self._cols + 0.5) * self.cell_size - 90
+        lon = (self.codes % self._cols + 0.5) * self.cell_size - 180
+        counts = self.counts
+        if bbox is not None:
+            inside = (lat >= bbox[0]) & (lat <= bbox[2]) & (lon >= bbox[1]) & (lon <= bbox[3])
+            lat, lon, counts = lat[inside], lon[inside], counts[inside]
+            if not len(counts):
+                return []
+        weight = counts / counts.max()
+        return np.column_stack([lat, lon, weight]).tolist()
+
+
+def _escaped(values):
+    # Reports are user input and the popups are HTML shown to every visitor
+    return np.array([html.escape(value) for value in np.asarray(values, dtype=str).tolist()], dtype=str)
+
+
+def popup_html(issues, descriptions, users):
+    """Build the popup HTML for every report from whole columns, with the user-written text escaped."""
+    issues = _escaped(issues)
+    descriptions = _escaped(descriptions)
+    users = _escaped(users)
+    return np.char.add(np.char.add(np.char.add(np.char.add(np.char.add(
+        'Issue: ', issues), '<br>Description: '), descriptions), '<br>Reported by: '), users)
+
+
+def bbox_around(lat, lon, radius_km):
+    """Return the (min_lat, min_lon, max_lat, max_lon) box `radius_km` around a point."""
+    dlat = radius_km / 111.0
+    dlon = radius_km / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+    return (lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+
+
+# folium is imported inside the functions below: it is only needed when a map
+# is actually rendered, and rendered maps are cached by the page
+
+def empty_map(zoom_start=10):
+    """Build the map shown when there are no reports to display."""
+    import folium
+
+    return folium.Map(location=list(DEFAULT_LOCATION), zoom_start=zoom_start)
+
+
+def build_map(lat, lon, popups, heat_points, zoom_start=10):
+    """Build a Folium map with client-side clustered markers and a binned heat layer."""
+    import folium
+    from folium.plugins import FastMarkerCluster, HeatMap
+
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    m = folium.Map(location=[lat.mean(), lon.mean()], zoom_start=zoom_start)
+    data = [[a, b, p] for a, b, p in zip(lat.tolist(), lon.tolist(), list(popups))]
+    FastMarkerCluster(data, callback=MARKER_CALLBACK).add_to(m)
+    HeatMap(heat_points).add_to(m)
+    return m
+
+
+def render_html(m):
+    """Render a map to a standalone HTML string (what folium_static displays)."""
+    import folium
+
+    figure = folium.Figure().add_child(m)
+    return figure.render()
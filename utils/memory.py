@@ -0,0 +1,201 @@
+import json
+import os
+import threading
+import time
+import uuid
+import weakref
+
+from utils.cache import CACHE_DIR
+from utils.tokens import estimate_tokens
+
+TRANSCRIPT_DIR = os.path.join(CACHE_DIR, 'transcripts')
+# Tokens of conversation history sent with each question (recent turns + summary)
+HISTORY_TOKEN_BUDGET = 1500
+# Part of the budget reserved for the rolling summary of older turns
+SUMMARY_TOKEN_BUDGET = 300
+# Messages kept in memory; older ones are only on disk
+SPILL_AFTER = 50
+# Transcripts of sessions that ended without cleaning up are removed after this many
+# seconds without a write, oldest first once there are more than MAX_TRANSCRIPTS
+TRANSCRIPT_TTL = int(os.getenv('NETDOC_TRANSCRIPT_TTL', str(24 * 3600)))
+MAX_TRANSCRIPTS = int(os.getenv('NETDOC_MAX_TRANSCRIPTS', '1000'))
+
+
+def _format(messages):
+    names = {'user': 'User', 'assistant': 'Assistant'}
+    return '\n'.join(f"{names.get(m['role'], m['role'])}: {m['content']}" for m in messages)
+
+
+def history_context(messages, token_budget=HISTORY_TOKEN_BUDGET):
+    """History text for stateless callers: the most recent `messages` that fit the token budget."""
+    used = 0
+    start = len(messages)
+    while start > 0:
+        tokens = estimate_tokens(messages[start - 1]['content'])
+        if used + tokens > token_budget:
+            break
+        used += tokens
+        start -= 1
+    return _format(messages[start:])
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def sweep_transcripts(transcript_dir=TRANSCRIPT_DIR, ttl=TRANSCRIPT_TTL, max_files=MAX_TRANSCRIPTS):
+    """Delete transcripts not written for `ttl` seconds, then the oldest beyond `max_files`."""
+    try:
+        names = os.listdir(transcript_dir)
+    except FileNotFoundError:
+        return
+    files = []
+    for name in names:
+        path = os.path.join(transcript_dir, name)
+        try:
+            files.append((os.path.getmtime(path), path))
+        except FileNotFoundError:
+            continue
+    files.sort(reverse=True)
+    cutoff = time.time() - ttl
+    for index, (modified, path) in enumerate(files):
+        if modified < cutoff or index >= max_files:
+            _remove(path)
+
+
+class ConversationMemory:
+    """Chat history for one session with a bounded prompt footprint.
+
+    context() returns as many recent turns as fit in the token budget. Turns that
+    no longer fit are folded into a rolling summary by `summarizer(summary, text)`,
+    only once each. The summarizer runs outside the lock, so add() and page()
+    never wait on it; if it fails, the turns wait for the next context() call.
+    Only the newest SPILL_AFTER messages stay in memory; older ones are moved to
+    a JSON-lines file on disk, which clear() deletes, as does garbage collection
+    of the memory when its session ends. sweep_transcripts() removes the files
+    of sessions that ended without either.
+    """
+
+    def __init__(self, token_budget=HISTORY_TOKEN_BUDGET, summary_budget=SUMMARY_TOKEN_BUDGET,
+                 spill_after=SPILL_AFTER, summarizer=None, transcript_dir=TRANSCRIPT_DIR):
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.spill_after = spill_after
+        self.summarizer = summarizer
+        self.summary = ''
+        self.transcript_path = os.path.join(transcript_dir, f'{uuid.uuid4().hex}.jsonl')
+        self._recent = []       # newest messages, each with a cached token count
+        self._spilled = 0       # messages that are only on disk
+        self._summarized = 0    # messages (by absolute index) already queued for the summary
+        self._to_fold = []      # messages left out of the window and not summarized yet
+        self._lost = 0          # spilled messages whose file was swept (the file starts after them)
+        self._lock = threading.Lock()
+        os.makedirs(transcript_dir, exist_ok=True)
+        sweep_transcripts(transcript_dir)
+        # The file is only created once messages spill; removed with the session's memory
+        self._cleanup = weakref.finalize(self, _remove, self.transcript_path)
+
+    def __len__(self):
+        return self._spilled + len(self._recent)
+
+    def add(self, role, content):
+        message = {'role': role, 'content': content, 'tokens': estimate_tokens(content)}
+        with self._lock:
+            self._recent.append(message)
+            overflow = len(self._recent) - self.spill_after
+            if overflow > 0:
+                evicted = self._recent[:overflow]
+                if self._spilled > self._lost and not os.path.exists(self.transcript_path):
+                    self._lost = self._spilled
+                with open(self.transcript_path, 'a', encoding='utf-8') as f:
+                    for m in evicted:
+                        f.write(json.dumps({'role': m['role'], 'content': m['content']}) + '\n')
+                self._queue_fold(evicted, self._spilled)
+                del self._recent[:overflow]
+                self._spilled += overflow
+
+    def clear(self):
+        """Forget the conversation and delete its transcript."""
+        with self._lock:
+            _remove(self.transcript_path)
+            self.summary = ''
+            self._recent = []
+            self._spilled = 0
+            self._summarized = 0
+            self._to_fold = []
+            self._lost = 0
+
+    def context(self):
+        """Return the history text to put in the prompt (summary + recent turns).
+
+        May call the summarizer (an LLM call), so run it off the script thread.
+        """
+        with self._lock:
+            budget = self.token_budget - (self.summary_budget if self.summary or self._spilled else 0)
+            used = 0
+            start = len(self._recent)
+            while start > 0 and used + self._recent[start - 1]['tokens'] <= budget:
+                start -= 1
+                used += self._recent[start]['tokens']
+            self._queue_fold(self._recent[:start], self._spilled)
+            window = _format(self._recent[start:]) if start < len(self._recent) else ''
+            summary, to_fold = self.summary, list(self._to_fold)
+        if to_fold and self.summarizer is not None:
+            summary = self._summarize(summary, to_fold)
+        parts = []
+        if summary:
+            parts.append(f'Summary of the earlier conversation: {summary}')
+        if window:
+            parts.append(window)
+        return '\n\n'.join(parts)
+
+    def _queue_fold(self, messages, first_index):
+        # Called with _lock held: queue the messages not queued for the summary yet
+        new = messages[max(self._summarized - first_index, 0):]
+        if not new:
+            return
+        self._summarized = first_index + len(messages)
+        # While the summarizer keeps failing, only the newest turns wait (the rest are on disk)
+        self._to_fold = (self._to_fold + new)[-self.spill_after:]
+
+    def _summarize(self, summary, to_fold):
+        # Without the lock: fold `to_fold` into `summary`, keeping the old summary on failure
+        try:
+            folded = self.summarizer(summary, _format(to_fold))
+        except Exception:
+            return summary
+        with self._lock:
+            # Another context() call may have folded these turns meanwhile
+            if self.summary == summary and self._to_fold[:len(to_fold)] == to_fold:
+                self.summary = folded
+                del self._to_fold[:len(to_fold)]
+                return folded
+            return self.summary
+
+    def page(self, page, page_size):
+        """Return one page of messages, page 0 being the newest.
+
+        Older pages are read back from the transcript on disk.
+        """
+        with self._lock:
+            total = self._spilled + len(self._recent)
+            end = max(total - page * page_size, 0)
+            start = max(end - page_size, 0)
+            if start >= self._spilled:
+                return [{'role': m['role'], 'content': m['content']} for m in self._recent[start - self._spilled:end - self._spilled]]
+            messages = []
+            try:
+                with open(self.transcript_path, encoding='utf-8') as f:
+                    for index, line in enumerate(f, self._lost):
+                        if index >= min(end, self._spilled):
+                            break
+                        if index >= start:
+                            messages.append(json.loads(line))
+            except FileNotFoundError:
+                # Swept after TRANSCRIPT_TTL without a write: the old messages are gone
+                pass
+            recent = self._recent[:max(end - self._spilled, 0)]
+            return messages + [{'role': m['role'], 'content': m['content']} for m in recent]
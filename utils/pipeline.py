@@ -0,0 +1,150 @@
+import json
+import re
+
+from utils.issues import potential_issues
+from utils import router, rules
+from utils.cache import diagnosis_key
+from utils.prompts import get_prompt
+
+# Both steps choose among, or explain, issues from the fixed list
+DIAGNOSE_ROUTE = 'selection'
+
+
+def issue_label(name):
+    """An issue name without its leading emoji, which costs tokens and tells the model nothing."""
+    return re.sub(r'^\W+', '', name.strip())
+
+
+def issue_codes(names):
+    """Render issue names as 'code: name' lines for a prompt; the code is the index in potential_issues."""
+    return '\n'.join(f'{potential_issues.index(name)}: {issue_label(name)}' for name in names)
+
+
+def decode_issues(text, candidates):
+    """Map the codes in an answer to the issue prompt back to issue names, formatted by rules.format_issues.
+
+    An answer without any known code is matched by issue name instead, and
+    kept as it is when no name matches either.
+    """
+    allowed = [potential_issues.index(name) for name in candidates]
+    picked = [n for n in dict.fromkeys(int(n) for n in re.findall(r'\b\d+\b', text)) if n in allowed]
+    if not picked:
+        lowered = text.lower()
+        picked = [index for index in allowed if issue_label(potential_issues[index]).lower() in lowered]
+    if not picked:
+        return text.strip()
+    return rules.format_issues([potential_issues[index] for index in picked[:2]])
+
+
+def parse_structured(text, allowed):
+    """Parse the single-call JSON answer into [(issue_index, solution), ...].
+
+    Only indices in `allowed` are kept. If the model wrapped the JSON in prose or
+    broke it, fall back to picking the issue numbers mentioned in the text.
+    """
+    match = re.search(r'\{.*\}', text, re.DOTALL)
+    if match:
+        try:
+            items = json.loads(match.group(0)).get('issues', [])
+            parsed = [(int(item['index']), str(item.get('solution', '')).strip())
+                      for item in items if isinstance(item, dict) and 'index' in item]
+            parsed = [(index, solution) for index, solution in parsed if index in allowed]
+            if parsed:
+                return parsed
+        except (ValueError, TypeError, AttributeError):
+            pass
+    numbers = [int(n) for n in re.findall(r'\b\d+\b', text)]
+    return [(n, '') for n in dict.fromkeys(numbers) if n in allowed][:2]
+
+
+def format_solutions(parsed):
+    """Render [(issue_index, solution), ...] as the page's solution markdown."""
+    return '\n\n'.join(f'### {potential_issues[index].strip()}\n{solution}' for index, solution in parsed if solution)
+
+
+def issue_prompt(inputs, candidates):
+    """Render the two-step flow's issue prompt for the Diagnose fields in `inputs`."""
+    return get_prompt('diagnose_issue').invoke({
+        'internet_speed': inputs['internet_speed'],
+        'ping': inputs['ping'],
+        'wifi_strength': inputs['wifi_strength'],
+        'device_type': inputs['device_type'],
+        'usage': inputs['usage_type'],
+        'network_type': inputs['network_type'],
+        'router_distance': inputs['router_distance'],
+        'connected_devices': inputs['connected_devices'],
+        'vpn_usage': inputs['vpn_usage'],
+        'issue_codes': issue_codes(candidates)
+    })
+
+
+def predict_issues(inputs, cache=None, single_call=False):
+    """Run the Diagnose flow: local rules first, then `cache`, then the LLM.
+
+    Returns a dict with the `issues` text, its `source` ('probe', 'rules', 'cache'
+    or 'llm'), the rule `confidences` and, when already known, the `solution`.
+    """
+    measured = inputs.get('measured_issues') or []
+    if measured:
+        # Issues the probes observed are facts; the rules add the most likely other one
+        rule_result = rules.diagnose(inputs, k=max(2, len(measured)))
+        return {'issues': rules.format_issues(rule_result['issues']), 'source': 'probe',
+                'confidences': rule_result['confidences'], 'solution': None}
+    rule_result = rules.diagnose(inputs)
+    if rule_result['confident']:
+        return {'issues': rules.format_issues(rule_result['issues']), 'source': 'rules',
+                'confidences': rule_result['confidences'], 'solution': None}
+    def ask_llm():
+        if single_call:
+            # One structured call returns the issues and their solutions together
+            result = diagnose_and_solve(inputs, rule_result['candidates'])
+            return {'issues': rules.format_issues(result['issues']), 'solution': result['solution'] or None}
+        # Only the locally shortlisted candidates are sent to the LLM, and a
+        # constrained choice from the list only needs the small model
+        candidates = rule_result['candidates']
+        answer = router.invoke(DIAGNOSE_ROUTE, issue_prompt(inputs, candidates), prompt_name='diagnose_issue')
+        return {'issues': decode_issues(answer.content, candidates), 'solution': None}
+
+    if cache is None:
+        value, cached = ask_llm(), False
+    else:
+        # Replicas asking for the same profile at the same time share one LLM call
+        value, cached = cache.get_or_compute(diagnosis_key(inputs), ask_llm)
+    return {'issues': value['issues'], 'source': 'cache' if cached else 'llm', 'confidences': [],
+            'solution': value.get('solution')}
+
+
+def diagnose_and_solve(inputs, candidates=None):
+    """Predict the issues and their solutions in a single structured LLM call.
+
+    `candidates` limits the choice to those issue names (default: all issues).
+    Returns a dict with `indices` into potential_issues, `issues` (names) and `solution` markdown.
+    """
+    candidates = candidates or potential_issues
+    allowed = [potential_issues.index(name) for name in candidates]
+    prompt = get_prompt('diagnose_structured').invoke({
+        'internet_speed': inputs['internet_speed'],
+        'ping': inputs['ping'],
+        'wifi_strength': inputs['wifi_strength'],
+        'device_type': inputs['device_type'],
+        'usage': inputs['usage_type'],
+        'network_type': inputs['network_type'],
+        'router_distance': inputs['router_distance'],
+        'connected_devices': inputs['connected_devices'],
+        'vpn_usage': inputs['vpn_usage'],
+        'issue_codes': issue_codes(candidates)
+    })
+    answer = router.invoke(DIAGNOSE_ROUTE, prompt, prompt_name='diagnose_structured',
+                           bind={'response_format': {'type': 'json_object'}})
+    parsed = parse_structured(answer.content, set(allowed))
+    return {
+        'indices': [index for index, _ in parsed],
+        'issues': [potential_issues[index] for index, _ in parsed],
+        'solution': format_solutions(parsed),
+    }
+
+
+def solve(predicted_issues):
+    """Ask the LLM how to fix `predicted_issues` (the second step of the two-step flow)."""
+    prompt = get_prompt('diagnose_solution').invoke({'predicted_issues': predicted_issues})
+    return router.invoke(DIAGNOSE_ROUTE, prompt, prompt_name='diagnose_solution').content
@@ -0,0 +1,348 @@
+"""Active network probes that measure what the Diagnose page otherwise asks for.
+
+All probes run concurrently on one asyncio loop, each with its own timeout, so
+a full run takes about as long as the slowest probe (around two seconds):
+
+- TCP connect latency and jitter to a few targets (no root needed, unlike ICMP)
+- packet loss, estimated from TCP connects that get no answer at all
+- DNS resolution time and failures
+- download throughput from THROUGHPUT_URL
+- path MTU, comparing the route MTU with the MSS the far end negotiated
+- the local link (WiFi or Ethernet, WiFi signal), on Linux
+
+Probes measure the machine running the app, not the visitor's browser. The
+Diagnose page only offers them when NETDOC_LOCAL_PROBE=1 says the app runs on
+the user's own machine. Run them from the command line with:
+
+    python -m utils.probe --targets 1.1.1.1:443 --dns www.google.com
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import statistics
+import sys
+import time
+
+from utils.issues import potential_issues
+from utils.tracing import span
+
+# Hosts for the TCP connect probes as host:port. Anycast DNS resolvers are close to everyone.
+TCP_TARGETS = os.getenv('NETDOC_PROBE_TARGETS', '1.1.1.1:443,8.8.8.8:443,9.9.9.9:443')
+DNS_NAMES = os.getenv('NETDOC_PROBE_DNS', 'www.google.com,www.cloudflare.com,www.wikipedia.org')
+# 5 MB: enough for a rate over THROUGHPUT_SECONDS on most links without a large download per run
+THROUGHPUT_URL = os.getenv('NETDOC_PROBE_THROUGHPUT_URL', 'https://speed.cloudflare.com/__down?bytes=5000000')
+# The probes measure the server, which is the user's connection only when the app runs locally
+LOCAL_PROBE = os.getenv('NETDOC_LOCAL_PROBE', '0') == '1'
+# Seconds a session waits between two runs
+PROBE_INTERVAL = 60
+TCP_SAMPLES = 5
+TCP_INTERVAL = 0.05
+# A lost SYN is only resent after a second, so a connect that takes longer counts as lost
+CONNECT_TIMEOUT = 1.0
+DNS_TIMEOUT = 1.5
+THROUGHPUT_SECONDS = 1.5
+# Hard limit for a whole run; probes still running then count as failed
+RUN_BUDGET = 3.0
+
+# Share of unanswered connects reported as packet loss
+LOSS_THRESHOLD = 0.05
+# Route MTU minus negotiated MSS is 40-52 bytes (IP and TCP headers, timestamps);
+# much more means something on the path clamps the segment size. Only routes up to
+# STANDARD_MTU are compared: loopback and jumbo-frame routes always exceed the internet path.
+MSS_SLACK = 80
+STANDARD_MTU = 1500
+# IP_MTU is only exposed on Linux, and not always by name
+IP_MTU = getattr(socket, 'IP_MTU', 14) if sys.platform.startswith('linux') else None
+
+# Issues the probes can observe directly (indices into potential_issues)
+PACKET_LOSS = potential_issues[0]
+ROUTER_UNREACHABLE = potential_issues[1]
+DNS_FAILURE = potential_issues[2]
+FIREWALL_BLOCKING = potential_issues[4]
+MTU_MISMATCH = potential_issues[12]
+
+
+def parse_targets(text):
+    """Parse 'host:port,host:port' into [(host, port)]."""
+    targets = []
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        host, _, port = item.rpartition(':')
+        targets.append((host.strip('[]'), int(port)))
+    return targets
+
+
+def _path_info(sock):
+    # (route MTU, negotiated MSS) of a connected TCP socket, where the platform tells us
+    mtu = mss = None
+    with contextlib.suppress(OSError, AttributeError, TypeError):
+        mss = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_MAXSEG)
+    if IP_MTU is not None and sock.family == socket.AF_INET:
+        with contextlib.suppress(OSError):
+            mtu = sock.getsockopt(socket.IPPROTO_IP, IP_MTU)
+    return mtu, mss
+
+
+async def _connect(host, port, timeout):
+    """Time one TCP connect. Returns (seconds or None when unanswered, route MTU, MSS)."""
+    start = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except ConnectionRefusedError:
+        # A reset still proves the host answered
+        return time.perf_counter() - start, None, None
+    except (OSError, asyncio.TimeoutError):
+        return None, None, None
+    elapsed = time.perf_counter() - start
+    mtu, mss = _path_info(writer.get_extra_info('socket'))
+    writer.close()
+    with contextlib.suppress(OSError):
+        await writer.wait_closed()
+    return elapsed, mtu, mss
+
+
+async def tcp_probe(host, port, samples=TCP_SAMPLES, interval=TCP_INTERVAL, timeout=CONNECT_TIMEOUT):
+    """Connect `samples` times, one after another, and report latency, jitter and losses."""
+    with span('probe.tcp', target=f'{host}:{port}'):
+        rtts, mtu, mss = [], None, None
+        for index in range(samples):
+            if index:
+                await asyncio.sleep(interval)
+            elapsed, sample_mtu, sample_mss = await _connect(host, port, timeout)
+            if elapsed is not None:
+                rtts.append(elapsed * 1000)
+                mtu, mss = sample_mtu or mtu, sample_mss or mss
+        # Jitter as the mean difference between consecutive samples (as in RFC 3550)
+        jitter = statistics.fmean(abs(a - b) for a, b in zip(rtts, rtts[1:])) if len(rtts) > 1 else None
+        return {
+            'target': f'{host}:{port}',
+            'sent': samples,
+            'lost': samples - len(rtts),
+            'rtt_ms': statistics.median(rtts) if rtts else None,
+            'jitter_ms': jitter,
+            'mtu': mtu,
+            'mss': mss,
+        }
+
+
+async def dns_probe(name, timeout=DNS_TIMEOUT):
+    """Resolve `name` once through the system resolver and time it."""
+    loop = asyncio.get_running_loop()
+    with span('probe.dns', target=name):
+        start = time.perf_counter()
+        try:
+            addresses = await asyncio.wait_for(loop.getaddrinfo(name, None, type=socket.SOCK_STREAM), timeout)
+        except asyncio.TimeoutError:
+            return {'name': name, 'ms': None, 'error': 'timeout'}
+        except OSError as e:
+            return {'name': name, 'ms': None, 'error': type(e).__name__}
+        return {'name': name, 'ms': (time.perf_counter() - start) * 1000, 'addresses': len(addresses), 'error': None}
+
+
+async def throughput_probe(url, seconds=THROUGHPUT_SECONDS, timeout=CONNECT_TIMEOUT * 2):
+    """Download from `url` for up to `seconds` and report the rate after the first byte."""
+    import aiohttp
+
+    with span('probe.throughput', target=url):
+        received = 0
+        try:
+            client_timeout = aiohttp.ClientTimeout(total=timeout + seconds, sock_connect=timeout)
+            async with aiohttp.ClientSession(timeout=client_timeout) as session:
+                async with session.get(url) as response:
+                    response.raise_for_status()
+                    start = deadline = None
+                    async for chunk in response.content.iter_any():
+                        if start is None:
+                            start = time.perf_counter()
+                            deadline = start + seconds
+                        received += len(chunk)
+                        if time.perf_counter() >= deadline:
+                            break
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            return {'url': url, 'mbps': None, 'bytes': received, 'error': type(e).__name__}
+        elapsed = time.perf_counter() - start if start is not None else 0
+        mbps = received * 8 / elapsed / 1e6 if elapsed > 0 else None
+        return {'url': url, 'mbps': mbps, 'bytes': received, 'error': None}
+
+
+def default_gateway():
+    """Return the IPv4 default gateway from /proc/net/route (Linux), else None."""
+    with contextlib.suppress(OSError, ValueError):
+        with open('/proc/net/route') as f:
+            for line in f.readlines()[1:]:
+                fields = line.split()
+                if fields[1] == '00000000' and int(fields[3], 16) & 2:
+                    return socket.inet_ntoa(int(fields[2], 16).to_bytes(4, 'little')), fields[0]
+    return None
+
+
+def _wifi_strength(dbm):
+    if dbm >= -55:
+        return 'Excellent'
+    if dbm >= -67:
+        return 'Good'
+    if dbm >= -75:
+        return 'Weak'
+    return 'Very Weak'
+
+
+def local_link(interface):
+    """Describe the interface used for the default route: network type and WiFi strength (Linux)."""
+    link = {'interface': interface, 'network_type': None, 'wifi_strength': None}
+    if not interface:
+        return link
+    if os.path.isdir(f'/sys/class/net/{interface}/wireless'):
+        link['network_type'] = 'WiFi'
+        with contextlib.suppress(OSError, ValueError, IndexError):
+            with open('/proc/net/wireless') as f:
+                for line in f.readlines()[2:]:
+                    name, values = line.split(':', 1)
+                    if name.strip() == interface:
+                        link['wifi_strength'] = _wifi_strength(float(values.split()[2].rstrip('.')))
+    elif interface.startswith(('wwan', 'ppp', 'usb', 'rmnet')):
+        link['network_type'] = 'Mobile Data'
+    elif interface.startswith(('eth', 'en')):
+        link['network_type'] = 'Ethernet'
+    return link
+
+
+async def run_probes(targets=None, dns_names=None, throughput_url=THROUGHPUT_URL, gateway=None, budget=RUN_BUDGET):
+    """Run every probe concurrently and summarise the results.
+
+    `targets` is a list of (host, port), `dns_names` a list of names and
+    `gateway` a (host, port) to check the router with; by default they come
+    from the settings above and /proc/net/route. Pass throughput_url=None to
+    skip the download.
+    """
+    with span('probe.run') as run_span:
+        start = time.perf_counter()
+        targets = parse_targets(TCP_TARGETS) if targets is None else targets
+        dns_names = [name.strip() for name in DNS_NAMES.split(',') if name.strip()] if dns_names is None else dns_names
+        interface = None
+        if gateway is None:
+            route = default_gateway()
+            if route:
+                # Any answer from the router counts, even a refused connection
+                gateway, interface = (route[0], 53), route[1]
+
+        tasks = {('tcp', i): tcp_probe(host, port) for i, (host, port) in enumerate(targets)}
+        tasks.update({('dns', i): dns_probe(name) for i, name in enumerate(dns_names)})
+        if throughput_url:
+            tasks[('throughput', 0)] = throughput_probe(throughput_url)
+        if gateway:
+            tasks[('gateway', 0)] = tcp_probe(*gateway, samples=2)
+        futures = {key: asyncio.ensure_future(coroutine) for key, coroutine in tasks.items()}
+        done, pending = await asyncio.wait(futures.values(), timeout=budget)
+        for future in pending:
+            future.cancel()
+        results = {key: future.result() for key, future in futures.items() if future in done and not future.exception()}
+
+        report = summarize(
+            tcp=[results.get(('tcp', i)) or {'target': f'{host}:{port}', 'sent': TCP_SAMPLES, 'lost': TCP_SAMPLES,
+                                             'rtt_ms': None, 'jitter_ms': None, 'mtu': None, 'mss': None}
+                 for i, (host, port) in enumerate(targets)],
+            dns=[results.get(('dns', i)) or {'name': name, 'ms': None, 'error': 'timeout'} for i, name in enumerate(dns_names)],
+            throughput=results.get(('throughput', 0)) if throughput_url else None,
+            gateway=results.get(('gateway', 0), {'lost': 1, 'rtt_ms': None}) if gateway else None,
+            link=local_link(interface),
+        )
+        report['elapsed'] = time.perf_counter() - start
+        run_span.attrs['issues'] = len(report['issues'])
+        return report
+
+
+def summarize(tcp, dns, throughput=None, gateway=None, link=None):
+    """Combine raw probe results into headline numbers and the issues they show."""
+    answered = [result for result in tcp if result['rtt_ms'] is not None]
+    rtts = [result['rtt_ms'] for result in answered]
+    jitters = [result['jitter_ms'] for result in answered if result['jitter_ms'] is not None]
+    # Targets that never answered are an outage rather than loss
+    if answered:
+        loss = sum(result['lost'] for result in answered) / sum(result['sent'] for result in answered)
+    else:
+        loss = 1.0 if tcp else None
+    dns_times = [result['ms'] for result in dns if result['ms'] is not None]
+    paths = [(result['mtu'], result['mss']) for result in tcp
+             if result['mtu'] and result['mss'] and result['mtu'] <= STANDARD_MTU]
+    report = {
+        'tcp': tcp,
+        'dns': dns,
+        'throughput': throughput,
+        'gateway': gateway,
+        'link': link or {},
+        'ping_ms': statistics.median(rtts) if rtts else None,
+        'jitter_ms': statistics.median(jitters) if jitters else None,
+        'loss': loss,
+        'dns_ms': statistics.median(dns_times) if dns_times else None,
+        'dns_failures': sum(1 for result in dns if result['error']),
+        'download_mbps': throughput['mbps'] if throughput else None,
+        'path_mtu': min(mss + 40 for _, mss in paths) if paths else None,
+        'mtu_mismatch': any(mtu - mss > MSS_SLACK for mtu, mss in paths),
+    }
+    report['issues'] = detect_issues(report)
+    return report
+
+
+def detect_issues(report):
+    """Return the potential_issues that the probe `report` shows directly."""
+    issues = []
+    reachable = report['ping_ms'] is not None
+    gateway = report['gateway']
+    if not reachable and report['tcp']:
+        if gateway and gateway['rtt_ms'] is not None:
+            # The router answers but nothing beyond it does
+            issues.append(FIREWALL_BLOCKING)
+        else:
+            issues.append(ROUTER_UNREACHABLE)
+    elif report['loss'] is not None and report['loss'] >= LOSS_THRESHOLD:
+        issues.append(PACKET_LOSS)
+    # Names that do not resolve while addresses are reachable point at DNS itself
+    if report['dns'] and report['dns_failures'] * 2 > len(report['dns']) and (reachable or not report['tcp']):
+        issues.append(DNS_FAILURE)
+    if report['mtu_mismatch']:
+        issues.append(MTU_MISMATCH)
+    return issues
+
+
+def to_diagnosis_inputs(report):
+    """Turn a probe report into Diagnose page field values.
+
+    Only measured fields are returned; `measured_issues` lists the issues the
+    probes observed directly.
+    """
+    inputs = {'measured_issues': list(report['issues'])}
+    if report['download_mbps']:
+        inputs['internet_speed'] = min(max(int(round(report['download_mbps'])), 1), 500)
+    if report['ping_ms'] is not None:
+        inputs['ping'] = min(max(int(round(report['ping_ms'])), 1), 500)
+    link = report.get('link') or {}
+    if link.get('network_type'):
+        inputs['network_type'] = link['network_type']
+    if link.get('wifi_strength'):
+        inputs['wifi_strength'] = link['wifi_strength']
+    return inputs
+
+
+def measure(**kwargs):
+    """Run the probes from synchronous code (a Streamlit script run) and return the report."""
+    return asyncio.run(run_probes(**kwargs))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure latency, jitter, loss, DNS, throughput and MTU concurrently.')
+    parser.add_argument('--targets', default=TCP_TARGETS, help='host:port list for the TCP probes')
+    parser.add_argument('--dns', default=DNS_NAMES, help='Names to resolve')
+    parser.add_argument('--throughput-url', default=THROUGHPUT_URL, help="Download URL ('' to skip)")
+    parser.add_argument('--budget', type=float, default=RUN_BUDGET, help='Time limit for the whole run (s)')
+    args = parser.parse_args(argv)
+
+    report = measure(targets=parse_targets(args.targets), dns_names=[n.strip() for n in args.dns.split(',') if n.strip()],
+                     throughput_url=args.throughput_url or None, budget=args.budget)
+    print(json.dumps(report, indent=2))
+    print(json.dumps(to_diagnosis_inputs(report)))
+
+
+if __name__ == '__main__':
+    main()
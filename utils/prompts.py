@@ -0,0 +1,121 @@
+import threading
+
+# Prompt templates used by the pages, compiled once per process by get_prompt()
+TEMPLATES = {
+    'diagnose_issue': (
+        'You are an AI assistant and predict network-related issues based on the given details.\n'
+        "I am experiencing issues with my internet connection. Here are the details:\n"
+        "Internet Speed: {internet_speed} Mbps\n"
+        "Ping: {ping} ms\n"
+        "WiFi Strength: {wifi_strength}\n"
+        "Device Type: {device_type}\n"
+        "Usage: {usage}\n"
+        "Network Type: {network_type}\n"
+        "Router Distance: {router_distance} meters\n"
+        "Connected Devices: {connected_devices}\n"
+        "VPN Usage: {vpn_usage}\n\n"
+        "These are the possible issues, as code: name. You must predict only from these issues:\n{issue_codes}\n\n"
+        "Pick exactly **2 potential issues**. Reply with their two codes only, separated by a comma (for example: 4, 12)."
+    ),
+    'diagnose_solution': (
+        "You are a Ai assistant who give suggestion to fix the network issues:\n"
+        "the user will provide you the issue and you have to suggest him the best ways to solve the issue. do not ask him to provide more information. Give detailed answer\n"
+        "the issue are following: {predicted_issues}"
+        "You only have these predicted issues. Only reply based on these"
+    ),
+    'diagnose_structured': (
+        'You are an AI assistant that predicts network-related issues and explains how to fix them.\n'
+        "I am experiencing issues with my internet connection. Here are the details:\n"
+        "Internet Speed: {internet_speed} Mbps\n"
+        "Ping: {ping} ms\n"
+        "WiFi Strength: {wifi_strength}\n"
+        "Device Type: {device_type}\n"
+        "Usage: {usage}\n"
+        "Network Type: {network_type}\n"
+        "Router Distance: {router_distance} meters\n"
+        "Connected Devices: {connected_devices}\n"
+        "VPN Usage: {vpn_usage}\n\n"
+        "These are the possible issues, as code: name. You must predict only from these issues:\n{issue_codes}\n\n"
+        "Pick exactly **2 potential issues** and give detailed steps to solve each one. "
+        "Do not ask for more information.\n"
+        'Reply with JSON only, in this format: {{"issues": [{{"index": <issue code>, "solution": "<markdown steps>"}}]}}'
+    ),
+    'chat': (
+        "You are an AI Network Troubleshooting Assistant, specializing in diagnosing and resolving network-related issues. "
+        "Your primary goal is to give detailed answers to the user's queries. "
+        "Follow these guidelines:\n\n"
+
+        "- If the user greets you (e.g., 'hi', 'hello', 'hey'), respond politely and professionally before asking how you can assist with a network issue.\n"
+        "- If the user describes a network issue, provide a **concise troubleshooting guide** (3-5 sentences max), including possible causes and steps.\n"
+        "- Do **not** ask for additional details—assume the user wants direct solutions.\n"
+        "- Keep responses **short, professional, and easy to understand**.\n"
+        "- If you need to 'think' before answering, summarize your thought process in **one short sentence** inside `<think>` tags.\n\n"
+
+        "Conversation so far (use it to understand follow-up questions):\n{history}\n\n"
+        "User's message: {question}\n"
+        "Keep the whole answer under 250 words."
+    ),
+    'chat_brief': (
+        "You are AI Network Doctor, a friendly assistant for home network troubleshooting.\n"
+        "Conversation so far:\n{history}\n\n"
+        "User's message: {question}\n"
+        "Reply in one or two short sentences. If the user has not described a problem yet, "
+        "invite them to describe their connection issue."
+    ),
+    'chat_summary': (
+        "You maintain a short running summary of a network troubleshooting chat.\n"
+        "Current summary: {summary}\n\n"
+        "New messages:\n{messages}\n\n"
+        "Rewrite the summary to include the new messages. Keep the user's devices, symptoms, "
+        "what was already tried and what was suggested. Use at most 150 words and reply with the summary only."
+    ),
+    'isp': """
+    Based on the following user preferences and issues, recommend the best Internet Service Provider:
+    - Preferred Internet Speed: {mbs_needed} MBs
+    - Preferred MS (ping): {ms}
+    - Average distance between device and modem: {no_of_meters} meters
+    - Number of Devices: {no_of_devices}
+    - Usage Type: {usage_type}
+    - Device Type: {your_device_type}
+    - VPN Usage: {vpn}
+    - Country: {selected_country}
+    - Current Issues: {current_issues}
+
+    Just give the best ISP provider name according to the user's preferences and issues mentioned above. Also, provide a brief explanation of why it is the best fit and how it addresses the user's current issues.
+    If the user has not mentioned their country name, ask them to mention it and do not provide an answer.
+    """,
+}
+
+# Most output tokens each prompt may generate (max_tokens). Generation time and cost grow
+# with the output, so every prompt gets a budget a little above what a good answer needs.
+OUTPUT_BUDGETS = {
+    'diagnose_issue': 16,         # two issue codes
+    'diagnose_solution': 800,
+    'diagnose_structured': 1000,  # two issues with their steps, as JSON
+    'chat': 1024,                 # the reasoning model's <think> part counts too
+    'chat_brief': 80,
+    'chat_summary': 250,          # at most 150 words
+    'isp': 300,
+}
+
+_prompts = {}
+_lock = threading.Lock()
+
+
+def compact(template):
+    """Drop the indentation and surrounding blank lines of a template; they cost tokens on every call."""
+    return '\n'.join(line.strip() for line in template.strip().splitlines())
+
+
+def get_prompt(name):
+    """Return the compiled PromptTemplate called `name`, building it on first use."""
+    prompt = _prompts.get(name)
+    if prompt is None:
+        with _lock:
+            prompt = _prompts.get(name)
+            if prompt is None:
+                from langchain_core.prompts import PromptTemplate
+
+                prompt = PromptTemplate.from_template(compact(TEMPLATES[name]))
+                _prompts[name] = prompt
+    return prompt
@@ -0,0 +1,139 @@
+import random
+import threading
+import time
+from collections import deque
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """Take `tokens` if they are available right now."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1, timeout=None):
+        """Block until `tokens` are available. Returns False if `timeout` runs out first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None:
+                if now + wait > deadline:
+                    return False
+            time.sleep(wait)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call could not finish (or even start) before its deadline."""
+
+
+# Groq rate limits per model (requests per minute, tokens per minute).
+# Defaults match the free tier; raise them for paid plans.
+GROQ_LIMITS = {
+    'gemma2-9b-it': (30, 15000),
+    'llama-3.3-70b-versatile': (30, 6000),
+    'deepseek-r1-distill-llama-70b': (30, 6000),
+}
+DEFAULT_LIMITS = (30, 6000)
+# Latency samples kept per model for the hedging delay
+LATENCY_WINDOW = 200
+
+
+class ModelLimiter:
+    """Client-side view of one model's Groq limits.
+
+    Holds a requests-per-minute and a tokens-per-minute bucket, pauses all
+    callers after a 429, and keeps recent latencies for hedging decisions.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute / 60, capacity=requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute / 60, capacity=tokens_per_minute)
+        self._paused_until = 0.0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens, deadline=None):
+        """Wait for one request and `tokens` tokens. Raises DeadlineExceeded if they come too late."""
+        tokens = min(tokens, self.tokens.capacity)
+        with self._lock:
+            pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            if deadline is not None and time.monotonic() + pause > deadline:
+                raise DeadlineExceeded('rate limited until after the deadline')
+            time.sleep(pause)
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        if not self.requests.acquire(1, timeout=timeout):
+            raise DeadlineExceeded('no request capacity before the deadline')
+        timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+        if not self.tokens.acquire(tokens, timeout=timeout):
+            raise DeadlineExceeded('no token capacity before the deadline')
+
+    def try_acquire(self, tokens):
+        """Take capacity only if it is available now (used for optional hedge requests)."""
+        with self._lock:
+            if self._paused_until > time.monotonic():
+                return False
+        tokens = min(tokens, self.tokens.capacity)
+        if not self.requests.try_acquire(1):
+            return False
+        return self.tokens.try_acquire(tokens)
+
+    def pause(self, seconds):
+        """Hold back every caller for `seconds` (after a 429 with Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def latency_quantile(self, q, min_samples=20):
+        """Return the q-quantile of recent latencies, or None with fewer than `min_samples`."""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < min_samples:
+            return None
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_model_limiter(model):
+    """Return the process-wide limiter for `model`, shared by every page and session."""
+    limiter = _limiters.get(model)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(model)
+            if limiter is None:
+                limiter = ModelLimiter(*GROQ_LIMITS.get(model, DEFAULT_LIMITS))
+                _limiters[model] = limiter
+    return limiter
+
+
+def backoff_delay(attempt, base=0.5, cap=8.0):
+    """Exponential backoff with full jitter for retry number `attempt` (0-based)."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
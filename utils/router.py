@@ -0,0 +1,128 @@
+import re
+import time
+
+from utils import llm
+from utils.llm import get_chain, get_chat_model
+from utils.prompts import OUTPUT_BUDGETS
+from utils.tracing import span
+
+# Models per kind of request, cheapest first. Later models are fallbacks when
+# the earlier ones fail or stay unavailable.
+ROUTES = {
+    # Greetings, thanks, small talk and chat summaries
+    'trivial': ('gemma2-9b-it', 'llama-3.3-70b-versatile'),
+    # Picking from a fixed list (the issue list) and explaining that pick
+    'selection': ('gemma2-9b-it', 'llama-3.3-70b-versatile'),
+    # Open-ended answer without visible reasoning (ISP recommendation)
+    'recommendation': ('llama-3.3-70b-versatile', 'gemma2-9b-it'),
+    # Open-ended troubleshooting that benefits from a reasoning model
+    'reasoning': ('deepseek-r1-distill-llama-70b', 'llama-3.3-70b-versatile'),
+}
+# Share of the remaining time the first model may use, so a fallback still fits
+PRIMARY_SHARE = 0.6
+
+_GREETING = re.compile(
+    r"^(hi+|hello+|hey+|yo|hiya|good (morning|afternoon|evening|night)|thanks?( you)?|thank u|thx|ty|"
+    r"ok(ay)?|cool|great|nice|bye|goodbye|see you|cheers|who are you|what can you do)\b",
+    re.IGNORECASE
+)
+# Words that turn a short message into a real troubleshooting question
+_NETWORK_WORDS = re.compile(
+    r"\b(ping|lag|slow|speed|wifi|wi-fi|router|modem|internet|network|dns|vpn|latency|packet|"
+    r"disconnect\w*|signal|bandwidth|mbps|ethernet|isp|connection|connect\w*|drop\w*|buffer\w*)\b",
+    re.IGNORECASE
+)
+TRIVIAL_MAX_WORDS = 8
+
+
+def classify(text):
+    """Classify a free-text chat message as 'trivial' or 'reasoning', locally and instantly."""
+    words = text.split()
+    if len(words) <= TRIVIAL_MAX_WORDS and _GREETING.match(text.strip()) and not _NETWORK_WORDS.search(text):
+        return 'trivial'
+    return 'reasoning'
+
+
+def _budgets(timeout, count):
+    # Each model but the last gets PRIMARY_SHARE of what is left, the last gets the rest
+    deadline = time.monotonic() + timeout
+    for index in range(count):
+        remaining = max(deadline - time.monotonic(), 0)
+        yield remaining if index == count - 1 else remaining * PRIMARY_SHARE
+
+
+def _run(route, attempt, timeout):
+    models = ROUTES[route]
+    error = None
+    for index, (name, budget) in enumerate(zip(models, _budgets(timeout, len(models)))):
+        with span(f'route.{route}', model=name, fallback=index > 0) as route_span:
+            try:
+                return attempt(name, budget)
+            except Exception as e:
+                route_span.attrs['error_type'] = type(e).__name__
+                route_span.end(e)
+                error = e
+    raise error
+
+
+def _with_budget(prompt_name, params):
+    # The prompt's output budget applies unless the caller set max_tokens itself
+    if prompt_name in OUTPUT_BUDGETS and 'max_tokens' not in params:
+        params = dict(params, max_tokens=OUTPUT_BUDGETS[prompt_name])
+    return params
+
+
+def invoke(route, prompt, timeout=llm.DEFAULT_TIMEOUT, bind=None, prompt_name=None, **params):
+    """Send `prompt` to the first model of `route` that answers; returns the message.
+
+    `params` are ChatGroq settings (temperature, ...), `bind` extra request
+    arguments such as response_format. `prompt_name` names the template the
+    prompt came from: its OUTPUT_BUDGETS entry becomes max_tokens and the
+    call's tokens are counted under it.
+    """
+    params = _with_budget(prompt_name, params)
+
+    def attempt(name, budget):
+        model = get_chat_model(name, **params)
+        if bind:
+            model = model.bind(**bind)
+        return llm.invoke(model, prompt, timeout=budget, label=prompt_name)
+    return _run(route, attempt, timeout)
+
+
+def run_chain(route, prompt_name, inputs, timeout=llm.DEFAULT_TIMEOUT, **params):
+    """Run the shared chain for `prompt_name` on the first model of `route` that answers."""
+    params = _with_budget(prompt_name, params)
+    return _run(route, lambda name, budget: llm.run_chain(get_chain(prompt_name, name, **params), inputs, timeout=budget,
+                                                          label=prompt_name), timeout)
+
+
+def stream(route, prompt, timeout=llm.DEFAULT_TIMEOUT, prompt_name=None, **params):
+    """Stream from the first model of `route` that starts answering.
+
+    Falling back is only possible before the first chunk; a stream that breaks
+    later raises like any other. `prompt_name` works as in invoke().
+    """
+    params = _with_budget(prompt_name, params)
+    models = ROUTES[route]
+    error = None
+    for index, (name, budget) in enumerate(zip(models, _budgets(timeout, len(models)))):
+        route_span = span(f'route.{route}', model=name, fallback=index > 0)
+        try:
+            chunks = iter(llm.stream(get_chat_model(name, **params), prompt, timeout=budget, label=prompt_name))
+            first = next(chunks, None)
+        except Exception as e:
+            route_span.attrs['error_type'] = type(e).__name__
+            route_span.end(e)
+            error = e
+            continue
+        try:
+            if first is not None:
+                yield first
+                yield from chunks
+        finally:
+            # Closed here too in case the caller stopped at the first chunk, before `yield from`
+            chunks.close()
+            route_span.end()
+        return
+    raise error
@@ -0,0 +1,151 @@
+import numpy as np
+
+from utils.issues import potential_issues
+
+# Above this confidence the local rules are trusted and the LLM call is skipped
+CONFIDENCE_THRESHOLD = 0.75
+# Number of candidate issues sent to the LLM when the rules are not confident
+CANDIDATE_COUNT = 6
+
+FEATURES = [
+    'bias',
+    'slow',            # speed below 25 Mbps
+    'very_slow',       # speed below 5 Mbps
+    'high_ping',       # ping above 100 ms
+    'extreme_ping',    # ping above 250 ms
+    'weak_wifi',       # Weak = 0.5, Very Weak = 1
+    'far_from_router', # beyond 10 m
+    'crowded',         # more than 10 connected devices
+    'vpn',
+    'wifi',
+    'ethernet',
+    'mobile_data',
+    'satellite',
+    'gaming',
+    'streaming',
+    'work',
+    'healthy',         # fast, low ping, good signal, few devices: nothing stands out
+]
+
+# Sparse weights: issue index -> {feature: weight}. Every issue starts from a
+# negative bias so it only becomes likely when the inputs point at it.
+_ISSUE_WEIGHTS = {
+    0: {'high_ping': 2.0, 'extreme_ping': 2.5, 'weak_wifi': 2.0, 'far_from_router': 1.5, 'satellite': 1.0, 'mobile_data': 0.5},
+    1: {'very_slow': 2.0, 'weak_wifi': 1.5, 'far_from_router': 2.5, 'extreme_ping': 1.0},
+    2: {'very_slow': 1.0, 'extreme_ping': 1.0, 'vpn': 0.5},
+    3: {'crowded': 3.5},
+    4: {'vpn': 1.5},
+    5: {'slow': 1.5, 'streaming': 1.0, 'gaming': 0.5, 'mobile_data': 1.0},
+    6: {'crowded': 3.0},
+    7: {'crowded': 2.0, 'work': 0.3},
+    8: {'slow': 1.0},
+    9: {'weak_wifi': 2.5, 'far_from_router': 2.0},
+    10: {'vpn': 1.5, 'high_ping': 1.0},
+    11: {'extreme_ping': 1.5, 'high_ping': 0.8},
+    12: {'vpn': 2.5, 'satellite': 0.5},
+    13: {'crowded': 1.5, 'gaming': 1.0, 'streaming': 0.8, 'high_ping': 1.0},
+    14: {'mobile_data': 0.8},
+    15: {'vpn': 1.0},
+    16: {'crowded': 1.5, 'ethernet': 1.0, 'extreme_ping': 0.5},
+    17: {'work': 0.3},
+}
+
+
+def _build_weights():
+    weights = np.zeros((len(FEATURES), len(potential_issues)))
+    weights[FEATURES.index('bias')] = -2.0
+    weights[FEATURES.index('healthy')] = -1.5
+    for issue, row in _ISSUE_WEIGHTS.items():
+        for feature, weight in row.items():
+            weights[FEATURES.index(feature), issue] = weight
+    return weights
+
+
+WEIGHTS = _build_weights()
+
+
+def encode(profiles):
+    """Encode network profiles as a (n, len(FEATURES)) feature matrix.
+
+    `profiles` is a dict of columns (lists, arrays or pandas Series) using the
+    Diagnose page field names, so a whole DataFrame can be encoded at once.
+    """
+    speed = np.asarray(profiles['internet_speed'], dtype=float)
+    ping = np.asarray(profiles['ping'], dtype=float)
+    distance = np.asarray(profiles['router_distance'], dtype=float)
+    devices = np.asarray(profiles['connected_devices'], dtype=float)
+    wifi_strength = np.asarray(profiles['wifi_strength'])
+    network_type = np.asarray(profiles['network_type'])
+    usage_type = np.asarray(profiles['usage_type'])
+    vpn_usage = np.asarray(profiles['vpn_usage'])
+
+    features = np.zeros((speed.shape[0], len(FEATURES)))
+    features[:, 0] = 1.0
+    features[:, 1] = np.clip((25 - speed) / 25, 0, 1)
+    features[:, 2] = np.clip((5 - speed) / 5, 0, 1)
+    features[:, 3] = np.clip((ping - 100) / 300, 0, 1)
+    features[:, 4] = np.clip((ping - 250) / 250, 0, 1)
+    features[:, 5] = np.where(wifi_strength == 'Very Weak', 1.0, np.where(wifi_strength == 'Weak', 0.5, 0.0))
+    features[:, 6] = np.clip((distance - 10) / 40, 0, 1)
+    features[:, 7] = np.clip((devices - 10) / 40, 0, 1)
+    features[:, 8] = vpn_usage == 'Yes'
+    features[:, 9] = network_type == 'WiFi'
+    features[:, 10] = network_type == 'Ethernet'
+    features[:, 11] = network_type == 'Mobile Data'
+    features[:, 12] = network_type == 'Satellite'
+    features[:, 13] = usage_type == 'Gaming'
+    features[:, 14] = usage_type == 'Streaming'
+    features[:, 15] = usage_type == 'Work'
+    features[:, 16] = ((speed >= 50) & (ping <= 50) & (distance <= 10) & (devices <= 10)
+                       & np.isin(wifi_strength, ['Excellent', 'Good']))
+    return features
+
+
+def score(features):
+    """Return per-issue confidences in [0, 1] for an encoded feature matrix."""
+    return 1.0 / (1.0 + np.exp(-(features @ WEIGHTS)))
+
+
+def top_k(confidences, k):
+    """Return the (indices, confidences) of the k most likely issues for each row."""
+    k = min(k, confidences.shape[1])
+    indices = np.argpartition(-confidences, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(confidences, indices, axis=1), axis=1)
+    indices = np.take_along_axis(indices, order, axis=1)
+    return indices, np.take_along_axis(confidences, indices, axis=1)
+
+
+def diagnose_many(profiles, k=2, threshold=CONFIDENCE_THRESHOLD, candidates=CANDIDATE_COUNT):
+    """Score many profiles (a dict of columns or a DataFrame) in one pass.
+
+    An optional `measured_issues` column lists issues the probes observed.
+    Returns one dict per profile with the top-k `issues` and their `confidences`,
+    whether the result is `confident` enough to skip the LLM, and the
+    `candidates` shortlist to send to the LLM otherwise.
+    """
+    confidences = score(encode(profiles))
+    if 'measured_issues' in profiles:
+        # Issues observed by the network probes are certain
+        for row, names in enumerate(profiles['measured_issues']):
+            for name in names or ():
+                confidences[row, potential_issues.index(name)] = 1.0
+    indices, top = top_k(confidences, max(k, candidates))
+    return [
+        {
+            'issues': [potential_issues[i] for i in row_indices[:k]],
+            'confidences': [float(c) for c in row_top[:k]],
+            'confident': bool(row_top[k - 1] >= threshold),
+            'candidates': [potential_issues[i] for i in row_indices[:candidates]],
+        }
+        for row_indices, row_top in zip(indices, top)
+    ]
+
+
+def diagnose(inputs, k=2, threshold=CONFIDENCE_THRESHOLD, candidates=CANDIDATE_COUNT):
+    """Score a single Diagnose page profile (see diagnose_many)."""
+    return diagnose_many({name: [value] for name, value in inputs.items()}, k, threshold, candidates)[0]
+
+
+def format_issues(issues):
+    """Render an issue list the same way the LLM is asked to: names only, one per line."""
+    return '\n'.join(f'{n}. {issue.strip()}' for n, issue in enumerate(issues, 1))
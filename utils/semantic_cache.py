@@ -0,0 +1,186 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from utils.cache import CACHE_DIR
+from utils.tracing import span
+
+SEMANTIC_CACHE_PATH = os.path.join(CACHE_DIR, 'chat_answers.sqlite3')
+# Cosine similarity needed to serve a cached answer
+SIMILARITY_THRESHOLD = float(os.getenv('NETDOC_SEMANTIC_THRESHOLD', '0.8'))
+SEMANTIC_CACHE_SIZE = 2000
+VECTOR_DIM = 2 ** 11
+# Hits only touch memory; their recency is written to disk in batches
+FLUSH_EVERY = 50
+
+# Words that carry no meaning for matching questions ("my ping is high" ~ "high ping")
+STOP_WORDS = frozenset(
+    'a an and are am be can could do does doing for from have how i i\'m im is it its me my of on or '
+    'please so the this to what when why with would you your'.split()
+)
+
+
+def normalize_question(text):
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    return ' '.join(word for word in words if word not in STOP_WORDS)
+
+
+def _features(text):
+    # Whole words, word pairs and character 3-5-grams (which also match typos and word forms)
+    words = text.split()
+    features = list(words)
+    features += [f'{a} {b}' for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f' {word} '
+        for n in (3, 4, 5):
+            features += [padded[i:i + n] for i in range(len(padded) - n + 1)]
+    return features
+
+
+def embed(text, dim=VECTOR_DIM):
+    """Turn a question into an L2-normalised hashed n-gram vector. Runs locally, no model needed."""
+    vector = np.zeros(dim, dtype=np.float32)
+    features = _features(normalize_question(text))
+    if not features:
+        return vector
+    hashes = np.fromiter((zlib.crc32(f.encode()) for f in features), dtype=np.uint32, count=len(features))
+    # The top hash bit picks the sign so colliding features tend to cancel out
+    signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+    np.add.at(vector, (hashes % dim).astype(np.int64), signs)
+    # Sublinear term frequency, then unit length so a dot product is the cosine similarity
+    vector = np.sign(vector) * np.log1p(np.abs(vector))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticCache:
+    """Answers to earlier questions, found again by meaning rather than exact text.
+
+    Question vectors live in one preallocated matrix, so a lookup is a single
+    matrix-vector product. The least recently used entry is replaced when the
+    cache is full. Questions and answers are persisted to SQLite; vectors are
+    rebuilt from the questions on load.
+    """
+
+    def __init__(self, path=SEMANTIC_CACHE_PATH, threshold=SIMILARITY_THRESHOLD, capacity=SEMANTIC_CACHE_SIZE, dim=VECTOR_DIM):
+        self.path = path
+        self.threshold = threshold
+        self.capacity = capacity
+        self.dim = dim
+        self.hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._entries = []      # (question, answer, thinking) per matrix row
+        self._rows = {}         # normalised question -> row
+        self._dirty = set()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS semantic_cache ('
+            ' key TEXT PRIMARY KEY, question TEXT NOT NULL, answer TEXT NOT NULL, thinking TEXT, last_used REAL NOT NULL)'
+        )
+        self._conn.commit()
+        self._load()
+
+    def _load(self):
+        rows = self._conn.execute(
+            'SELECT question, answer, thinking, last_used FROM semantic_cache ORDER BY last_used DESC LIMIT ?',
+            (self.capacity,)
+        ).fetchall()
+        for question, answer, thinking, last_used in reversed(rows):
+            self._store(question, answer, thinking, last_used)
+
+    def _store(self, question, answer, thinking, now):
+        # Called with _lock held (or during __init__); returns the key of the evicted entry, if any
+        key = normalize_question(question)
+        evicted = None
+        row = self._rows.get(key)
+        if row is None:
+            if len(self._entries) < self.capacity:
+                row = len(self._entries)
+                self._entries.append(None)
+            else:
+                row = int(np.argmin(self._last_used))
+                evicted = normalize_question(self._entries[row][0])
+                del self._rows[evicted]
+            self._rows[key] = row
+            self._vectors[row] = embed(question, self.dim)
+        self._entries[row] = (question, answer, thinking)
+        self._last_used[row] = now
+        return evicted
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, question, threshold=None):
+        """Return (answer, thinking, similarity) of the closest earlier question, or None below the threshold."""
+        threshold = self.threshold if threshold is None else threshold
+        with span('semantic_cache.lookup') as lookup_span:
+            start = time.perf_counter()
+            vector = embed(question, self.dim)
+            with self._lock:
+                result = None
+                if self._entries and vector.any():
+                    similarities = self._vectors[:len(self._entries)] @ vector
+                    row = int(np.argmax(similarities))
+                    similarity = float(similarities[row])
+                    lookup_span.attrs['similarity'] = similarity
+                    if similarity >= threshold:
+                        _, answer, thinking = self._entries[row]
+                        self._last_used[row] = time.time()
+                        self._dirty.add(row)
+                        result = (answer, thinking, similarity)
+                if result is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                self.lookup_seconds += time.perf_counter() - start
+                flush = len(self._dirty) >= FLUSH_EVERY
+            lookup_span.attrs['cache_hit'] = result is not None
+        if flush:
+            self.flush()
+        return result
+
+    def add(self, question, answer, thinking=None):
+        """Remember the answer to `question` (replacing the least recently used entry when full)."""
+        now = time.time()
+        # The connection is shared by every session: its statements and commit run under
+        # the lock, which also keeps the table's evictions in the same order as the matrix's
+        with self._lock, self._conn:
+            evicted = self._store(question, answer, thinking, now)
+            if evicted is not None:
+                self._conn.execute('DELETE FROM semantic_cache WHERE key = ?', (evicted,))
+            self._conn.execute(
+                'INSERT OR REPLACE INTO semantic_cache (key, question, answer, thinking, last_used) VALUES (?, ?, ?, ?, ?)',
+                (normalize_question(question), question, answer, thinking, now)
+            )
+        self.flush()
+
+    def flush(self):
+        """Write the recency of entries served since the last flush."""
+        with self._lock:
+            updates = [(float(self._last_used[row]), normalize_question(self._entries[row][0])) for row in self._dirty]
+            self._dirty.clear()
+            if updates:
+                with self._conn:
+                    self._conn.executemany('UPDATE semantic_cache SET last_used = ? WHERE key = ?', updates)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'threshold': self.threshold,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'mean_lookup_ms': self.lookup_seconds / lookups * 1000 if lookups else 0.0,
+        }
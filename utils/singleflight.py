@@ -0,0 +1,168 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from utils.tracing import span
+
+# Upstream streams are drained here so they finish even if the session that
+# started them reruns or disconnects while other sessions are still reading.
+# Once every reader has stopped, the upstream stream is closed early.
+_stream_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='singleflight-stream')
+
+
+class _Abandoned(Exception):
+    """The leading call was interrupted (e.g. by a Streamlit rerun); followers retry."""
+
+
+class _SharedStream:
+    """Buffer of streamed chunks that any number of readers can replay and follow.
+
+    When the last reader stops before the end (a cancelled answer), the stream
+    is abandoned: drain() stops reading and closes the upstream iterator
+    instead of consuming the rest of the answer.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._done = False
+        self._error = None
+        self._readers = 0
+        self.abandoned = False
+        self._cond = threading.Condition()
+
+    def drain(self, iterator_fn):
+        iterator = None
+        try:
+            iterator = iterator_fn()
+            for chunk in iterator:
+                with self._cond:
+                    if self.abandoned:
+                        break
+                    self._chunks.append(chunk)
+                    self._cond.notify_all()
+        except Exception as e:
+            with self._cond:
+                self._error = e
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+
+    def reader(self):
+        """Attach a reader and return its iterator, or None if the stream was abandoned.
+
+        The reader counts as reading until its iterator ends or is closed.
+        """
+        with self._cond:
+            if self.abandoned:
+                return None
+            self._readers += 1
+        return self._follow()
+
+    def _follow(self):
+        position = 0
+        try:
+            while True:
+                with self._cond:
+                    while position >= len(self._chunks) and not self._done:
+                        self._cond.wait()
+                    chunks = self._chunks[position:]
+                    done, error = self._done, self._error
+                yield from chunks
+                position += len(chunks)
+                if done and position >= len(self._chunks):
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0 and not self._done:
+                    self.abandoned = True
+
+
+class SingleFlight:
+    """Coalesce identical concurrent calls: one runs, every caller gets its result.
+
+    Only calls that overlap in time are shared; nothing is cached after the
+    leading call returns. `calls` counts upstream calls, `shared` the callers
+    that joined one already in flight.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.shared = 0
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._streams = {}
+
+    def do(self, key, fn):
+        """Return fn(), or the result of the identical call already in flight for `key`."""
+        while True:
+            with self._lock:
+                future = self._flights.get(key)
+                leader = future is None
+                if leader:
+                    future = Future()
+                    self._flights[key] = future
+                    self.calls += 1
+                else:
+                    self.shared += 1
+            with span(f'singleflight.{self.name}', cache_hit=not leader):
+                if not leader:
+                    try:
+                        return future.result()
+                    except _Abandoned:
+                        continue
+                try:
+                    result = fn()
+                except Exception as e:
+                    future.set_exception(e)
+                    raise
+                except BaseException:
+                    future.set_exception(_Abandoned())
+                    raise
+                else:
+                    future.set_result(result)
+                    return result
+                finally:
+                    with self._lock:
+                        self._flights.pop(key, None)
+
+    def stream(self, key, iterator_fn):
+        """Iterate iterator_fn(), sharing one upstream stream between concurrent callers.
+
+        Callers that join late first receive the chunks already produced. When
+        every caller stops reading, the upstream stream is closed.
+        """
+        with self._lock:
+            shared = self._streams.get(key)
+            reader = shared.reader() if shared is not None else None
+            if reader is None:
+                shared = _SharedStream()
+                reader = shared.reader()
+                self._streams[key] = shared
+                self.calls += 1
+                leader = True
+            else:
+                self.shared += 1
+                leader = False
+        span(f'singleflight.{self.name}', cache_hit=not leader).end()
+        if leader:
+            def run():
+                try:
+                    shared.drain(iterator_fn)
+                finally:
+                    with self._lock:
+                        # An abandoned stream may already have been replaced by a new one
+                        if self._streams.get(key) is shared:
+                            del self._streams[key]
+            _stream_executor.submit(run)
+        return reader
+
+    def stats(self):
+        with self._lock:
+            return {'calls': self.calls, 'shared': self.shared, 'in_flight': len(self._flights) + len(self._streams)}
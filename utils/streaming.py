@@ -0,0 +1,105 @@
+import time
+
+THINK_OPEN = '<think>'
+THINK_CLOSE = '</think>'
+
+
+class ThinkStreamParser:
+    """Incrementally split a streamed answer into "thinking" and "answer" text.
+
+    Text between <think> and </think> goes to the thinking channel, everything else
+    to the answer channel. Tags split across chunks are handled by holding back the
+    shortest tail that could still be the start of a tag, so each chunk is scanned once.
+    """
+
+    def __init__(self):
+        self.in_think = False
+        self._thinking = []
+        self._answer = []
+        self._pending = ''
+
+    @property
+    def thinking(self):
+        return ''.join(self._thinking)
+
+    @property
+    def answer(self):
+        return ''.join(self._answer)
+
+    def feed(self, chunk):
+        """Consume one chunk and return the list of (channel, text) pieces it produced."""
+        events = []
+        buf = self._pending + chunk
+        self._pending = ''
+        while buf:
+            tag = THINK_CLOSE if self.in_think else THINK_OPEN
+            idx = buf.find(tag)
+            if idx >= 0:
+                self._emit(buf[:idx], events)
+                self.in_think = not self.in_think
+                buf = buf[idx + len(tag):]
+                continue
+            keep = _partial_tag_length(buf, tag)
+            self._emit(buf[:len(buf) - keep], events)
+            self._pending = buf[len(buf) - keep:]
+            break
+        return events
+
+    def close(self):
+        """Flush any held-back text at the end of the stream."""
+        events = []
+        self._emit(self._pending, events)
+        self._pending = ''
+        return events
+
+    def _emit(self, text, events):
+        if not text:
+            return
+        if self.in_think:
+            self._thinking.append(text)
+            events.append(('thinking', text))
+        else:
+            self._answer.append(text)
+            events.append(('answer', text))
+
+
+def _partial_tag_length(buf, tag):
+    # Length of the longest suffix of `buf` that is a proper prefix of `tag`
+    for size in range(min(len(tag) - 1, len(buf)), 0, -1):
+        if buf.endswith(tag[:size]):
+            return size
+    return 0
+
+
+class StreamStats:
+    """Time-to-first-token and throughput for one streamed answer."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.tokens = 0
+
+    def record(self, text):
+        if not text:
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        # Groq streams roughly one token per chunk
+        self.tokens += 1
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+
+    @property
+    def ttft(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def tokens_per_second(self):
+        if self.first_token_at is None:
+            return 0.0
+        elapsed = (self.finished_at or time.perf_counter()) - self.first_token_at
+        return self.tokens / elapsed if elapsed > 0 else 0.0
@@ -0,0 +1,171 @@
+import json
+import threading
+import time
+from collections import deque
+
+# Spans kept in memory; the oldest are dropped first
+RING_CAPACITY = 20000
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Span:
+    """One timed operation. Use as a context manager, or call end() yourself.
+
+    `attrs` can be filled in while the span is open, e.g. span.attrs['cache_hit'] = True.
+    Known attributes: model, cache_hit, input_tokens, output_tokens, ttft.
+    """
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._ended = False
+
+    def end(self, error=None):
+        if self._ended:
+            return
+        self._ended = True
+        self.tracer.add({
+            'name': self.name,
+            'start': self.started_at,
+            'duration': time.perf_counter() - self._start,
+            'error': None if error is None else type(error).__name__,
+            **self.attrs,
+        })
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end(exc)
+        return False
+
+
+def _label_value(value):
+    # Backslash, double quote and newline are escaped in Prometheus label values
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Tracer:
+    """Thread-safe ring buffer of finished spans with percentile summaries."""
+
+    def __init__(self, capacity=RING_CAPACITY):
+        self._spans = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def span(self, name, **attrs):
+        return Span(self, name, attrs)
+
+    def add(self, record):
+        with self._lock:
+            self._spans.append(record)
+
+    def spans(self):
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+    def summary(self):
+        """Aggregate spans per (operation, model): count, errors, latency quantiles, tokens, hit ratio."""
+        import numpy as np
+
+        groups = {}
+        for span in self.spans():
+            groups.setdefault((span['name'], span.get('model') or ''), []).append(span)
+        rows = []
+        for (name, model), spans in sorted(groups.items()):
+            durations = np.array([s['duration'] for s in spans])
+            p50, p95, p99 = np.quantile(durations, QUANTILES)
+            hits = [s['cache_hit'] for s in spans if s.get('cache_hit') is not None]
+            ttfts = [s['ttft'] for s in spans if s.get('ttft') is not None]
+            rows.append({
+                'operation': name,
+                'model': model,
+                'count': len(spans),
+                'errors': sum(1 for s in spans if s['error']),
+                'p50_ms': p50 * 1000,
+                'p95_ms': p95 * 1000,
+                'p99_ms': p99 * 1000,
+                'total_s': float(durations.sum()),
+                'ttft_p50_ms': float(np.median(ttfts)) * 1000 if ttfts else None,
+                'input_tokens': sum(s.get('input_tokens') or 0 for s in spans),
+                'output_tokens': sum(s.get('output_tokens') or 0 for s in spans),
+                'cache_hit_ratio': sum(hits) / len(hits) if hits else None,
+            })
+        return rows
+
+    def to_json(self):
+        return json.dumps({'summary': self.summary(), 'spans': self.spans()}, default=str)
+
+    def to_prometheus(self):
+        """Export the summary in the Prometheus text exposition format."""
+        lines = [
+            '# HELP netdoc_operation_duration_seconds Latency of traced operations.',
+            '# TYPE netdoc_operation_duration_seconds summary',
+        ]
+        for row in self.summary():
+            labels = f'operation="{_label_value(row["operation"])}",model="{_label_value(row["model"])}"'
+            for q, key in zip(QUANTILES, ('p50_ms', 'p95_ms', 'p99_ms')):
+                lines.append(f'netdoc_operation_duration_seconds{{{labels},quantile="{q}"}} {row[key] / 1000:.6f}')
+            lines.append(f'netdoc_operation_duration_seconds_sum{{{labels}}} {row["total_s"]:.6f}')
+            lines.append(f'netdoc_operation_duration_seconds_count{{{labels}}} {row["count"]}')
+            lines.append(f'netdoc_operation_errors_total{{{labels}}} {row["errors"]}')
+            lines.append(f'netdoc_tokens_total{{{labels},direction="input"}} {row["input_tokens"]}')
+            lines.append(f'netdoc_tokens_total{{{labels},direction="output"}} {row["output_tokens"]}')
+            if row['cache_hit_ratio'] is not None:
+                lines.append(f'netdoc_cache_hit_ratio{{{labels}}} {row["cache_hit_ratio"]:.4f}')
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide tracer shared by all pages
+tracer = Tracer()
+span = tracer.span
+
+
+def start_rerun(page):
+    """Open the span for one script run of `page`; call .end() at the bottom of the script."""
+    return tracer.span('rerun', page=page)
+
+
+def llm_callback():
+    """Return a LangChain callback handler that records one span per LLM call."""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TracingCallback(BaseCallbackHandler):
+        def __init__(self):
+            self._open = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, invocation_params=None, **kwargs):
+            model = (invocation_params or {}).get('model') or (invocation_params or {}).get('model_name')
+            self._open[run_id] = (tracer.span('llm', model=model), 0)
+
+        def on_llm_new_token(self, token, *, run_id, **kwargs):
+            if run_id in self._open:
+                llm_span, tokens = self._open[run_id]
+                if tokens == 0:
+                    llm_span.attrs['ttft'] = time.perf_counter() - llm_span._start
+                self._open[run_id] = (llm_span, tokens + 1)
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            if run_id not in self._open:
+                return
+            llm_span, tokens = self._open.pop(run_id)
+            usage = (response.llm_output or {}).get('token_usage') or {}
+            if not usage:
+                message = getattr(response.generations[0][0], 'message', None) if response.generations else None
+                metadata = getattr(message, 'usage_metadata', None) or {}
+                usage = {'prompt_tokens': metadata.get('input_tokens'), 'completion_tokens': metadata.get('output_tokens')}
+            llm_span.attrs['input_tokens'] = usage.get('prompt_tokens')
+            llm_span.attrs['output_tokens'] = usage.get('completion_tokens') or tokens or None
+            llm_span.end()
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            if run_id in self._open:
+                self._open.pop(run_id)[0].end(error)
+
+    return TracingCallback()
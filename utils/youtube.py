@@ -0,0 +1,151 @@
+import re
+import threading
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from utils.cache import SharedCache
+from utils.cache_backends import get_backend
+from utils.tracing import span
+
+# YouTube Data API quota: 10,000 units per day, reset at midnight Pacific time
+DAILY_QUOTA = 10000
+SEARCH_COST = 100
+QUOTA_TIMEZONE = ZoneInfo('America/Los_Angeles')
+RESULT_TTL = 6 * 3600
+MAX_CACHED_QUERIES = 1000
+SEARCH_NAMESPACE = 'youtube'
+QUOTA_NAMESPACE = 'youtube_quota'
+# Daily counters are kept a little past their day
+QUOTA_KEEP = 2 * 24 * 3600
+
+_lock = threading.Lock()
+_clients = {}
+# httplib2.Http is not thread-safe: every thread gets its own transport (and keep-alive connection)
+_local = threading.local()
+
+
+class QuotaExceeded(Exception):
+    """Raised when a search would go over the daily YouTube quota."""
+
+
+def get_youtube_client(api_key):
+    """Return the process-wide YouTube service client, building it on first use.
+
+    The client is shared, but its requests must run with http=thread_http().
+    """
+    client = _clients.get(api_key)
+    if client is None:
+        with _lock:
+            client = _clients.get(api_key)
+            if client is None:
+                from googleapiclient.discovery import build
+                client = build('youtube', 'v3', developerKey=api_key, cache_discovery=False)
+                _clients[api_key] = client
+    return client
+
+
+def thread_http():
+    """Return this thread's httplib2 transport for executing YouTube requests."""
+    http = getattr(_local, 'http', None)
+    if http is None:
+        import httplib2
+        http = _local.http = httplib2.Http(timeout=30)
+    return http
+
+
+def normalize_query(query):
+    return re.sub(r'\s+', ' ', query.lower()).strip()
+
+
+class QuotaTracker:
+    """Count the quota units spent today against the daily limit.
+
+    The count lives in the cache backend, so every replica spends from the same budget.
+    """
+
+    def __init__(self, daily_limit=DAILY_QUOTA, backend=None):
+        self.daily_limit = daily_limit
+        self.backend = backend if backend is not None else get_backend()
+
+    @staticmethod
+    def _today():
+        return datetime.now(QUOTA_TIMEZONE).date().isoformat()
+
+    @property
+    def used(self):
+        return self.backend.get(QUOTA_NAMESPACE, self._today(), touch=False) or 0
+
+    def spend(self, units):
+        """Record `units` as spent, or raise QuotaExceeded if that would pass the limit."""
+        day = self._today()
+        used = self.backend.incr(QUOTA_NAMESPACE, day, units, ttl=QUOTA_KEEP)
+        if used > self.daily_limit:
+            self.backend.incr(QUOTA_NAMESPACE, day, -units)
+            raise QuotaExceeded(f'YouTube quota exhausted ({used - units}/{self.daily_limit} units used today)')
+
+    @property
+    def remaining(self):
+        return self.daily_limit - self.used
+
+
+class VideoSearchCache:
+    """TTL'd LRU cache of search results keyed on the normalized query, shared by all replicas.
+
+    An entry fetched with max_results=N also answers any request for fewer results.
+    Hits and misses are counted here (and on the youtube.search span), not by
+    the SharedCache underneath, since an entry with too few results is a miss.
+    """
+
+    def __init__(self, ttl=RESULT_TTL, max_entries=MAX_CACHED_QUERIES, cache=None):
+        self.cache = cache if cache is not None else SharedCache(SEARCH_NAMESPACE, max_entries, ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query, max_results):
+        entry = self.cache.peek(normalize_query(query))
+        # Usable if it holds enough results, or the search had no more to give
+        if entry is not None and (entry['fetched'] >= max_results or len(entry['videos']) < entry['fetched']):
+            self.hits += 1
+            return [tuple(video) for video in entry['videos'][:max_results]]
+        self.misses += 1
+        return None
+
+    def set(self, query, max_results, videos):
+        self.cache.set(normalize_query(query), {'fetched': max_results, 'videos': [list(video) for video in videos]})
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+            'entries': len(self.cache),
+        }
+
+
+search_cache = VideoSearchCache()
+quota = QuotaTracker()
+
+
+def search_videos(api_key, query, max_results=5):
+    """Return [(title, url), ...] for `query`, served from cache when possible."""
+    with span('youtube.search') as search:
+        videos = search_cache.get(query, max_results)
+        search.attrs['cache_hit'] = videos is not None
+        if videos is not None:
+            return videos
+        quota.spend(SEARCH_COST)
+        response = get_youtube_client(api_key).search().list(
+            q=query,
+            part='snippet',
+            type='video',
+            maxResults=max_results
+        ).execute(http=thread_http())
+    videos = []
+    for item in response['items']:
+        video_id = item['id']['videoId']
+        video_title = item['snippet']['title']
+        video_url = f"https://www.youtube.com/watch?v={video_id}"
+        videos.append((video_title, video_url))
+    search_cache.set(query, max_results, videos)
+    return videos